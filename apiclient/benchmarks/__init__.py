@@ -0,0 +1,18 @@
+""" Microbenchmarks of the API client
+
+Run `python -m benchmarks` in `apiclient/` to time the cases and compare them
+with `baseline.json`, it exits with 1 when any case regresses by more than
+`--threshold`.
+
+The baseline is bound to the CPU model, Python and system printed by
+`--environment`, and is not committed. Results taken on another environment
+are not compared, the run passes with a warning unless `--strict` is given.
+
+CI keeps the baseline as a cached artifact keyed by the environment, e.g. with
+`actions/cache` on `benchmarks/baseline.json` and the key from
+`python -m benchmarks --environment`:
+- on a miss, `python -m benchmarks --save` records the baseline of the main
+  branch, which is cached;
+- on a hit, `python -m benchmarks --strict` gates, and a missing or foreign
+  baseline fails as well instead of passing silently.
+"""
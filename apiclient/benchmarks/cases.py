@@ -0,0 +1,90 @@
+""" Hot paths of the client, each case is a callable to be timed """
+import json
+import sys
+from copy import deepcopy
+from pathlib import Path
+
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+
+from harvester_api.managers import BaseManager, merge_dict
+from harvester_api.models import RestoreSpec, VMSpec, VolumeSpec
+from rancher_api.cluster_models import PersistentVolumeClaimSpec
+
+from . import payloads as _payloads
+
+
+class StaticAPI:
+    """ Responds any request with the same body, to time the decoding only """
+    API_VERSION = "harvesterhci.io/v1beta1"
+
+    def __init__(self, data):
+        self.content = json.dumps(data).encode()
+
+    def _get(self, path, **kwargs):
+        resp = Response()
+        resp.status_code, resp._content, resp.encoding = 200, self.content, "utf-8"
+        resp.headers = CaseInsensitiveDict({"Content-Type": "application/json"})
+        return resp
+
+
+def _units():
+    try:
+        from harvester_e2e_tests.utils import format_unit, parse_unit
+    except ImportError:
+        # the e2e package lives next to `apiclient` and is not installed
+        sys.path.append(str(Path(__file__).resolve().parents[2]))
+        from harvester_e2e_tests.utils import format_unit, parse_unit
+    return parse_unit, format_unit
+
+
+def build(payloads=None):
+    """ Returns {name: callable} of all cases, on the built-in payloads if not given """
+    payloads = payloads or _payloads.builtin()
+    vm, vm_list, node, pvc = (payloads[k] for k in ("vm", "vm_list", "node", "pvc"))
+    cases = dict()
+
+    patch = dict(metadata=dict(labels={f"e2e/label-{i}": "true" for i in range(8)},
+                               annotations={"field.cattle.io/description": "patched"}),
+                 spec=dict(unschedulable=True))
+    # merging the same patch again does the same work, so the node is not copied each time
+    merged = deepcopy(node)
+    cases['merge_dict/node'] = lambda: merge_dict(patch, merged)
+
+    template = deepcopy(vm)
+    template['apiVersion'] = "{API_VERSION}"
+    # managers only keep a weak reference of the API, the lambdas keep it alive
+    api = StaticAPI(None)
+    cases['BaseManager._inject_data/vm'] = (
+        lambda mgr=BaseManager(api), api=api: mgr._inject_data(template)
+    )
+
+    for name, data in (("vm", vm), ("vm_list", vm_list)):
+        api = StaticAPI(data)
+        cases[f'BaseManager._delegate/{name}'] = (
+            lambda mgr=BaseManager(api), api=api: mgr._get("v1/harvester/kubevirt.io.vms")
+        )
+
+    spec = _payloads.vm_spec()
+    cases['VMSpec.to_dict'] = lambda: spec.to_dict("vm-0", _payloads.NAMESPACE)
+    cases['VMSpec.from_dict'] = lambda: VMSpec.from_dict(vm)
+
+    volume = VolumeSpec(40, "longhorn-image-ubuntu-2204", "benchmark volume")
+    cases['VolumeSpec.to_dict'] = lambda: volume.to_dict("vol-0", _payloads.NAMESPACE,
+                                                         _payloads.IMAGE_ID)
+
+    restore = RestoreSpec.for_existing()
+    cases['RestoreSpec.to_dict'] = lambda: restore.to_dict("bak-0", _payloads.NAMESPACE, "vm-0")
+
+    claim = PersistentVolumeClaimSpec.from_dict(deepcopy(pvc))
+    cases['PersistentVolumeClaimSpec.to_dict'] = (
+        lambda: claim.to_dict(pvc['metadata']['name'], _payloads.NAMESPACE)
+    )
+
+    parse_unit, format_unit = _units()
+    quantities = _payloads.quantities()
+    values = [parse_unit(q) for q in quantities]
+    cases['utils.parse_unit'] = lambda: [parse_unit(q) for q in quantities]
+    cases['utils.format_unit'] = lambda: [format_unit(v, increment=1024) for v in values]
+
+    return cases
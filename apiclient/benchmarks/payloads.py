@@ -0,0 +1,165 @@
+""" Payloads of the benchmarks, shaped and sized after objects of real clusters
+
+Steve responses of a Harvester cluster are much larger than the specs the
+client builds: a VM carries managed fields, relationships, the volume claim
+templates annotation and its status (~5 KiB, ~270 KiB for a list of 50); a
+node carries the image list and capacities of its kubelet (~12 KiB). The
+builders below reproduce those structures and sizes, and `from_cassette`
+picks the largest responses of each kind from a recorded cassette
+(`HarvesterAPI.enable_cassette`) when real captures are at hand.
+"""
+import json
+from copy import deepcopy
+
+from common.cassette import Cassette
+from harvester_api.models import VMSpec
+
+NAMESPACE = "default"
+IMAGE_ID = f"{NAMESPACE}/image-ubuntu-2204"
+USER_DATA = "\n".join(["#cloud-config", "package_update: true", "packages:",
+                       "  - qemu-guest-agent", "runcmd:",
+                       "  - - systemctl", "    - enable", "    - --now",
+                       "    - qemu-guest-agent.service", "ssh_authorized_keys:",
+                       "  - ssh-rsa " + "A" * 372 + " e2e@harvester"])
+
+
+def _managed_fields(manager, fields, count=3):
+    return [dict(manager=manager, operation="Update", apiVersion="kubevirt.io/v1",
+                 time="2023-09-01T08:00:00Z", fieldsType="FieldsV1",
+                 fieldsV1={f"f:{k}": {f"f:{s}": {} for s in fields} for k in fields})
+            for _ in range(count)]
+
+
+def vm_spec():
+    spec = VMSpec(2, 4, "benchmark vm", os_type="ubuntu")
+    spec.add_image("disk-0", IMAGE_ID, size=40)
+    spec.add_volume("disk-1", 10)
+    spec.add_network("nic-1", f"{NAMESPACE}/vlan100")
+    spec.user_data = USER_DATA
+    return spec
+
+
+def vm(name="vm-0"):
+    data = vm_spec().to_dict(name, NAMESPACE)
+    meta = data['metadata']
+    meta.update(
+        uid="5b1d9c1a-7d3f-4a5e-9b1e-3c0f4d2e8a11", resourceVersion="48213377", generation=3,
+        creationTimestamp="2023-09-01T08:00:00Z",
+        finalizers=["kubevirt.io/virtualMachineControllerFinalize",
+                    "wrangler.cattle.io/VMController.UnsetOwnerOfPVCs"],
+        managedFields=_managed_fields("harvester", ["metadata", "spec", "status"]),
+        state=dict(error=False, message="", name="running", transitioning=False),
+        relationships=[dict(toId=f"{NAMESPACE}/{name}-disk-{i}", toType="persistentvolumeclaim",
+                            rel="owner", state="bound") for i in range(2)]
+    )
+    meta['annotations'].update({
+        "kubevirt.io/latest-observed-api-version": "v1",
+        "kubevirt.io/storage-observed-api-version": "v1alpha3",
+        "harvesterhci.io/vmRunStrategy": "RerunOnFailure",
+        "network.harvesterhci.io/ips": json.dumps(["10.52.0.21", "192.168.100.21"]),
+    })
+    link = f"/v1/kubevirt.io.virtualmachines/{NAMESPACE}/{name}"
+    data.update(id=f"{NAMESPACE}/{name}", type="kubevirt.io.virtualmachine",
+                apiVersion="kubevirt.io/v1", kind="VirtualMachine",
+                links=dict(self=link, update=link, remove=link,
+                           view=f"/apis/kubevirt.io/v1/namespaces/{NAMESPACE}"
+                                f"/virtualmachines/{name}"),
+                status=dict(
+                    created=True, ready=True, printableStatus="Running",
+                    conditions=[dict(type=t, status="True", lastProbeTime=None,
+                                     lastTransitionTime="2023-09-01T08:01:00Z")
+                                for t in ("Ready", "AgentConnected", "LiveMigratable")],
+                    volumeSnapshotStatuses=[dict(name=v, enabled=True)
+                                            for v in ("disk-0", "disk-1", "cloudinitdisk")]
+                ))
+    return data
+
+
+def vm_list(count=50):
+    return dict(type="collection", resourceType="kubevirt.io.virtualmachine",
+                revision="48213377", count=count,
+                links=dict(self="/v1/kubevirt.io.virtualmachines"),
+                data=[vm(f"vm-{i}") for i in range(count)])
+
+
+def node(name="node-0"):
+    images = [dict(names=[f"docker.io/rancher/mirrored-image-{i}@sha256:{'f' * 64}",
+                          f"docker.io/rancher/mirrored-image-{i}:v1.{i}.0"],
+                   sizeBytes=50000000 + i * 1000003) for i in range(40)]
+    resources = {"cpu": "16", "memory": "65831084Ki", "pods": "200",
+                 "ephemeral-storage": "150629352Ki", "hugepages-1Gi": "0",
+                 "hugepages-2Mi": "0", "devices.kubevirt.io/kvm": "1k",
+                 "devices.kubevirt.io/tun": "1k", "devices.kubevirt.io/vhost-net": "1k"}
+    return dict(
+        id=name, type="node", apiVersion="v1", kind="Node",
+        metadata=dict(
+            name=name, uid="9a1b2c3d-0000-4000-8000-000000000000", resourceVersion="48213377",
+            labels={**{f"cpu-model.node.kubevirt.io/{m}": "true"
+                       for m in ("Skylake-Client", "Haswell", "Broadwell", "IvyBridge")},
+                    **{f"cpu-feature.node.kubevirt.io/{f}": "true"
+                       for f in ("avx", "avx2", "aes", "sse4.2", "vmx", "xsave", "fma")},
+                    "kubernetes.io/hostname": name,
+                    "node-role.kubernetes.io/control-plane": "true"},
+            annotations={"rke2.io/node-args": json.dumps(["server", "--cni", "multus,canal"] * 8),
+                         "node.alpha.kubernetes.io/ttl": "0",
+                         "kubevirt.io/heartbeat": "2023-09-01T08:00:00Z"},
+            managedFields=_managed_fields("kubelet", ["metadata", "spec", "status"], 5),
+        ),
+        spec=dict(podCIDR="10.52.0.0/24", podCIDRs=["10.52.0.0/24"]),
+        status=dict(capacity=resources, allocatable=deepcopy(resources), images=images,
+                    addresses=[dict(type="InternalIP", address="192.168.0.30"),
+                               dict(type="Hostname", address=name)],
+                    conditions=[dict(type=t, status="False", reason=f"Kubelet{t}",
+                                     lastHeartbeatTime="2023-09-01T08:00:00Z")
+                                for t in ("MemoryPressure", "DiskPressure", "PIDPressure")]),
+    )
+
+
+def pvc(name="vm-0-disk-0"):
+    return dict(
+        id=f"{NAMESPACE}/{name}", type="persistentvolumeclaim", apiVersion="v1",
+        kind="PersistentVolumeClaim",
+        metadata=dict(name=name, namespace=NAMESPACE, resourceVersion="48213377",
+                      annotations={"harvesterhci.io/imageId": IMAGE_ID,
+                                   "pv.kubernetes.io/bind-completed": "yes",
+                                   "volume.kubernetes.io/storage-provisioner":
+                                       "driver.longhorn.io"},
+                      managedFields=_managed_fields("kube-controller-manager", ["spec"], 2)),
+        spec=dict(accessModes=["ReadWriteMany"], volumeMode="Block",
+                  storageClassName="longhorn-image-ubuntu-2204",
+                  resources=dict(requests=dict(storage="40Gi")),
+                  volumeName="pvc-5b1d9c1a-7d3f-4a5e-9b1e-3c0f4d2e8a11"),
+        status=dict(phase="Bound", accessModes=["ReadWriteMany"],
+                    capacity=dict(storage="40Gi")),
+    )
+
+
+def quantities():
+    """ Quantities in the units of nodes, volumes and metrics """
+    resources = node()['status']['capacity']
+    return (list(resources.values()) + ["40Gi", "10G", "500m", "250u", "1.5Ti", "2048Mi"]) * 6
+
+
+def builtin():
+    return dict(vm=vm(), vm_list=vm_list(), node=node(), pvc=pvc())
+
+
+def from_cassette(path):
+    """ Largest recorded response of each payload, the built-in one if not recorded """
+    payloads, kinds = builtin(), dict(vm="kubevirt.io.virtualmachine", node="node",
+                                      pvc="persistentvolumeclaim")
+    sizes = dict()
+    for entry in Cassette(path).interactions:
+        if entry['method'] != "GET" or "json" not in (entry['type'] or ""):
+            continue
+        data = json.loads(entry['body'])
+        for kind, type_ in kinds.items():
+            if data.get('type') == type_:
+                key = kind
+            elif data.get('resourceType') == type_ and kind == "vm":
+                key = "vm_list"
+            else:
+                continue
+            if len(entry['body']) > sizes.get(key, 0):
+                payloads[key], sizes[key] = data, len(entry['body'])
+    return payloads
@@ -0,0 +1,159 @@
+import argparse
+import gc
+import json
+import platform
+from pathlib import Path
+from statistics import median
+from timeit import default_timer
+
+BASELINE = Path(__file__).with_name("baseline.json")
+
+
+def measure(func, repeat=7, min_time=0.05):
+    """ Returns the min and median seconds per call of `repeat` batches
+
+    Each batch makes as many calls as it takes `min_time` seconds, so that the
+    timer resolution and the loop are negligible.
+    """
+    number = 1
+    while True:
+        elapsed = _batch(func, number)
+        if elapsed >= min_time:
+            break
+        number *= 10 if elapsed < min_time / 10 else 2
+    times = [elapsed / number] + [_batch(func, number) / number for _ in range(repeat - 1)]
+    return dict(min=min(times), median=median(times), number=number)
+
+
+def _batch(func, number):
+    # as `timeit`, collections of garbage from previous batches would skew the timing
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = default_timer()
+        for _ in range(number):
+            func()
+        return default_timer() - start
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def run(cases, repeat=7, min_time=0.05, log=None):
+    results = dict()
+    for name, func in cases.items():
+        results[name] = measure(func, repeat, min_time)
+        if log:
+            log(f"{name:<40} {results[name]['min'] * 1e6:>12.2f} us")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """ Returns [(name, baseline, current, ratio)] of cases slower than the baseline by more
+    than `threshold` (e.g. 0.2 for 20%), by their min times. New cases are not compared.
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        ratio = result['min'] / base['min']
+        if ratio > 1 + threshold:
+            regressions.append((name, base['min'], result['min'], ratio))
+    return regressions
+
+
+def environment():
+    """ Where results are comparable, the host is left out so runners of a CI class match """
+    return dict(cpu=_cpu_model(),
+                python=f"{platform.python_implementation()} {platform.python_version()}",
+                system=f"{platform.system()} {platform.machine()}")
+
+
+def _cpu_model():
+    # `platform.processor()` is only the architecture on Linux
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or None
+
+
+def load_baseline(path=BASELINE):
+    path = Path(path)
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+def save_baseline(results, path=BASELINE):
+    path = Path(path)
+    path.write_text(json.dumps(dict(environment=environment(), results=results),
+                               indent=2, sort_keys=True) + "\n")
+    return path
+
+
+def main(argv=None):
+    from . import cases, payloads
+
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Time hot paths of the API client, and compare them with the baseline")
+    parser.add_argument("-k", dest="keyword", default="",
+                        help="only run cases with the keyword in their names")
+    parser.add_argument("--baseline", default=str(BASELINE), help="baseline JSON file")
+    parser.add_argument("--save", action="store_true",
+                        help="save the results as the baseline instead of comparing")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="fail when a case is slower than the baseline by this ratio")
+    parser.add_argument("--repeat", type=int, default=7, help="batches of each case")
+    parser.add_argument("--min-time", type=float, default=0.05,
+                        help="seconds of each batch at least")
+    parser.add_argument("--cassette", help="take payloads from the recorded cassette")
+    parser.add_argument("--json", help="file to save the results")
+    parser.add_argument("--strict", action="store_true",
+                        help="fail when the baseline is missing or of another environment")
+    parser.add_argument("--environment", action="store_true",
+                        help="print the environment the baseline is bound to and exit")
+    args = parser.parse_args(argv)
+
+    if args.environment:
+        print(json.dumps(environment(), sort_keys=True))
+        return 0
+
+    data = payloads.from_cassette(args.cassette) if args.cassette else None
+    selected = {k: v for k, v in cases.build(data).items() if args.keyword in k}
+    results = run(selected, args.repeat, args.min_time, log=print)
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+
+    if args.save:
+        print(f"Saved baseline to {save_baseline(results, args.baseline)}")
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        print(f"No baseline at {args.baseline}, save one with --save")
+        return 1 if args.strict else 0
+    if baseline.get('environment') != environment():
+        print(f"WARNING: baseline was taken on {baseline.get('environment')}, not on "
+              f"{environment()}. Results are only compared on the same environment, "
+              f"save a baseline here with --save to gate")
+        return 1 if args.strict else 0
+
+    regressions = compare(results, baseline['results'], args.threshold)
+    if regressions:
+        # confirm them, a noisy neighbour slows down a few cases rather than all runs
+        print(f"Measuring {len(regressions)} slower cases again")
+        for name, *_ in regressions:
+            again = measure(selected[name], args.repeat, args.min_time)
+            if again['min'] < results[name]['min']:
+                results[name] = again
+        regressions = compare(results, baseline['results'], args.threshold)
+    for name, base, current, ratio in regressions:
+        print(f"REGRESSION {name}: {base * 1e6:.2f} us -> {current * 1e6:.2f} us "
+              f"(+{(ratio - 1) * 100:.0f}% > {args.threshold * 100:.0f}%)")
+    return 1 if regressions else 0
@@ -0,0 +1 @@
+"""Client side helpers shared by harvester_api and rancher_api"""
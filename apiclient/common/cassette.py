@@ -0,0 +1,240 @@
+import base64
+import gzip
+import json
+import threading
+from collections import defaultdict
+from datetime import timedelta
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from requests import Response
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+RECORD, REPLAY = "record", "replay"
+# methods which do not change the cluster, repeats of them are treated as polling
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+# top-level fields of JSON responses which are not saved, e.g. the token from login
+REDACTED_FIELDS = ("token",)
+
+
+def request_key(request):
+    """ (method, path?query) of the request, the endpoint host is not a part of it """
+    parts = urlsplit(request.url)
+    path = parts.path.lstrip("/")
+    return request.method, f"{path}?{parts.query}" if parts.query else path
+
+
+class CassetteMiss(LookupError):
+    pass
+
+
+class RecordingAdapter(BaseAdapter):
+    """ Sends requests by the wrapped adapter, and records the responses """
+
+    def __init__(self, cassette, adapter):
+        super().__init__()
+        self.cassette = cassette
+        self.adapter = adapter
+
+    def send(self, request, stream=False, **kwargs):
+        if stream:
+            # the body of a watch is only complete when it times out, so it can't be
+            # recorded as it is consumed; callers fall back to polling which can be.
+            resp = self.cassette.build_response(request, 404, dict(
+                type="error", status=404, message="streaming is not recorded"))
+        else:
+            resp = self.adapter.send(request, stream=stream, **kwargs)
+        self.cassette.record(request, resp)
+        return resp
+
+    def close(self):
+        self.adapter.close()
+
+
+class ReplayAdapter(BaseAdapter):
+    """ Responds requests with recorded responses, without any connection """
+
+    def __init__(self, cassette):
+        super().__init__()
+        self.cassette = cassette
+
+    def send(self, request, **kwargs):
+        return self.cassette.replay(request)
+
+    def close(self):
+        pass
+
+
+class Cassette:
+    """ Record requests and responses of API clients to a file, and replay them
+
+    Interactions are saved as gzipped JSON, bodies are kept as text and only the
+    `Content-Type` header of responses is recorded.
+
+    Responses are replayed in the recorded order per (method, path?query), and
+    the last one is repeated after they are exhausted. With `collapse`, repeated
+    reads of an URL which are not interleaved with any modifying request are
+    collapsed into the last of them, so poll loops get the final state at once.
+
+    Values which are different in each run (e.g. generated names) should be
+    taken by `value` so that the replaying run makes the same requests.
+
+    Usage:
+        with Cassette("apis.json.gz", "record") as cassette:
+            api = HarvesterAPI(endpoint)
+            api.enable_cassette(cassette)
+            ...
+    """
+    VERSION = 1
+
+    def __init__(self, path, mode=REPLAY, collapse=False):
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"mode should be {RECORD!r} or {REPLAY!r}, not {mode!r}")
+        self.path = Path(path)
+        self.mode = mode
+        self.collapse = collapse
+        self.interactions = []
+        self.values = defaultdict(list)
+        self._lock = threading.Lock()
+        self._queues = self._positions = None
+        self._segment = 0
+        if REPLAY == mode:
+            self.load()
+
+    def __repr__(self):
+        return (f"{__class__.__name__}({str(self.path)!r}, {self.mode!r}"
+                f", collapse={self.collapse})")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        if RECORD == self.mode:
+            self.save()
+
+    def attach(self, session):
+        """ Mount to the session, after its adapters (e.g. retries) are settled """
+        for prefix in ("https://", "http://"):
+            if RECORD == self.mode:
+                adapter = session.get_adapter(prefix)
+                if isinstance(adapter, RecordingAdapter):
+                    adapter = adapter.adapter
+                session.mount(prefix, RecordingAdapter(self, adapter))
+            else:
+                session.mount(prefix, ReplayAdapter(self))
+        return self
+
+    def value(self, key, factory):
+        """ Returns `factory()` when recording, or the recorded value of the same turn """
+        with self._lock:
+            if RECORD == self.mode:
+                self.values[key].append(factory())
+                return self.values[key][-1]
+            idx = self._positions[("value", key)]
+            recorded = self.values.get(key, ())
+            if idx >= len(recorded):
+                raise CassetteMiss(f"No more recorded values of {key!r} in {self.path}")
+            self._positions[("value", key)] += 1
+            return recorded[idx]
+
+    def record(self, request, resp):
+        body = resp.content or b""
+        if "json" in resp.headers.get("Content-Type", ""):
+            body = self._redact(body)
+        try:
+            content, encoding = body.decode("utf-8"), None
+        except UnicodeDecodeError:
+            content, encoding = base64.b64encode(body).decode(), "base64"
+        entry = dict(
+            method=request.method, url=request_key(request)[1],
+            status=resp.status_code, reason=resp.reason,
+            type=resp.headers.get("Content-Type"), body=content
+        )
+        if encoding:
+            entry['encoding'] = encoding
+        with self._lock:
+            self.interactions.append(entry)
+
+    @staticmethod
+    def _redact(body):
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return body
+        if not isinstance(data, dict) or not set(REDACTED_FIELDS) & set(data):
+            return body
+        data.update((k, "redacted") for k in REDACTED_FIELDS if k in data)
+        return json.dumps(data).encode()
+
+    def build_response(self, request, status, body, content_type="application/json",
+                       reason=None):
+        resp = Response()
+        resp.status_code, resp.reason = status, reason
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode()
+        resp._content = body.encode() if isinstance(body, str) else body
+        resp.headers = CaseInsensitiveDict()
+        if content_type:
+            resp.headers['Content-Type'] = content_type
+        resp.headers['Content-Length'] = str(len(resp._content))
+        resp.encoding = "utf-8"
+        resp.url, resp.request = request.url, request
+        resp.elapsed = timedelta(0)
+        return resp
+
+    def replay(self, request):
+        method, url = key = request_key(request)
+        with self._lock:
+            if method not in SAFE_METHODS:
+                self._segment += 1
+            entries = self._queues.get(key)
+            if not entries:
+                raise CassetteMiss(f"{method} {url} is not recorded in {self.path}")
+            if self.collapse and method in SAFE_METHODS:
+                # the last response recorded before the same count of modifying requests
+                entry = entries[0][1]
+                for segment, candidate in entries:
+                    if segment > self._segment:
+                        break
+                    entry = candidate
+            else:
+                idx = self._positions[key]
+                self._positions[key] = idx + 1
+                entry = entries[min(idx, len(entries) - 1)][1]
+
+        body = entry['body'].encode()
+        if entry.get('encoding') == "base64":
+            body = base64.b64decode(body)
+        return self.build_response(request, entry['status'], body, entry['type'],
+                                   entry.get('reason'))
+
+    def _index(self):
+        self._queues, self._positions = defaultdict(list), defaultdict(int)
+        self._segment = segment = 0
+        for entry in self.interactions:
+            if entry['method'] not in SAFE_METHODS:
+                segment += 1
+            self._queues[(entry['method'], entry['url'])].append((segment, entry))
+
+    def load(self):
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get('version') != self.VERSION:
+            raise ValueError(f"Unsupported cassette version {data.get('version')} of "
+                             f"{self.path}, expected {self.VERSION}")
+        self.interactions = data['interactions']
+        self.values = defaultdict(list, data.get('values', dict()))
+        self._index()
+        return self
+
+    def save(self):
+        with self._lock:
+            data = dict(version=self.VERSION, values=dict(self.values),
+                        interactions=list(self.interactions))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f".{self.path.name}.tmp")
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        tmp.replace(self.path)
+        return self.path
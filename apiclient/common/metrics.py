@@ -0,0 +1,226 @@
+import json
+import os
+import threading
+from pathlib import Path
+from urllib.parse import urlsplit, parse_qs
+
+# segments before the resource type, e.g. `v1/harvester/<type>`
+_PREFIXES = ("v1", "v3", "v3-public", "harvester")
+_PLACEHOLDERS = ("{name}", "{namespace}/{name}")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def endpoint_template(method, url):
+    """ Collapse resource names of the URL, e.g.
+
+    `GET https://host/v1/harvester/kubevirt.io.virtualmachines/default/vm1`
+    => `GET /v1/harvester/kubevirt.io.virtualmachines/{namespace}/{name}`
+    """
+    parts = urlsplit(url)
+    segs = [s for s in parts.path.split("/") if s]
+
+    if segs[:1] in (["apis"], ["api"]):
+        # kubernetes: apis/<group>/<version>/namespaces/<ns>/<plural>/<name>/<subresource>
+        size = 3 if segs[0] == "apis" else 2
+        out, rest = segs[:size], segs[size:]
+        if rest[:1] == ["namespaces"] and len(rest) > 2:
+            out, rest = out + ["namespaces", "{namespace}"], rest[2:]
+        out += rest[:1] + ["{name}"] * bool(rest[1:]) + rest[2:]
+    else:
+        # steve/norman: v1/<type>/<ns>/<name> or v3/<type>/<id>
+        out, idx = [], 0
+        if segs[:2] == ["k8s", "clusters"]:
+            # proxied to the downstream cluster
+            out, idx = ["k8s", "clusters", "{cluster}"], 3
+        while idx < len(segs) and segs[idx] in _PREFIXES:
+            out.append(segs[idx])
+            idx += 1
+        out += segs[idx:idx + 1]
+        rest = segs[idx + 1:]
+        if rest:
+            out.append(_PLACEHOLDERS[min(len(rest), 2) - 1])
+
+    template = f"{method} /{'/'.join(out)}"
+    action = parse_qs(parts.query).get("action")
+    return f"{template}?action={action[0]}" if action else template
+
+
+class LatencyHistogram:
+    """ Log-linear (HDR style) histogram with bounded relative error
+
+    Values are bucketed in microseconds by their highest `sub_bits` bits, so
+    the relative error of each bucket is at most `1 / 2**(sub_bits - 1)`.
+    """
+
+    def __init__(self, sub_bits=5):
+        self.sub_bits = sub_bits
+        self.counts = dict()
+        self.count, self.sum, self.min, self.max = 0, 0.0, None, None
+
+    def __repr__(self):
+        return f"{__class__.__name__}(count={self.count}, p50={self.percentile(50)})"
+
+    def _bucket(self, value):
+        micros = max(int(value * 1e6), 0)
+        shift = max(micros.bit_length() - self.sub_bits, 0)
+        return shift, micros >> shift
+
+    @staticmethod
+    def _upper(bucket):
+        shift, top = bucket
+        return ((top + 1) << shift) / 1e6
+
+    def record(self, value):
+        bucket = self._bucket(value)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def buckets(self):
+        """ Returns sorted (upper bound in seconds, count) of non-empty buckets """
+        return [(self._upper(b), self.counts[b])
+                for b in sorted(self.counts, key=lambda b: (b[1] << b[0]))]
+
+    def percentile(self, pct):
+        if not self.count:
+            return None
+        rank, seen = pct / 100 * self.count, 0
+        for upper, count in self.buckets():
+            seen += count
+            if seen >= rank:
+                return min(upper, self.max)
+        return self.max
+
+
+class EndpointStats:
+    def __init__(self):
+        self.codes = dict()
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.latency = LatencyHistogram()
+
+    def to_dict(self):
+        return dict(
+            count=self.latency.count, codes=dict(self.codes), retries=self.retries,
+            bytes_sent=self.bytes_sent, bytes_received=self.bytes_received,
+            latency=dict(sum=self.latency.sum, min=self.latency.min, max=self.latency.max,
+                         **{f"p{p}": self.latency.percentile(p) for p in (50, 90, 99)})
+        )
+
+
+class APIMetrics:
+    """ Per-endpoint counters and latency histograms collected by `requests` response hook
+
+    Requests failed without response (e.g. exhausted retries) are not counted.
+
+    Usage:
+        metrics = APIMetrics().attach(api.session)
+        ...
+        metrics.dump("api.prom")  # or "api.json"
+    """
+
+    def __init__(self):
+        self.endpoints = dict()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"{__class__.__name__}(endpoints={len(self.endpoints)})"
+
+    def attach(self, session):
+        if self.hook not in session.hooks["response"]:
+            session.hooks["response"].append(self.hook)
+        return self
+
+    def detach(self, session):
+        if self.hook in session.hooks["response"]:
+            session.hooks["response"].remove(self.hook)
+        return self
+
+    def hook(self, resp, *args, **kwargs):
+        req = resp.request
+        key = endpoint_template(req.method, req.url)
+        if kwargs.get("stream"):
+            received = int(resp.headers.get("Content-Length", 0))
+        else:
+            received = len(resp.content or b"")
+        history = getattr(getattr(resp.raw, "retries", None), "history", None) or ()
+
+        with self._lock:
+            stats = self.endpoints.setdefault(key, EndpointStats())
+            stats.codes[resp.status_code] = stats.codes.get(resp.status_code, 0) + 1
+            stats.retries += len(history)
+            stats.bytes_sent += int(req.headers.get("Content-Length", 0))
+            stats.bytes_received += received
+            stats.latency.record(resp.elapsed.total_seconds())
+
+    def to_dict(self):
+        with self._lock:
+            return {k: v.to_dict() for k, v in sorted(self.endpoints.items())}
+
+    def totals(self):
+        """ Returns (requests, bytes sent and received) of all endpoints """
+        with self._lock:
+            stats = list(self.endpoints.values())
+        return (sum(s.latency.count for s in stats),
+                sum(s.bytes_sent + s.bytes_received for s in stats))
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self, prefix="harvester_api"):
+        def labels(key, **extra):
+            method, endpoint = key.split(" ", 1)
+            pairs = dict(method=method, endpoint=endpoint, **extra)
+            return ",".join(f'{k}="{_escape(v)}"' for k, v in pairs.items())
+
+        lines = [
+            f"# HELP {prefix}_requests_total Responses by endpoint template and status code",
+            f"# TYPE {prefix}_requests_total counter"
+        ]
+        with self._lock:
+            endpoints = sorted(self.endpoints.items())
+        for key, stats in endpoints:
+            for code, count in sorted(stats.codes.items()):
+                lines.append(f"{prefix}_requests_total{{{labels(key, code=code)}}} {count}")
+
+        lines += [f"# HELP {prefix}_request_retries_total Retries made by urllib3 Retry",
+                  f"# TYPE {prefix}_request_retries_total counter"]
+        for key, stats in endpoints:
+            lines.append(f"{prefix}_request_retries_total{{{labels(key)}}} {stats.retries}")
+
+        lines += [f"# HELP {prefix}_transfer_bytes_total Bytes of request and response bodies",
+                  f"# TYPE {prefix}_transfer_bytes_total counter"]
+        for key, stats in endpoints:
+            for direction in ("sent", "received"):
+                value = getattr(stats, f"bytes_{direction}")
+                lbl = labels(key, direction=direction)
+                lines.append(f"{prefix}_transfer_bytes_total{{{lbl}}} {value}")
+
+        name = f"{prefix}_request_duration_seconds"
+        lines += [f"# HELP {name} Time until the response headers are received",
+                  f"# TYPE {name} histogram"]
+        for key, stats in endpoints:
+            seen = 0
+            for upper, count in stats.latency.buckets():
+                seen += count
+                lines.append(f"{name}_bucket{{{labels(key, le=f'{upper:g}')}}} {seen}")
+            lines.append(f"{name}_bucket{{{labels(key, le='+Inf')}}} {stats.latency.count}")
+            lines.append(f"{name}_sum{{{labels(key)}}} {stats.latency.sum}")
+            lines.append(f"{name}_count{{{labels(key)}}} {stats.latency.count}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        """ Write as Prometheus textfile if the suffix is `.prom`, otherwise JSON """
+        path = Path(path)
+        content = self.to_prometheus() if path.suffix == ".prom" else self.to_json()
+        # textfile collector may read the file at any time, so replace it atomically
+        tmp = path.with_name(f".{path.name}.{os.getpid()}")
+        tmp.write_text(content)
+        tmp.replace(path)
+        return path
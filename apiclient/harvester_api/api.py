@@ -4,6 +4,8 @@ import requests
 from pkg_resources import parse_version
 from requests.packages.urllib3.util.retry import Retry
 
+from common.cassette import Cassette
+from common.metrics import APIMetrics
 from .managers import (
     HostManager, KeypairManager, ImageManager, SettingManager,
     NetworkManager, VolumeManager, TemplateManager, SupportBundlemanager,
@@ -38,6 +40,11 @@ class HarvesterAPI:
             self.set_retries()
 
         self._version = None
+        self.metrics = None
+        self.cassette = None
+        # merged into metadata of objects created by managers
+        self.default_labels = dict()
+        self.default_annotations = dict()
 
         self.endpoint = endpoint
         self.hosts = HostManager(self)
@@ -128,6 +135,34 @@ class HarvesterAPI:
         self.session.mount("https://", adapter)
         self.session.mount("http://", adapter)
 
+    def enable_metrics(self, metrics=None):
+        """ Collect per-endpoint counters and latencies of this client's requests
+
+        Args:
+            metrics (APIMetrics, optional): shared with other clients, creates new one if None.
+
+        Returns:
+            APIMetrics: the attached metrics.
+        """
+        self.metrics = (metrics or APIMetrics()).attach(self.session)
+        return self.metrics
+
+    def enable_cassette(self, cassette):
+        """ Record requests and responses of this client, or replay them without a server
+
+        It replaces adapters of the session, so `set_retries` should be called before.
+
+        Args:
+            cassette (Cassette|str): shared with other clients, or path of the file to replay.
+
+        Returns:
+            Cassette: the attached cassette.
+        """
+        if not isinstance(cassette, Cassette):
+            cassette = Cassette(cassette)
+        self.cassette = cassette.attach(self.session)
+        return self.cassette
+
     def generate_kubeconfig(self):
         path = "v1/management.cattle.io.clusters/local?action=generateKubeconfig"
         r = self._post(path)
@@ -0,0 +1,772 @@
+""" In-process fake of the Harvester API for offline and load testing
+
+It serves the REST surface used by the managers of `HarvesterAPI` over real
+HTTP, on both the Steve (`v1/harvester/<type>`) and the Kubernetes
+(`apis/<group>/<version>/...`) paths, including actions, subresources of
+VMIs, image uploads and watch streams.
+
+Objects go through the state transitions of a cluster (e.g. VMs start,
+images get imported, volumes get bound and backups become ready) after the
+configurable `delays`, and each request could be slowed down by `latency`
+or fail with injected statuses.
+
+Usage:
+    with FakeHarvesterServer(nodes=3, delays=dict(vm_start=1)) as server:
+        api = HarvesterAPI.login(server.url, "admin", "password")
+        ...
+
+    # or standalone
+    python -m harvester_api.fakeserver --port 9443 --nodes 5 --latency 0.05
+"""
+import heapq
+import json
+import re
+import threading
+from collections import Counter, defaultdict, deque
+from copy import deepcopy
+from datetime import datetime, timezone
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count
+from time import monotonic, sleep
+from urllib.parse import urlsplit, parse_qsl
+from uuid import uuid4
+
+from .managers import (
+    DEFAULT_NAMESPACE, DEFAULT_LONGHORN_NAMESPACE, VOLUME_CLAIM_TEMPLATES_ANNOTATION
+)
+
+# seconds for objects to step into the next state
+DELAYS = dict(
+    vm_start=0,  # VMI scheduled -> running with IPs and the guest agent
+    vm_stop=0,  # VMI deleted
+    migrate=0,  # VMI moved to the target node
+    image_import=0,  # image downloaded
+    volume_bind=0,  # PVC bound with the Longhorn volume
+    backup=0,  # backup or snapshot ready to use
+    restore=0,  # restore completed
+    delete=0,  # object removed since its deletion timestamp
+)
+
+# types of Steve which are not namespaced
+CLUSTER_TYPES = {
+    "nodes", "metrics.k8s.io.nodes", "storage.k8s.io.storageclasses",
+    "harvesterhci.io.settings", "network.harvesterhci.io.clusternetworks",
+    "network.harvesterhci.io.vlanconfigs", "harvesterhci.io.upgradelogs",
+}
+
+VM = "kubevirt.io.virtualmachines"
+VMI = "kubevirt.io.virtualmachineinstances"
+IMAGE = "harvesterhci.io.virtualmachineimages"
+PVC = "persistentvolumeclaims"
+BACKUP = "harvesterhci.io.virtualmachinebackups"
+RESTORE = "harvesterhci.io.virtualmachinerestores"
+LH_VOLUME = "longhorn.io.volumes"
+LH_REPLICA = "longhorn.io.replicas"
+
+
+class FakeError(Exception):
+    def __init__(self, status, reason, message):
+        super().__init__(status, reason, message)
+        self.status, self.reason, self.message = status, reason, message
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _merge(patch, target):
+    """ JSON merge patch (RFC 7386) of `patch` into a copy of `target` """
+    if not isinstance(patch, dict):
+        return deepcopy(patch)
+    rv = deepcopy(target) if isinstance(target, dict) else dict()
+    for k, v in patch.items():
+        if v is None:
+            rv.pop(k, None)
+        else:
+            rv[k] = _merge(v, rv.get(k))
+    return rv
+
+
+def match_labels(selector, labels):
+    """ Whether labels match the selector of `k=v`, `k==v`, `k!=v`, `k` and `!k` terms """
+    for term in filter(None, (t.strip() for t in (selector or "").split(","))):
+        if "!=" in term:
+            k, v = term.split("!=", 1)
+            if labels.get(k) == v:
+                return False
+        elif "=" in term:
+            k, v = re.split(r"==?", term, 1)
+            if labels.get(k) != v:
+                return False
+        elif term.startswith("!"):
+            if term[1:] in labels:
+                return False
+        elif term not in labels:
+            return False
+    return True
+
+
+class FakeCluster:
+    """ Objects of the fake cluster and their state transitions
+
+    Objects are stored by (type, namespace, name), where the type is the one
+    of Steve, e.g. `kubevirt.io.virtualmachines` or `persistentvolumeclaims`.
+    Transitions are scheduled with `after` and applied by `tick`, which is
+    called on every request.
+    """
+
+    def __init__(self, nodes=3, delays=None, version="v1.2.0"):
+        self.objects = dict()
+        self.delays = dict(DELAYS, **(delays or {}))
+        self.lock = threading.RLock()
+        self.changed = threading.Condition(self.lock)
+        self._rv = count(1)
+        self._tasks = []
+        self._seq = count()
+        self._ips = count(10)
+        self._nodes = count()
+        with self.lock:
+            self._seed(nodes, version)
+
+    def __repr__(self):
+        return f"{__class__.__name__}(objects={len(self.objects)})"
+
+    # storage
+
+    def get(self, type_, namespace, name):
+        obj = self.objects.get((type_, namespace or "", name))
+        if not obj:
+            raise FakeError(404, "NotFound", f"{type_} {namespace}/{name} not found")
+        return obj
+
+    def list(self, type_, namespace="", selector=""):
+        return [o for (t, ns, _), o in sorted(self.objects.items())
+                if t == type_ and (not namespace or ns == namespace)
+                and match_labels(selector, o['metadata'].get('labels') or {})]
+
+    def put(self, type_, obj):
+        meta = obj.setdefault('metadata', dict())
+        meta['resourceVersion'] = str(next(self._rv))
+        key = (type_, meta.get('namespace', ""), meta['name'])
+        self.objects[key] = obj
+        self.changed.notify_all()
+        return obj
+
+    def create(self, type_, obj, namespace=""):
+        obj = deepcopy(obj)
+        meta = obj.setdefault('metadata', dict())
+        if type_ not in CLUSTER_TYPES:
+            meta['namespace'] = meta.get('namespace') or namespace or DEFAULT_NAMESPACE
+        if not meta.get('name'):
+            if not meta.get('generateName'):
+                raise FakeError(422, "Invalid", "metadata.name is required")
+            meta['name'] = f"{meta['generateName']}{uuid4().hex[:5]}"
+        if (type_, meta.get('namespace', ""), meta['name']) in self.objects:
+            raise FakeError(409, "AlreadyExists",
+                            f"{type_} {meta.get('namespace')}/{meta['name']} already exists")
+        meta.update(uid=str(uuid4()), creationTimestamp=_now())
+        obj.setdefault('status', dict())
+        self.put(type_, obj)
+        getattr(self, f"_created_{type_.replace('.', '_')}", lambda obj: None)(obj)
+        return obj
+
+    def update(self, type_, namespace, name, data, patch=False):
+        curr = self.get(type_, namespace, name)
+        obj = _merge(data, curr) if patch else deepcopy(data)
+        rv = obj.get('metadata', {}).get('resourceVersion')
+        if not patch and rv and rv != curr['metadata']['resourceVersion']:
+            raise FakeError(409, "Conflict", f"{type_} {namespace}/{name} has been modified")
+        obj['metadata'] = dict(obj.get('metadata') or {}, name=curr['metadata']['name'],
+                               uid=curr['metadata']['uid'])
+        if curr['metadata'].get('namespace'):
+            obj['metadata']['namespace'] = curr['metadata']['namespace']
+        obj.setdefault('status', curr.get('status', dict()))
+        return self.put(type_, obj)
+
+    def delete(self, type_, namespace, name):
+        obj = self.get(type_, namespace, name)
+        obj['metadata'].setdefault('deletionTimestamp', _now())
+        self.put(type_, obj)
+        getattr(self, f"_deleted_{type_.replace('.', '_')}", lambda obj: None)(obj)
+        self.after(self.delays['delete'], self.remove, type_, namespace, name)
+        return obj
+
+    def remove(self, type_, namespace, name):
+        if self.objects.pop((type_, namespace or "", name), None):
+            self.changed.notify_all()
+
+    # transitions
+
+    def after(self, delay, fn, *args):
+        """ Schedule `fn(*args)` in `delay` seconds, applied by `tick` """
+        heapq.heappush(self._tasks, (monotonic() + delay, next(self._seq), fn, args))
+        if not delay:
+            self.tick()
+
+    def tick(self):
+        """ Apply the transitions which are due """
+        with self.lock:
+            while self._tasks and self._tasks[0][0] <= monotonic():
+                _, _, fn, args = heapq.heappop(self._tasks)
+                fn(*args)
+
+    def _seed(self, nodes, version):
+        for idx in range(nodes):
+            name = f"node-{idx}"
+            labels = {"kubernetes.io/hostname": name}
+            if idx < 3:
+                labels["node-role.kubernetes.io/control-plane"] = "true"
+            self.create("nodes", dict(
+                metadata=dict(name=name, labels=labels, annotations={
+                    "rke2.io/internal-ip": f"192.168.0.{idx + 1}"
+                }),
+                spec=dict(),
+                status=dict(
+                    addresses=[dict(type="InternalIP", address=f"192.168.0.{idx + 1}"),
+                               dict(type="Hostname", address=name)],
+                    allocatable=dict(cpu="16", memory="64Gi"),
+                    capacity=dict(cpu="16", memory="64Gi"),
+                    conditions=[dict(type="Ready", status="True")],
+                    nodeInfo=dict(kubeletVersion="v1.25.9+rke2r1")
+                )
+            ))
+            self.create("metrics.k8s.io.nodes", dict(
+                metadata=dict(name=name), usage=dict(cpu="1000m", memory="8Gi")
+            ))
+        for name, value in {"server-version": version, "backup-target": "",
+                            "storage-network": "", "additional-ca": "",
+                            "vm-force-reset-policy": ""}.items():
+            self.create("harvesterhci.io.settings", dict(
+                apiVersion="harvesterhci.io/v1beta1", kind="Setting",
+                metadata=dict(name=name), default="", value=value
+            ))
+        self.create("storage.k8s.io.storageclasses", dict(
+            metadata=dict(name="harvester-longhorn", annotations={
+                "storageclass.kubernetes.io/is-default-class": "true"
+            }),
+            provisioner="driver.longhorn.io", parameters=dict(numberOfReplicas="3")
+        ))
+        self.create("network.harvesterhci.io.clusternetworks", dict(metadata=dict(name="mgmt")))
+
+    def _created_harvesterhci_io_virtualmachineimages(self, image):
+        image['status'].update(progress=0, conditions=[])
+        if "upload" != image.get('spec', {}).get('sourceType'):
+            self.after(self.delays['image_import'], self._imported, image['metadata'], 1 << 30)
+
+    def _imported(self, meta, size):
+        obj = self.objects.get((IMAGE, meta['namespace'], meta['name']))
+        if obj:
+            obj['status'].update(progress=100, size=size, storageClassName=(
+                f"longhorn-{meta['name']}"), conditions=[
+                dict(type="Imported", status="True", lastUpdateTime=_now())
+            ])
+            self.put(IMAGE, obj)
+
+    def _created_persistentvolumeclaims(self, pvc):
+        pvc['status'].update(phase="Pending")
+        self.after(self.delays['volume_bind'], self._bound, pvc['metadata'])
+
+    def _bound(self, meta):
+        pvc = self.objects.get((PVC, meta['namespace'], meta['name']))
+        if not pvc or pvc['metadata'].get('deletionTimestamp'):
+            return
+        volume = f"pvc-{pvc['metadata']['uid']}"
+        pvc.setdefault('spec', dict())['volumeName'] = volume
+        pvc['status'].update(phase="Bound", capacity=dict(
+            storage=pvc['spec'].get('resources', {}).get('requests', {}).get('storage', "10Gi")
+        ))
+        self.put(PVC, pvc)
+        self.create(LH_VOLUME, dict(
+            metadata=dict(name=volume, namespace=DEFAULT_LONGHORN_NAMESPACE),
+            spec=dict(numberOfReplicas=3),
+            status=dict(state="detached", robustness="unknown",
+                        kubernetesStatus=dict(pvcName=meta['name'], namespace=meta['namespace']))
+        ))
+        for idx, node in enumerate(self.list("nodes")[:3]):
+            self.create(LH_REPLICA, dict(
+                metadata=dict(name=f"{volume}-r-{idx}", namespace=DEFAULT_LONGHORN_NAMESPACE,
+                              labels={"longhornvolume": volume}),
+                spec=dict(volumeName=volume, nodeID=node['metadata']['name']),
+                status=dict(currentState="running")
+            ))
+
+    def _deleted_persistentvolumeclaims(self, pvc):
+        volume = pvc.get('spec', {}).get('volumeName')
+        if volume:
+            for replica in self.list(LH_REPLICA, DEFAULT_LONGHORN_NAMESPACE,
+                                     f"longhornvolume={volume}"):
+                self.remove(LH_REPLICA, DEFAULT_LONGHORN_NAMESPACE, replica['metadata']['name'])
+            self.remove(LH_VOLUME, DEFAULT_LONGHORN_NAMESPACE, volume)
+
+    def _created_kubevirt_io_virtualmachines(self, vm):
+        meta = vm['metadata']
+        claims = json.loads(meta.get('annotations', {}).get(VOLUME_CLAIM_TEMPLATES_ANNOTATION)
+                            or "[]")
+        for claim in claims:
+            key = (PVC, meta['namespace'], claim['metadata']['name'])
+            if key not in self.objects:
+                self.create(PVC, claim, meta['namespace'])
+        vm['status'].update(printableStatus="Stopped", ready=False, created=False)
+        spec = vm.get('spec', {})
+        if spec.get('running') or spec.get('runStrategy') in ("Always", "RerunOnFailure"):
+            self.start_vm(vm)
+
+    def _deleted_kubevirt_io_virtualmachines(self, vm):
+        self.stop_vm(vm)
+
+    def start_vm(self, vm, node=None):
+        meta = vm['metadata']
+        if (VMI, meta['namespace'], meta['name']) in self.objects:
+            return
+        template = vm['spec'].get('template', {})
+        vmi = self.create(VMI, dict(
+            metadata=dict(name=meta['name'], namespace=meta['namespace'],
+                          labels=dict(template.get('metadata', {}).get('labels') or {}),
+                          ownerReferences=[dict(kind="VirtualMachine", name=meta['name'],
+                                                uid=meta['uid'])]),
+            spec=deepcopy(template.get('spec', {})),
+            status=dict(phase="Scheduling", conditions=[], interfaces=[])
+        ))
+        vm['status'].update(printableStatus="Starting", created=True)
+        self.put(VM, vm)
+        self.after(self.delays['vm_start'], self._running, vmi['metadata'], node)
+
+    def _running(self, meta, node=None):
+        vmi = self.objects.get((VMI, meta['namespace'], meta['name']))
+        if not vmi or vmi['metadata']['uid'] != meta['uid']:
+            return
+        nodes = self.list("nodes")
+        node = node or nodes[next(self._nodes) % len(nodes)]['metadata']['name']
+        ifaces = []
+        for net in vmi['spec'].get('networks', []):
+            ip = next(self._ips)
+            ifaces.append(dict(name=net['name'], ipAddress=f"10.52.{ip >> 8 & 255}.{ip & 255}",
+                               mac=f"52:54:00:00:{ip >> 8 & 255:02x}:{ip & 255:02x}"))
+        vmi['status'].update(phase="Running", nodeName=node, interfaces=ifaces, conditions=[
+            dict(type="Ready", status="True"), dict(type="AgentConnected", status="True")
+        ], guestOSInfo=dict(id="fake", name="Fake OS"))
+        self.put(VMI, vmi)
+        vm = self.objects.get((VM, meta['namespace'], meta['name']))
+        if vm:
+            vm['status'].update(printableStatus="Running", ready=True)
+            self.put(VM, vm)
+
+    def stop_vm(self, vm):
+        meta = vm['metadata']
+        if (VMI, meta['namespace'], meta['name']) not in self.objects:
+            return
+        vm['status'].update(printableStatus="Stopping", ready=False)
+        self.put(VM, vm)
+        self.after(self.delays['vm_stop'], self._stopped, meta)
+
+    def _stopped(self, meta):
+        self.remove(VMI, meta['namespace'], meta['name'])
+        vm = self.objects.get((VM, meta['namespace'], meta['name']))
+        if vm:
+            vm['status'].update(printableStatus="Stopped", ready=False, created=False)
+            self.put(VM, vm)
+
+    def _created_harvesterhci_io_virtualmachinebackups(self, backup):
+        source = backup.get('spec', {}).get('source', {}).get('name')
+        vm = self.get(VM, backup['metadata']['namespace'], source)
+        backup.setdefault('spec', dict()).setdefault('type', "backup")
+        backup['status'].update(readyToUse=False, source=dict(
+            metadata=dict(name=source, namespace=vm['metadata']['namespace']),
+            spec=deepcopy(vm['spec'])
+        ))
+        self.after(self.delays['backup'], self._ready_to_use, backup['metadata'])
+
+    def _ready_to_use(self, meta):
+        backup = self.objects.get((BACKUP, meta['namespace'], meta['name']))
+        if backup:
+            backup['status'].update(readyToUse=True, creationTime=_now())
+            self.put(BACKUP, backup)
+
+    def _created_harvesterhci_io_virtualmachinerestores(self, restore):
+        spec, ns = restore['spec'], restore['metadata']['namespace']
+        backup = self.get(BACKUP, spec.get('virtualMachineBackupNamespace') or ns,
+                          spec['virtualMachineBackupName'])
+        if not backup['status'].get('readyToUse'):
+            raise FakeError(422, "Invalid", f"Backup {backup['metadata']['name']} is not ready")
+        restore['status'].update(complete=False)
+        self.after(self.delays['restore'], self._restored, restore['metadata'], backup)
+
+    def _restored(self, meta, backup):
+        restore = self.objects.get((RESTORE, meta['namespace'], meta['name']))
+        if not restore:
+            return
+        target = restore['spec']['target']['name']
+        vm_spec = deepcopy(backup['status']['source']['spec'])
+        if restore['spec'].get('newVM'):
+            self.create(VM, dict(metadata=dict(name=target, namespace=meta['namespace']),
+                                 spec=vm_spec))
+        else:
+            vm = self.get(VM, meta['namespace'], target)
+            vm['spec'] = vm_spec
+            self.put(VM, vm)
+            self.start_vm(vm)
+        restore['status'].update(complete=True)
+        self.put(RESTORE, restore)
+
+    def action(self, type_, namespace, name, action, body):
+        """ Steve action `?action=<action>` on the object """
+        obj = self.get(type_, namespace, name)
+        if VM == type_:
+            if "start" == action:
+                obj['spec'].pop('running', None)
+                obj['spec']['runStrategy'] = "RerunOnFailure"
+                self.start_vm(obj)
+            elif "stop" == action:
+                obj['spec'].pop('running', None)
+                obj['spec']['runStrategy'] = "Halted"
+                self.stop_vm(obj)
+            elif action in ("restart", "softreboot"):
+                self.remove(VMI, namespace, name)
+                self.start_vm(obj)
+            elif "migrate" == action:
+                vmi = self.get(VMI, namespace, name)
+                vmi['status']['migrationState'] = dict(targetNode=body.get('nodeName'))
+                self.put(VMI, vmi)
+                self.after(self.delays['migrate'], self._running, vmi['metadata'],
+                           body.get('nodeName'))
+            elif action in ("pause", "unpause"):
+                vmi = self.get(VMI, namespace, name)
+                conds = [c for c in vmi['status']['conditions'] if c['type'] != "Paused"]
+                if "pause" == action:
+                    conds.append(dict(type="Paused", status="True"))
+                vmi['status']['conditions'] = conds
+                self.put(VMI, vmi)
+            elif "backup" == action:
+                self.create(BACKUP, dict(
+                    metadata=dict(name=body['name'], namespace=namespace),
+                    spec=dict(type="backup", source=dict(apiGroup="kubevirt.io",
+                                                         kind="VirtualMachine", name=name))
+                ))
+            elif "clone" == action:
+                self.create(VM, dict(metadata=dict(name=body['targetVm'], namespace=namespace),
+                                     spec=deepcopy(obj['spec'])))
+            elif action in ("addVolume", "removeVolume"):
+                volumes = obj['spec']['template']['spec'].setdefault('volumes', [])
+                volumes[:] = [v for v in volumes if v['name'] != body['diskName']]
+                if "addVolume" == action:
+                    volumes.append(dict(name=body['diskName'], persistentVolumeClaim=dict(
+                        claimName=body['volumeSourceName'], hotpluggable=True
+                    )))
+            elif "abortMigration" != action:
+                raise FakeError(400, "BadRequest", f"Unknown action {action!r} of VM")
+            self.put(VM, obj)
+        elif "nodes" == type_ and action.endswith("MaintenanceMode"):
+            enable = action.startswith("enable")
+            obj['spec']['unschedulable'] = enable
+            annotations = obj['metadata'].setdefault('annotations', dict())
+            if enable:
+                annotations["harvesterhci.io/maintain-status"] = "completed"
+            else:
+                annotations.pop("harvesterhci.io/maintain-status", None)
+            self.put(type_, obj)
+        elif PVC == type_ and "export" == action:
+            self.create(IMAGE, dict(
+                metadata=dict(generateName="image-", namespace=body.get('namespace', namespace)),
+                spec=dict(displayName=body['displayName'], sourceType="export-from-volume",
+                          pvcName=name, pvcNamespace=namespace)
+            ))
+        elif IMAGE == type_ and "upload" == action:
+            self._imported(obj['metadata'], len(body or b""))
+        else:
+            raise FakeError(400, "BadRequest", f"Unknown action {action!r} of {type_}")
+        return obj
+
+    def subresource(self, namespace, name, op):
+        vmi = self.get(VMI, namespace, name)
+        if "guestosinfo" == op:
+            if not any("AgentConnected" == c['type'] for c in vmi['status']['conditions']):
+                raise FakeError(409, "Conflict", "VMI does not have guest agent connected")
+            return vmi['status']['guestOSInfo']
+        raise FakeError(404, "NotFound", f"Subresource {op!r} of VMI not found")
+
+
+class FakeHarvesterServer:
+    """ Serve `FakeCluster` over HTTP in a background thread
+
+    Args:
+        nodes (int): number of nodes seeded, the first 3 are control planes.
+        delays (dict): seconds of state transitions, see `DELAYS`.
+        latency (float or callable): seconds to delay each request, or
+            `latency(method, path)` returning it.
+        host, port: address to listen, a free port is picked by default.
+    """
+
+    def __init__(self, nodes=3, delays=None, latency=0, host="127.0.0.1", port=0):
+        self.cluster = FakeCluster(nodes, delays)
+        self.latency = latency
+        # counted and consumed by the handler threads, guarded by the lock of the cluster
+        self.calls = Counter()  # {(method, path): count}
+        self._faults = defaultdict(deque)  # {(method, regex): statuses}
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    def __repr__(self):
+        return f"{__class__.__name__}({self.url!r})"
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.stop()
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, args=(0.05,),
+                                        daemon=True, name="fake-harvester")
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._thread.join()
+
+    def fail(self, method, pattern, *statuses):
+        """ Respond the next requests matching `method` and the path regex with `statuses` """
+        with self.cluster.lock:
+            self._faults[(method.upper(), pattern)].extend(statuses)
+
+    def _fault(self, method, path):
+        with self.cluster.lock:
+            for (meth, pattern), statuses in self._faults.items():
+                if meth == method and statuses and re.search(pattern, path):
+                    return statuses.popleft()
+        return None
+
+    def _handler(self):
+        server = self
+
+        class Handler(_Handler):
+            fake = server
+
+        return Handler
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    fake = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def do_PUT(self):
+        self.dispatch("PUT")
+
+    def do_PATCH(self):
+        self.dispatch("PATCH")
+
+    def do_DELETE(self):
+        self.dispatch("DELETE")
+
+    def respond(self, status, data=None, steve=True):
+        if isinstance(data, FakeError):
+            if steve:
+                data = dict(type="error", status=data.status, code=data.reason,
+                            message=data.message)
+            else:
+                data = dict(kind="Status", apiVersion="v1", status="Failure",
+                            code=data.status, reason=data.reason, message=data.message)
+        body = b"" if data is None else json.dumps(data).encode()
+        self.send_response(status)
+        if data is not None:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_body(self):
+        size = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(size) if size else b""
+        ctype = self.headers.get("Content-Type", "")
+        if ctype.startswith("multipart/"):
+            head = f"Content-Type: {ctype}\r\n\r\n".encode()
+            msg = BytesParser(policy=policy.default).parsebytes(head + raw)
+            return b"".join(part.get_payload(decode=True) or b"" for part in msg.iter_parts())
+        if raw and "json" in ctype:
+            return json.loads(raw)
+        return raw or dict()
+
+    def dispatch(self, method):
+        url = urlsplit(self.path)
+        path, params = url.path.strip("/"), dict(parse_qsl(url.query))
+        fake, cluster = self.fake, self.fake.cluster
+        with cluster.lock:
+            fake.calls[(method, path)] += 1
+        body = self.read_body()
+
+        latency = fake.latency(method, path) if callable(fake.latency) else fake.latency
+        if latency:
+            sleep(latency)
+        status = fake._fault(method, path)
+        if status:
+            return self.respond(status, FakeError(status, "Injected", "Injected fault"))
+
+        try:
+            route = self.route(path)
+        except FakeError as e:
+            return self.respond(e.status, e)
+        steve = route[0] in ("steve", "login")
+        try:
+            cluster.tick()
+            if params.get('watch') in ("true", "1"):
+                return self.watch(route, params)
+            with cluster.lock:
+                status, data = self.serve(method, route, params, body)
+            self.respond(status, data, steve)
+        except FakeError as e:
+            self.respond(e.status, e, steve)
+        except (KeyError, TypeError, ValueError) as e:
+            self.respond(422, FakeError(422, "Invalid", f"Invalid request: {e!r}"), steve)
+
+    def route(self, path):
+        """ Returns (kind, type, namespace, name, extra) of the path """
+        segs = path.split("/")
+        if path.startswith("v3-public/localProviders/"):
+            return "login", None, None, None, None
+        if segs[0] == "v1":
+            segs = segs[2:] if segs[1:2] == ["harvester"] else segs[1:]
+            if not segs:
+                raise FakeError(404, "NotFound", path)
+            type_, rest = segs[0], segs[1:]
+            if rest[-1:] in (["healthz"], ["download"]):
+                return "special", type_, None, rest[0], rest[-1]
+            if type_ in CLUSTER_TYPES:
+                return "steve", type_, "", (rest + [""])[0], None
+            return "steve", type_, (rest + [""])[0], (rest + ["", ""])[1], None
+        if segs[0] in ("api", "apis"):
+            segs = segs[1:]
+            group = "" if path.startswith("api/") else segs.pop(0)
+            segs.pop(0)  # version
+            if "subresources.kubevirt.io" == group:
+                if segs == ["version"]:
+                    return "special", "version", None, None, None
+                return "subresource", VMI, segs[1], segs[3], segs[4]
+            namespace = ""
+            if segs[:1] == ["namespaces"] and len(segs) > 2:
+                namespace, segs = segs[1], segs[2:]
+            if not segs:
+                raise FakeError(404, "NotFound", path)
+            type_ = f"{group}.{segs[0]}" if group else segs[0]
+            return "k8s", type_, namespace, (segs[1:] + [""])[0], None
+        raise FakeError(404, "NotFound", path)
+
+    def serve(self, method, route, params, body):
+        kind, type_, namespace, name, extra = route
+        cluster = self.fake.cluster
+        if "login" == kind:
+            return 201, dict(token=f"token-{uuid4().hex}", type="token")
+        if "special" == kind:
+            if "version" == type_:
+                return 200, dict(gitVersion="v0.59.0", platform="linux/amd64")
+            return 200, dict()
+        if "subresource" == kind:
+            return 200, cluster.subresource(namespace, name, extra)
+
+        if "POST" == method and params.get('action'):
+            cluster.action(type_, namespace, name, params['action'], body)
+            return 204, None
+        if "GET" == method and not name:
+            items = cluster.list(type_, namespace, params.get('labelSelector'))
+            if "steve" == kind:
+                return 200, dict(type="collection", resourceType=type_,
+                                 data=[self.steve(type_, o) for o in items])
+            return 200, dict(kind="List", apiVersion="v1", items=items,
+                             metadata=dict(resourceVersion=str(next(cluster._rv))))
+        if "GET" == method:
+            obj = cluster.get(type_, namespace, name)
+        elif "POST" == method:
+            obj = cluster.create(type_, body, namespace)
+            return 201, self.steve(type_, obj) if "steve" == kind else obj
+        elif method in ("PUT", "PATCH"):
+            obj = cluster.update(type_, namespace, name, body, patch="PATCH" == method)
+        elif "DELETE" == method:
+            obj = cluster.delete(type_, namespace, name)
+        return 200, self.steve(type_, obj) if "steve" == kind else obj
+
+    @staticmethod
+    def steve(type_, obj):
+        meta = obj['metadata']
+        uid = f"{meta['namespace']}/{meta['name']}" if meta.get('namespace') else meta['name']
+        return dict(obj, id=uid, type=type_.rstrip("s"))
+
+    def watch(self, route, params):
+        """ Stream events of the objects in chunks until `timeoutSeconds` """
+        _, type_, namespace, _, _ = route
+        cluster = self.fake.cluster
+        name = (params.get('fieldSelector') or "").partition("metadata.name=")[2]
+        endtime = monotonic() + float(params.get('timeoutSeconds') or 1800)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        sent = dict()  # {name: resourceVersion}
+        try:
+            while monotonic() < endtime:
+                with cluster.lock:
+                    cluster.tick()
+                    objs = {o['metadata']['name']: o for o in cluster.list(
+                            type_, namespace, params.get('labelSelector'))
+                            if not name or o['metadata']['name'] == name}
+                    events = [("DELETED", sent.pop(n)[1]) for n in set(sent) - set(objs)]
+                    for n, o in objs.items():
+                        if n not in sent or sent[n][0] != o['metadata']['resourceVersion']:
+                            events.append(("MODIFIED" if n in sent else "ADDED", deepcopy(o)))
+                            sent[n] = (o['metadata']['resourceVersion'], deepcopy(o))
+                    if not events:
+                        # wake up for changes or the transitions to be due
+                        cluster.changed.wait(0.05)
+                for etype, obj in events:
+                    line = json.dumps(dict(type=etype, object=obj)).encode() + b"\n"
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        self.close_connection = True
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9443)
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0, help="seconds per request")
+    for key in DELAYS:
+        parser.add_argument(f"--{key.replace('_', '-')}", type=float, default=DELAYS[key],
+                            help=f"seconds of {key} transition")
+    args = parser.parse_args(argv)
+
+    delays = {k: getattr(args, k) for k in DELAYS}
+    server = FakeHarvesterServer(args.nodes, delays, args.latency, args.host, args.port)
+    print(f"Serving fake Harvester API at {server.url}", flush=True)
+    with server:
+        try:
+            server._thread.join()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from time import sleep
+
+from .managers import BaseManager
+
+# deleted stage by stage, objects of a stage are deleted concurrently
+STAGES = (
+    ("kubevirt.io.virtualmachines", "harvesterhci.io.virtualmachinebackups",
+     "harvesterhci.io.virtualmachinerestores"),
+    ("persistentvolumeclaims",),
+    ("harvesterhci.io.virtualmachineimages", "harvesterhci.io.keypairs",
+     "harvesterhci.io.virtualmachinetemplates", "k8s.cni.cncf.io.network-attachment-definitions")
+)
+
+
+class LeakCollector(BaseManager):
+    """ Find objects by label selector in all namespaces and delete them concurrently
+
+    VMs (and backups) are deleted first, then volumes including the ones of
+    the VMs, then images, keypairs, templates and networks. VMs restored into
+    new ones are created by the controller without labels, they are found by
+    the labeled restores instead.
+
+    Usage:
+        collector = LeakCollector(api, "tests.harvesterhci.io/test-run-id=abc")
+        errors = collector.delete(collector.find())
+    """
+    PATH_fmt = "v1/harvester/{type}{uid}"
+
+    def __init__(self, api, selector, max_workers=8, wait_timeout=300):
+        super().__init__(api)
+        self.selector = selector
+        self.max_workers = max_workers
+        self.wait_timeout = wait_timeout
+
+    def __repr__(self):
+        return f"{__class__.__name__}({self.selector!r})"
+
+    def find(self):
+        """ Returns {type: {(namespace, name)}} of objects matching the selector """
+        found = {t: set() for types in STAGES for t in types}
+        for type_ in found:
+            path = self.PATH_fmt.format(type=type_, uid="")
+            code, data = self._get(path, params=dict(labelSelector=self.selector))
+            if 200 != code:
+                continue
+            for item in data.get('data', []):
+                meta = item['metadata']
+                found[type_].add((meta.get('namespace', ""), meta['name']))
+                if "kubevirt.io.virtualmachines" == type_:
+                    self._add_claims(found, item)
+                elif ("harvesterhci.io.virtualmachinerestores" == type_
+                      and item['spec'].get('newVM')):
+                    namespace, vm_name = meta['namespace'], item['spec']['target']['name']
+                    found["kubevirt.io.virtualmachines"].add((namespace, vm_name))
+                    vm_code, vm = self._get(self.PATH_fmt.format(
+                        type="kubevirt.io.virtualmachines", uid=f"/{namespace}/{vm_name}"))
+                    if 200 == vm_code:
+                        self._add_claims(found, vm)
+        return {t: sorted(objs) for t, objs in found.items() if objs}
+
+    @staticmethod
+    def _add_claims(found, vm):
+        # volumes created before they were labeled
+        for vol in vm['spec']['template']['spec'].get('volumes', []):
+            if 'persistentVolumeClaim' in vol:
+                claim = vol['persistentVolumeClaim']['claimName']
+                found["persistentvolumeclaims"].add((vm['metadata']['namespace'], claim))
+
+    def _delete_and_wait(self, type_, namespace, name):
+        path = self.PATH_fmt.format(type=type_, uid=f"/{namespace}/{name}" if namespace
+                                    else f"/{name}")
+        code, data = self._delete(path)
+        if code not in (200, 202, 204, 404):
+            return type_, namespace, name, f"Status({code}): {data}"
+
+        endtime = datetime.now() + timedelta(seconds=self.wait_timeout)
+        while endtime > datetime.now():
+            code, data = self._get(path)
+            if 404 == code:
+                return None
+            sleep(3)
+        return type_, namespace, name, f"still exists after {self.wait_timeout}s"
+
+    def delete(self, found):
+        """ Delete objects returned by `find`, returns [(type, namespace, name, error)] """
+        errors = []
+        with ThreadPoolExecutor(self.max_workers) as executor:
+            for types in STAGES:
+                jobs = [(t, ns, name) for t in types for ns, name in found.get(t, ())]
+                results = executor.map(lambda job: self._delete_and_wait(*job), jobs)
+                errors.extend(r for r in results if r)
+        return errors
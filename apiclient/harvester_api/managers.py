@@ -1,6 +1,8 @@
 import json
+from io import BytesIO
 from weakref import ref
 from pathlib import Path
+from secrets import token_hex
 from collections.abc import Mapping
 
 from pkg_resources import parse_version
@@ -15,6 +17,7 @@ DEFAULT_HARVESTER_NAMESPACE = "harvester-system"
 DEFAULT_LONGHORN_NAMESPACE = "longhorn-system"
 
 DEFAULT_STORAGE_CLASS_ANNOTATION = "storageclass.kubernetes.io/is-default-class"
+VOLUME_CLAIM_TEMPLATES_ANNOTATION = "harvesterhci.io/volumeClaimTemplates"
 
 
 def merge_dict(src, dest):
@@ -26,6 +29,27 @@ def merge_dict(src, dest):
     return dest
 
 
+def stamp_metadata(data, labels, annotations):
+    """ Returns a copy of the object with labels and annotations merged, its own ones win
+
+    Volumes created by Harvester from the VM's volume claim templates are labeled as well.
+    """
+    if not (labels or annotations) or not isinstance(data.get("metadata"), Mapping):
+        return data
+
+    meta = dict(data['metadata'])
+    meta['labels'] = {**labels, **(meta.get('labels') or {})}
+    meta['annotations'] = {**annotations, **(meta.get('annotations') or {})}
+    claims = meta['annotations'].get(VOLUME_CLAIM_TEMPLATES_ANNOTATION)
+    if claims and labels:
+        claims = json.loads(claims)
+        for claim in claims:
+            claim_meta = claim.setdefault('metadata', {})
+            claim_meta['labels'] = {**labels, **(claim_meta.get('labels') or {})}
+        meta['annotations'][VOLUME_CLAIM_TEMPLATES_ANNOTATION] = json.dumps(claims)
+    return dict(data, metadata=meta)
+
+
 class BaseManager:
     def __init__(self, api):
         self._api = ref(api)
@@ -55,6 +79,8 @@ class BaseManager:
         return self._delegate("_get", path, raw=raw, **kwargs)
 
     def _create(self, path, *, raw=False, **kwargs):
+        if isinstance(kwargs.get("json"), Mapping):
+            kwargs["json"] = self._stamp(kwargs["json"])
         return self._delegate("_post", path, raw=raw, **kwargs)
 
     def _update(self, path, data, *, raw=False, as_json=True, **kwargs):
@@ -71,6 +97,21 @@ class BaseManager:
     def _patch(self, path, *, raw=False, **kwargs):
         return self._delegate("_patch", path, raw=raw, **kwargs)
 
+    def _stamp(self, data):
+        """ Merge `default_labels` and `default_annotations` of the API into the new object """
+        return stamp_metadata(data, self.api.default_labels, self.api.default_annotations)
+
+    def _label_created(self, resp, path, *, raw=False):
+        """ Patch `default_labels` and `default_annotations` into the object at `path`,
+        which is created by the succeeded action of `resp` and could not be stamped.
+        """
+        code = resp.status_code if raw else resp[0]
+        labels, annotations = self.api.default_labels, self.api.default_annotations
+        if code in (200, 201, 204) and (labels or annotations):
+            self._patch(path, json=dict(metadata=dict(labels=dict(labels),
+                                                      annotations=dict(annotations))))
+        return resp
+
     def _inject_data(self, data):
         s = json.dumps(data).replace("{API_VERSION}", self.api.API_VERSION)
         return json.loads(s)
@@ -122,13 +163,53 @@ class HostManager(BaseManager):
         return self._create(self.PATH_fmt.format(uid=name), params=params, json=payload)
 
 
+class MultipartFile:
+    """ Body of `multipart/form-data` with a file field, read from the file block by block
+
+    `files=` of requests builds the whole body in memory, which takes as much as the
+    image. This one has the length, so it's sent with `Content-Length` as a stream.
+    """
+
+    def __init__(self, field, fileobj, filename, size):
+        self.boundary = token_hex(16)
+        head = (f'--{self.boundary}\r\n'
+                f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+                'Content-Type: application/octet-stream\r\n\r\n').encode()
+        tail = f"\r\n--{self.boundary}--\r\n".encode()
+        self._parts = [BytesIO(head), fileobj, BytesIO(tail)]
+        self._len = len(head) + size + len(tail)
+
+    def __repr__(self):
+        return f"{__class__.__name__}({self.boundary!r}, {self._len})"
+
+    def __len__(self):
+        return self._len
+
+    @property
+    def content_type(self):
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def read(self, size=-1):
+        chunks = []
+        while self._parts and size:
+            data = self._parts[0].read(size)
+            if not data:
+                self._parts.pop(0)
+                continue
+            chunks.append(data)
+            if size > 0:
+                size -= len(data)
+        return b"".join(chunks)
+
+
 class ImageManager(BaseManager):
     # get, create, update, delete
     PATH_fmt = "apis/{{API_VERSION}}/namespaces/{ns}/virtualmachineimages/{uid}"
     UPLOAD_fmt = "v1/harvester/harvesterhci.io.virtualmachineimages/{ns}/{uid}"
     _KIND = "VirtualMachineImage"
 
-    def create_data(self, name, url, desc, stype, namespace, display_name=None):
+    def create_data(self, name, url, desc, stype, namespace, display_name=None,
+                    checksum=None, labels=None):
         data = {
             "apiVersion": "{API_VERSION}",
             "kind": self._KIND,
@@ -145,6 +226,10 @@ class ImageManager(BaseManager):
                 "url": url
             }
         }
+        if checksum:
+            data['spec']['checksum'] = checksum
+        if labels:
+            data['metadata']['labels'] = dict(labels)
         return self._inject_data(data)
 
     def get(self, name="", namespace=DEFAULT_NAMESPACE, *, raw=False):
@@ -154,8 +239,9 @@ class ImageManager(BaseManager):
         return self._create(self.PATH_fmt.format(uid=name, ns=namespace), **kwargs)
 
     def create_by_url(self, name, url, namespace=DEFAULT_NAMESPACE,
-                      description="", display_name=None):
-        data = self.create_data(name, url, description, "download", namespace, display_name)
+                      description="", display_name=None, checksum=None, labels=None):
+        data = self.create_data(name, url, description, "download", namespace, display_name,
+                                checksum, labels)
         return self.create("", namespace, json=data)
 
     def create_by_file(self, name, filepath, namespace=DEFAULT_NAMESPACE,
@@ -165,11 +251,12 @@ class ImageManager(BaseManager):
         data = self.create_data(name, "", description, "upload", namespace, display_name)
         self.create("", namespace, json=data)
 
-        kwargs = {
-            "params": dict(action="upload", size=file.stat().st_size),
-            "files": dict(chunk=file.open('rb')),
-        }
-        return self._create(self.UPLOAD_fmt.format(uid=name, ns=namespace), raw=True, **kwargs)
+        size = file.stat().st_size
+        with file.open('rb') as f:
+            body = MultipartFile("chunk", f, file.name, size)
+            return self._create(self.UPLOAD_fmt.format(uid=name, ns=namespace), raw=True,
+                                params=dict(action="upload", size=size), data=body,
+                                headers={"Content-Type": body.content_type})
 
     def update(self, name, data, *, raw=False, as_json=True, **kwargs):
         if isinstance(data, Mapping) and as_json:
@@ -501,7 +588,8 @@ class NetworkManager(BaseManager):
         else:
             return "harvester-br0"
 
-    def create_data(self, name, namespace, vlan_id, bridge_name, mode="auto", cidr="", gateway=""):
+    def create_data(self, name, namespace, vlan_id, bridge_name, mode="auto", cidr="", gateway="",
+                    labels=None):
         data = {
             "apiVersion": self.API_VERSION,
             "kind": self._KIND,
@@ -529,6 +617,8 @@ class NetworkManager(BaseManager):
                 })
             }
         }
+        if labels:
+            data['metadata']['labels'] = dict(labels)
         return self._inject_data(data)
 
     def get(self, name="", namespace=DEFAULT_NAMESPACE, *, raw=False):
@@ -536,9 +626,9 @@ class NetworkManager(BaseManager):
         return self._get(path, raw=raw)
 
     def create(self, name, vlan_id, namespace=DEFAULT_NAMESPACE, *,
-               cluster_network=None, mode="auto", cidr="", gateway="", raw=False):
+               cluster_network=None, mode="auto", cidr="", gateway="", labels=None, raw=False):
         data = self.create_data(name, namespace, vlan_id, self._bridge_name(cluster_network),
-                                mode=mode, cidr=cidr, gateway=gateway)
+                                mode=mode, cidr=cidr, gateway=gateway, labels=labels)
         path = self.PATH_fmt.format(uid="", ns=namespace, NETWORK_API=self.API_VERSION)
         return self._create(path, json=data, raw=raw)
 
@@ -723,6 +813,7 @@ class ClusterNetworkManager(BaseManager):
 
 class VirtualMachineManager(BaseManager):
     API_VERSION = "kubevirt.io/v1"
+    VM_API = API_VERSION
 
     # operators: start, restart, stop, migrate, pause, unpause, softreboot
     PATH_fmt = "v1/harvester/kubevirt.io.virtualmachines/{ns}{uid}"
@@ -730,11 +821,13 @@ class VirtualMachineManager(BaseManager):
     VMI_fmt = "v1/harvester/kubevirt.io.virtualmachineinstances/{ns}/{uid}"
     # operators: guestosinfo, console(ws), vnc(ws)
     VMIOP_fmt = "apis/subresources.{VM_API}/namespaces/{ns}/virtualmachineinstances/{uid}/{op}"
+    # watch
+    VMI_WATCH_fmt = "apis/{VM_API}/namespaces/{ns}/virtualmachineinstances"
 
     Spec = VMSpec
 
     def download_virtctl(self, *, raw=False, **kwargs):
-        code, info = self._get(f"apis/subresources.{self.VM_API}/v1/version")
+        code, info = self._get(f"apis/subresources.{self.VM_API}/version")
         version, platform = info['gitVersion'], info['platform']
         resp = self.api.session.get("https://github.com/kubevirt/kubevirt/releases/download/"
                                     f"{version}/virtctl-{version}-{platform}", **kwargs)
@@ -751,6 +844,36 @@ class VirtualMachineManager(BaseManager):
         path = self.VMI_fmt.format(uid=name, ns=namespace)
         return self._get(path, raw=raw, **kwargs)
 
+    def guestosinfo(self, name, namespace=DEFAULT_NAMESPACE, *, raw=False, **kwargs):
+        path = self.VMIOP_fmt.format(VM_API=self.VM_API, ns=namespace, uid=name, op="guestosinfo")
+        return self._get(path, raw=raw, **kwargs)
+
+    def watch_status(self, name, namespace=DEFAULT_NAMESPACE, *, timeout=300, **kwargs):
+        """ Yields the VMI on each change of it, starts with the current one
+
+        Yields `None` when the VMI is deleted, stops after `timeout` seconds or
+        when the watch is closed. Raises `ConnectionError` if the watch cannot be
+        established, so callers could fall back to polling `get_status`.
+        """
+        path = self.VMI_WATCH_fmt.format(VM_API=self.VM_API, ns=namespace)
+        params = dict(watch="true", fieldSelector=f"metadata.name={name}",
+                      timeoutSeconds=int(timeout))
+        resp = self._get(path, raw=True, params=params, stream=True, **kwargs)
+        with resp:
+            if 200 != resp.status_code:
+                raise ConnectionError(f"Failed to watch VMI {namespace}/{name}: "
+                                      f"Status({resp.status_code}): {resp.text}")
+            for line in resp.iter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event['type'] in ("ADDED", "MODIFIED"):
+                    yield event['object']
+                elif "DELETED" == event['type']:
+                    yield None
+                elif "ERROR" == event['type']:
+                    return
+
     def create(self, name, vm_spec, namespace=DEFAULT_NAMESPACE, *, raw=False):
         if isinstance(vm_spec, self.Spec):
             vm_spec = vm_spec.to_dict(name, namespace)
@@ -771,12 +894,16 @@ class VirtualMachineManager(BaseManager):
     def clone(self, name, new_vm_name, namespace=DEFAULT_NAMESPACE, *, raw=False):
         path = self.PATH_fmt.format(uid=f"/{name}", ns=namespace)
         params = dict(action="clone")
-        return self._create(path, raw=raw, params=params, json=dict(targetVm=new_vm_name))
+        resp = self._create(path, raw=raw, params=params, json=dict(targetVm=new_vm_name))
+        return self._label_created(resp, self.PATH_fmt.format(uid=f"/{new_vm_name}",
+                                                              ns=namespace), raw=raw)
 
     def backup(self, name, backup_name, namespace=DEFAULT_NAMESPACE, *, raw=False):
         path = self.PATH_fmt.format(uid=f"/{name}", ns=namespace)
         params = dict(action="backup")
-        return self._create(path, raw=raw, params=params, json=dict(name=backup_name))
+        resp = self._create(path, raw=raw, params=params, json=dict(name=backup_name))
+        return self._label_created(resp, BackupManager.BACKUP_fmt.format(uid=f"/{backup_name}",
+                                                                         ns=namespace), raw=raw)
 
     def snapshot(self, *args, **kwargs):
         # delegate to vm_snapshot.create
@@ -846,11 +973,12 @@ class StorageClassManager(BaseManager):
         path = self.PATH_fmt.format(SC_API=self.API_VERSION, name=name)
         return self._get(path, raw=raw, **kwargs)
 
-    def create_data(self, name, replicas):
+    def create_data(self, name, replicas, labels=None):
         data = {
             "type": f"{self.API_VERSION}",
             "metadata": {
-                "name": name
+                "name": name,
+                "labels": dict(labels or {})
             },
             "parameters": {
                 "numberOfReplicas": f"{replicas}",
@@ -865,9 +993,9 @@ class StorageClassManager(BaseManager):
 
         return data
 
-    def create(self, name, replicas=3, *, raw=False):
+    def create(self, name, replicas=3, *, labels=None, raw=False):
         path = self.CREATE_PATH_fmt.format(SC_API=self.API_VERSION)
-        data = self.create_data(name, replicas)
+        data = self.create_data(name, replicas, labels)
         return self._create(path, json=data, raw=raw)
 
     def set_default(self, name, *, raw=False):
@@ -0,0 +1,158 @@
+import codecs
+import os
+import pty
+import re
+import selectors
+from datetime import datetime, timedelta
+from subprocess import Popen, TimeoutExpired
+
+
+class VMConsole:
+    """ Drive `virtctl console` on a pty, expect-style
+
+    Output is read without blocking and matched against patterns as it
+    arrives, so a command returns as soon as the prompt shows up instead of
+    after a fixed sleep, and late output is kept in the buffer instead of
+    being lost.
+
+    Once logged in, PS1 is set to `MARKER`, as the default prompt could show up
+    in the output of commands as well.
+    """
+    PROMPT = r"[#$>]\s*\Z"
+    MARKER = "__E2E_PROMPT__# "
+    LOGIN = r"login:\s*\Z"
+    PASSWORD = r"[Pp]assword:\s*\Z"
+    ESCAPE = "\x1d"  # Ctrl+], disconnect from the console
+
+    def __init__(self, virctl, name, user, passwd, command_timeout=300, prompt=PROMPT):
+        self.proc = None
+        self.virctl = virctl
+        self.name = name
+        self.user = user
+        self.passwd = passwd
+        self.timeout = command_timeout
+        self.prompt = prompt
+        self.buffer = ""
+        self._fd = self._selector = self._decoder = None
+
+    def __repr__(self):
+        return (f"{__class__.__name__}({self.virctl!r}, {self.name!r}"
+                f", {self.user!r}, {self.passwd!r}, {self.timeout})")
+
+    def __enter__(self):
+        self.login()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.logout()
+
+    def spawn(self, **kwargs):
+        master, slave = pty.openpty()
+        self.proc = Popen(f"{self.virctl} console {self.name}", shell=True, stdin=slave,
+                          stdout=slave, stderr=slave, close_fds=True, **kwargs)
+        os.close(slave)
+        os.set_blocking(master, False)
+        self._fd, self.buffer = master, ""
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(master, selectors.EVENT_READ)
+
+    def send(self, text):
+        os.write(self._fd, text.encode())
+
+    def sendline(self, text=""):
+        self.send(text + "\n")
+
+    def _read(self, timeout):
+        """ Append output arrived within `timeout` seconds into the buffer """
+        if not self._selector.select(max(timeout, 0)):
+            return
+        try:
+            data = os.read(self._fd, 4096)
+        except BlockingIOError:
+            return
+        except OSError:
+            # EIO is raised once the console process exits
+            data = b""
+        if not data:
+            raise EOFError(f"Console of {self.name} is closed:\n{self.buffer}")
+        self.buffer += self._decoder.decode(data).replace("\r", "")
+
+    def expect(self, patterns, timeout=None):
+        """ Wait for one of the patterns, returns (index, match, output before the match)
+
+        The buffer is consumed until the end of the match, raises `TimeoutError`
+        with the unmatched output if none of the patterns shows up in time.
+        """
+        if isinstance(patterns, str):
+            patterns = [patterns]
+        regexes = [re.compile(p, re.M) for p in patterns]
+        endtime = datetime.now() + timedelta(seconds=timeout or self.timeout)
+        while True:
+            for idx, regex in enumerate(regexes):
+                match = regex.search(self.buffer)
+                if match:
+                    before, self.buffer = self.buffer[:match.start()], self.buffer[match.end():]
+                    return idx, match, before
+            remains = (endtime - datetime.now()).total_seconds()
+            if remains <= 0:
+                raise TimeoutError(-1, f"Timeout waiting for {patterns} from console of "
+                                       f"{self.name}:\n{self.buffer}")
+            self._read(remains)
+
+    def login(self, timeout=None, **kwargs):
+        self.spawn(**kwargs)
+
+        endtime = datetime.now() + timedelta(seconds=timeout or self.timeout)
+        while True:
+            # the console prints nothing until a key is pressed
+            self.sendline()
+            try:
+                idx, *_ = self.expect([self.LOGIN, self.prompt], timeout=5)
+                break
+            except TimeoutError:
+                if endtime < datetime.now():
+                    raise TimeoutError(-1, "Login timeout: Unable to catch login hints.\n"
+                                       f"{self.buffer}")
+        out = ""
+        if idx == 0:
+            self.sendline(self.user)
+            self.expect(self.PASSWORD, timeout=timeout)
+            self.sendline(self.passwd)
+            _, _, out = self.expect(self.prompt, timeout=timeout)
+        self.set_marker(timeout)
+        return out
+
+    def set_marker(self, timeout=None):
+        """ Set PS1 to `MARKER` and wait for it, output before it is dropped """
+        head, tail = self.MARKER[:len(self.MARKER) // 2], self.MARKER[len(self.MARKER) // 2:]
+        # quoted in two parts, so the echoed command would not be taken as the prompt
+        self.sendline(f"export PS1='{head}''{tail}'")
+        self.expect(re.escape(self.MARKER) + r"\Z", timeout=timeout)
+
+    def logout(self):
+        if self.proc:
+            try:
+                self.sendline("exit")
+                self.send(self.ESCAPE)
+                self.proc.wait(5)
+            except (OSError, TimeoutExpired):
+                self.proc.kill()
+                self.proc.wait()
+            self._selector.close()
+            os.close(self._fd)
+            self.proc = self._fd = self._selector = None
+
+    def execute_command(self, command, *, timeout=None):
+        """ Run the command and returns its output, without the echoed command and prompt """
+        if not self.proc:
+            self.login(timeout)
+        self.buffer = ""
+        self.sendline(command)
+        _, _, out = self.expect(re.escape(self.MARKER) + r"\Z", timeout=timeout)
+        # drop the echoed command, the prompt follows the output directly
+        lines = out.split("\n")
+        if lines and lines[0].rstrip().endswith(command.strip()):
+            lines = lines[1:]
+        out = "\n".join(lines)
+        return out[:-1] if out.endswith("\n") else out
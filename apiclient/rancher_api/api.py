@@ -4,6 +4,8 @@ import requests
 from pkg_resources import parse_version
 from requests.packages.urllib3.util.retry import Retry
 
+from common.cassette import Cassette
+from common.metrics import APIMetrics
 from .managers import (
     CloudCredentialManager, ClusterRegistrationTokenManager, HarvesterConfigManager,
     KubeConfigManager, MgmtClusterManager, SecretManager, SettingManager,
@@ -31,6 +33,8 @@ class RancherAPI:
             self.set_retries()
 
         self._version = None
+        self.metrics = None
+        self.cassette = None
 
         self.endpoint = endpoint
         self.users = UserManager(self)
@@ -94,3 +98,31 @@ class RancherAPI:
         adapter = requests.adapters.HTTPAdapter(max_retries=retry_strategy)
         self.session.mount("https://", adapter)
         self.session.mount("http://", adapter)
+
+    def enable_metrics(self, metrics=None):
+        """ Collect per-endpoint counters and latencies of this client's requests
+
+        Args:
+            metrics (APIMetrics, optional): shared with other clients, creates new one if None.
+
+        Returns:
+            APIMetrics: the attached metrics.
+        """
+        self.metrics = (metrics or APIMetrics()).attach(self.session)
+        return self.metrics
+
+    def enable_cassette(self, cassette):
+        """ Record requests and responses of this client, or replay them without a server
+
+        It replaces adapters of the session, so `set_retries` should be called before.
+
+        Args:
+            cassette (Cassette|str): shared with other clients, or path of the file to replay.
+
+        Returns:
+            Cassette: the attached cassette.
+        """
+        if not isinstance(cassette, Cassette):
+            cassette = Cassette(cassette)
+        self.cassette = cassette.attach(self.session)
+        return self.cassette
@@ -10,7 +10,7 @@ setup(
     long_description="Unavailable",
     long_description_content_type="text/markdown",
     url="https://github.com/harvester/tests",
-    packages=find_packages(),
+    packages=find_packages(exclude=("benchmarks",)),
     install_requires=["requests"],
     classifiers=[
         "Development Status :: 1 - Planning",
@@ -0,0 +1,81 @@
+import json
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase, mock
+
+from benchmarks import cases, payloads, runner
+
+
+class TestRunner(TestCase):
+
+    def test_measure(self):
+        result = runner.measure(lambda: sum(range(100)), repeat=3, min_time=0.001)
+
+        self.assertGreater(result['number'], 1)
+        self.assertLessEqual(result['min'], result['median'])
+
+    def test_compare(self):
+        baseline = dict(a=dict(min=1.0), b=dict(min=1.0))
+        results = dict(a=dict(min=1.2), b=dict(min=1.3), c=dict(min=9.0))
+
+        regressions = runner.compare(results, baseline, 0.25)
+
+        self.assertListEqual([("b", 1.0, 1.3, 1.3)], regressions)
+
+    def test_cases(self):
+        for name, func in cases.build().items():
+            with self.subTest(name=name):
+                func()
+
+    def test_main(self):
+        fast = dict(fast=lambda: None)
+        with TemporaryDirectory() as tmpdir, mock.patch.object(cases, "build", return_value=fast):
+            path = Path(tmpdir, "baseline.json")
+            args = ["--baseline", str(path), "--repeat", "2", "--min-time", "0.001"]
+            with mock.patch("builtins.print"):
+                self.assertEqual(0, runner.main(args))
+                self.assertEqual(1, runner.main(args + ["--strict"]))
+                self.assertEqual(0, runner.main(args + ["--save"]))
+
+                # far from the threshold, a single run of a no-op is noisy
+                data = json.loads(path.read_text())
+                data['results']['fast']['min'] *= 100
+                path.write_text(json.dumps(data))
+                self.assertEqual(0, runner.main(args))
+
+                data['results']['fast']['min'] /= 100 ** 2
+                path.write_text(json.dumps(data))
+                self.assertEqual(1, runner.main(args))
+
+                # not gated by the baseline of another machine, unless strict
+                data['environment']['cpu'] = "another CPU"
+                path.write_text(json.dumps(data))
+                self.assertEqual(0, runner.main(args))
+                self.assertEqual(1, runner.main(args + ["--strict"]))
+
+    def test_environment(self):
+        env = runner.environment()
+
+        # runners of the same class share the baseline, the host name is not a part of it
+        self.assertSetEqual({"cpu", "python", "system"}, set(env))
+        with mock.patch("platform.node", return_value="another-host"):
+            self.assertDictEqual(env, runner.environment())
+
+
+class TestPayloads(TestCase):
+
+    def test_from_cassette(self):
+        from common.cassette import Cassette
+
+        vm = payloads.vm("recorded")
+        with TemporaryDirectory() as tmpdir:
+            cassette = Cassette(Path(tmpdir, "apis.json.gz"), "record")
+            cassette.interactions.append(dict(
+                method="GET", url="v1/harvester/kubevirt.io.virtualmachines/default/recorded",
+                status=200, reason="OK", type="application/json", body=json.dumps(vm)))
+            cassette.save()
+
+            loaded = payloads.from_cassette(cassette.path)
+
+        self.assertDictEqual(vm, loaded['vm'])
+        self.assertDictEqual(payloads.node(), loaded['node'])
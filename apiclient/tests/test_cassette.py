@@ -0,0 +1,92 @@
+import gzip
+import json
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from common.cassette import Cassette, CassetteMiss
+from harvester_api.api import HarvesterAPI
+from harvester_api.fakeserver import FakeHarvesterServer
+
+
+class TestCassette(TestCase):
+
+    def setUp(self):
+        self.tmpdir = TemporaryDirectory()
+        self.path = Path(self.tmpdir.name, "apis.json.gz")
+        self.server = FakeHarvesterServer(nodes=1).start()
+
+    def tearDown(self):
+        self.server.stop()
+        self.tmpdir.cleanup()
+
+    def record(self, steps):
+        with Cassette(self.path, "record") as cassette:
+            api = HarvesterAPI(self.server.url)
+            api.enable_cassette(cassette)
+            api.authenticate("admin", "password")
+            results = steps(api, cassette)
+            api.session.close()
+        return results
+
+    def replay(self, steps, collapse=False):
+        cassette = Cassette(self.path, "replay", collapse=collapse)
+        api = HarvesterAPI("https://replayed.invalid")
+        api.enable_cassette(cassette)
+        api.authenticate("admin", "password")
+        return steps(api, cassette)
+
+    def test_record_and_replay(self):
+        def steps(api, cassette):
+            name = cassette.value("unique_name", lambda: "img-recorded")
+            api.images.create_by_url(name, "http://example.com/img.qcow2")
+            return [api.images.get(name), api.images.get("missing"), api.hosts.get()[0]]
+
+        recorded = self.record(steps)
+        self.server.stop()
+        replayed = self.replay(steps)
+
+        self.assertEqual(recorded, replayed)
+        self.assertEqual(200, replayed[0][0])
+        self.assertEqual(404, replayed[1][0])
+
+    def test_token_is_redacted(self):
+        self.record(lambda api, cassette: api.hosts.get())
+
+        with gzip.open(self.path, "rt") as f:
+            data = json.load(f)
+        login = next(i for i in data['interactions'] if "action=login" in i['url'])
+        self.assertEqual("redacted", json.loads(login['body'])['token'])
+
+    def test_collapse_poll_loop(self):
+        self.server.cluster.delays.update(image_import=0.3)
+
+        def poll(api, cassette):
+            api.images.create_by_url("img", "http://example.com/img.qcow2")
+            progress = []
+            while not progress or progress[-1] < 100:
+                progress.append(api.images.get("img")[1]['status'].get('progress', 0))
+            api.images.delete("img")
+            progress.append(api.images.get("img")[0])
+            return progress
+
+        recorded = self.record(poll)
+        self.assertGreater(len(recorded), 3)
+
+        self.assertEqual(recorded, self.replay(poll))
+        self.assertEqual([100, 404], self.replay(poll, collapse=True))
+
+    def test_miss(self):
+        self.record(lambda api, cassette: api.hosts.get())
+
+        with self.assertRaises(CassetteMiss):
+            self.replay(lambda api, cassette: api.images.get())
+        with self.assertRaises(CassetteMiss):
+            self.replay(lambda api, cassette: cassette.value("unique_name", str))
+
+    def test_watch_is_not_recorded(self):
+        def steps(api, cassette):
+            return list(api.vms.watch_status("vm1", timeout=1))
+
+        with self.assertRaises(ConnectionError):
+            self.record(steps)
@@ -0,0 +1,174 @@
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import NamedTemporaryFile
+from time import sleep
+from unittest import TestCase
+
+from harvester_api.api import HarvesterAPI
+from harvester_api.fakeserver import FakeHarvesterServer, match_labels
+from harvester_api.leaks import LeakCollector
+
+
+class TestMatchLabels(TestCase):
+
+    def test_terms(self):
+        labels = dict(a="1", b="2")
+        cases = [("", True), ("a=1", True), ("a==1", True), ("a=2", False), ("a!=1", False),
+                 ("a!=2", True), ("a", True), ("c", False), ("!c", True), ("!a", False),
+                 ("a=1,b=2", True), ("a=1,!b", False)]
+        for selector, expected in cases:
+            with self.subTest(selector=selector):
+                self.assertEqual(expected, match_labels(selector, labels))
+
+
+class TestFakeHarvesterServer(TestCase):
+
+    def setUp(self):
+        self.server = FakeHarvesterServer(nodes=3).start()
+        self.api = HarvesterAPI.login(self.server.url, "admin", "password")
+
+    def tearDown(self):
+        self.api.session.close()
+        self.server.stop()
+
+    def create_image(self, name="img"):
+        code, data = self.api.images.create_by_url(name, "http://example.com/img.qcow2")
+        self.assertEqual(201, code, data)
+        return f"{data['metadata']['namespace']}/{data['metadata']['name']}"
+
+    def create_vm(self, name="vm1"):
+        spec = self.api.vms.Spec(1, 1)
+        spec.add_image("disk-0", self.create_image(f"{name}-img"))
+        code, data = self.api.vms.create(name, spec)
+        self.assertEqual(201, code, data)
+        return data
+
+    def test_login(self):
+        self.assertTrue(self.api.session.headers['Authorization'].startswith("Bearer "))
+        self.assertEqual("v1.2.0", self.api.cluster_version.raw)
+
+        code, data = self.api.hosts.get()
+        self.assertEqual(200, code)
+        self.assertEqual(3, len(data['data']))
+
+    def test_image_import(self):
+        self.create_image()
+
+        code, data = self.api.images.get("img")
+        self.assertEqual(200, code, data)
+        self.assertEqual(100, data['status']['progress'])
+
+        with NamedTemporaryFile("wb") as f:
+            f.write(b"x" * 1024)
+            f.flush()
+            resp = self.api.images.create_by_file("upload", f.name)
+        self.assertEqual(204, resp.status_code, resp.text)
+        code, data = self.api.images.get("upload")
+        self.assertEqual(1024, data['status']['size'])
+
+    def test_vm_lifecycle(self):
+        self.create_vm()
+
+        code, vmi = self.api.vms.get_status("vm1")
+        self.assertEqual(200, code, vmi)
+        self.assertEqual("Running", vmi['status']['phase'])
+        self.assertEqual("default", vmi['status']['interfaces'][0]['name'])
+        code, info = self.api.vms.guestosinfo("vm1")
+        self.assertEqual(200, code, info)
+
+        code, pvc = self.api.volumes.get("vm1-disk-0")
+        self.assertEqual("Bound", pvc['status']['phase'])
+        code, lhv = self.api.lhvolumes.get(pvc['spec']['volumeName'])
+        self.assertEqual(200, code, lhv)
+
+        code, data = self.api.vms.stop("vm1")
+        self.assertEqual(204, code, data)
+        code, data = self.api.vms.get_status("vm1")
+        self.assertEqual(404, code, data)
+
+    def test_watch_status(self):
+        self.server.cluster.delays.update(vm_start=0.3)
+        self.create_vm()
+
+        phases = [vmi['status']['phase'] for vmi in self.api.vms.watch_status("vm1", timeout=1)
+                  if vmi]
+
+        self.assertEqual("Scheduling", phases[0])
+        self.assertEqual("Running", phases[-1])
+
+    def test_backup_restore(self):
+        self.server.cluster.delays.update(backup=0.2)
+        self.create_vm()
+
+        code, data = self.api.vms.backup("vm1", "bak1")
+        self.assertEqual(204, code, data)
+        code, data = self.api.backups.get("bak1")
+        self.assertFalse(data['status']['readyToUse'])
+        sleep(0.3)
+        code, data = self.api.backups.get("bak1")
+        self.assertTrue(data['status']['readyToUse'])
+
+        spec = self.api.backups.RestoreSpec.for_new("vm2")
+        code, data = self.api.backups.restore("bak1", spec)
+        self.assertEqual(201, code, data)
+        code, data = self.api.vms.get_status("vm2")
+        self.assertEqual("Running", data['status']['phase'])
+
+    def test_retries(self):
+        self.api.set_retries(status_forcelist=(500, 502, 504), backoff_factor=0)
+        self.server.fail("GET", r"settings/server-version", 502, 502)
+
+        code, data = self.api.settings.get("server-version")
+
+        self.assertEqual(200, code, data)
+        calls = self.server.calls[("GET", "apis/harvesterhci.io/v1beta1/settings/server-version")]
+        self.assertEqual(3, calls)
+
+    def test_concurrency(self):
+        def create(idx):
+            return self.api.volumes.create(f"vol-{idx}", self.api.volumes.Spec(1))[0]
+
+        with ThreadPoolExecutor(8) as executor:
+            codes = list(executor.map(create, range(32)))
+
+        self.assertListEqual([201] * 32, codes)
+        code, data = self.api.volumes.get()
+        self.assertEqual(32, len(data['data']))
+        posts = sum(n for (method, path), n in self.server.calls.items()
+                    if "POST" == method and "persistentvolumeclaims" in path)
+        self.assertEqual(32, posts)
+
+    def test_leak_collector(self):
+        self.api.default_labels.update(run="r1")
+        self.create_vm()
+        self.api.default_labels.update(run="r2")
+        self.api.volumes.create("kept", self.api.volumes.Spec(1))
+
+        collector = LeakCollector(self.api, "run=r1", wait_timeout=5)
+        errors = collector.delete(collector.find())
+
+        self.assertListEqual([], errors)
+        self.assertEqual(404, self.api.vms.get("vm1")[0])
+        self.assertEqual(404, self.api.volumes.get("vm1-disk-0")[0])
+        self.assertEqual(200, self.api.volumes.get("kept")[0])
+
+    def test_leak_collector_actions(self):
+        # objects created by actions and controllers are not stamped by `_create`
+        self.api.default_labels.update(run="r1")
+        self.create_vm()
+        self.assertEqual(204, self.api.vms.backup("vm1", "bak1")[0])
+        self.assertEqual(204, self.api.vms.clone("vm1", "vm2")[0])
+        code, data = self.api.backups.restore("bak1", self.api.backups.RestoreSpec.for_new("vm3"))
+        self.assertEqual(201, code, data)
+
+        collector = LeakCollector(self.api, "run=r1", wait_timeout=5)
+        found = collector.find()
+
+        self.assertListEqual([("default", "vm1"), ("default", "vm2"), ("default", "vm3")],
+                             found["kubevirt.io.virtualmachines"])
+        self.assertListEqual([("default", "bak1")],
+                             found["harvesterhci.io.virtualmachinebackups"])
+        self.assertEqual(1, len(found["harvesterhci.io.virtualmachinerestores"]))
+        self.assertListEqual([], collector.delete(found))
+        for name in ("vm1", "vm2", "vm3"):
+            self.assertEqual(404, self.api.vms.get(name)[0])
+        self.assertEqual(404, self.api.backups.get("bak1")[0])
@@ -0,0 +1,75 @@
+from unittest import TestCase, mock
+
+from harvester_api.api import HarvesterAPI
+from harvester_api.leaks import LeakCollector
+
+
+def fake_resp(code, data=None):
+    resp = mock.MagicMock(status_code=code)
+    resp.headers = {"Content-Type": "application/json"}
+    resp.json.return_value = data if data is not None else dict()
+    return resp
+
+
+class TestLeakCollector(TestCase):
+
+    def setUp(self):
+        self.api = mock.MagicMock(spec=HarvesterAPI)
+        self.collector = LeakCollector(self.api, "run=r1", max_workers=4, wait_timeout=1)
+
+    def test_find(self):
+        vm = dict(metadata=dict(namespace="default", name="vm1"), spec=dict(template=dict(
+            spec=dict(volumes=[dict(persistentVolumeClaim=dict(claimName="vm1-disk-0")),
+                               dict(name="cloudinitdisk", cloudInitNoCloud=dict())])
+        )))
+        listing = {
+            "kubevirt.io.virtualmachines": [vm],
+            "persistentvolumeclaims": [dict(metadata=dict(namespace="default", name="vol1"))],
+        }
+
+        def get(path, **kwargs):
+            self.assertDictEqual(dict(labelSelector="run=r1"), kwargs['params'])
+            return fake_resp(200, dict(data=listing.get(path.rsplit("/", 1)[-1], [])))
+        self.api._get.side_effect = get
+
+        found = self.collector.find()
+
+        self.assertDictEqual({
+            "kubevirt.io.virtualmachines": [("default", "vm1")],
+            "persistentvolumeclaims": [("default", "vm1-disk-0"), ("default", "vol1")]
+        }, found)
+
+    def test_delete_in_stages(self):
+        deleted = []
+        self.api._delete.side_effect = lambda path, **kw: deleted.append(path) or fake_resp(200)
+        self.api._get.return_value = fake_resp(404)
+
+        errors = self.collector.delete({
+            "harvesterhci.io.virtualmachineimages": [("default", "img1")],
+            "persistentvolumeclaims": [("default", "vol1"), ("default", "vol2")],
+            "kubevirt.io.virtualmachines": [("default", "vm1")],
+        })
+
+        self.assertListEqual([], errors)
+        self.assertEqual("v1/harvester/kubevirt.io.virtualmachines/default/vm1", deleted[0])
+        self.assertSetEqual({"v1/harvester/persistentvolumeclaims/default/vol1",
+                             "v1/harvester/persistentvolumeclaims/default/vol2"},
+                            set(deleted[1:3]))
+        self.assertEqual("v1/harvester/harvesterhci.io.virtualmachineimages/default/img1",
+                         deleted[3])
+
+    def test_delete_errors(self):
+        self.api._delete.side_effect = [fake_resp(403, dict(message="denied")), fake_resp(200)]
+        self.api._get.return_value = fake_resp(200)
+
+        with mock.patch("harvester_api.leaks.sleep"):
+            errors = self.collector.delete({
+                "kubevirt.io.virtualmachines": [("default", "vm1")],
+                "harvesterhci.io.keypairs": [("default", "kp1")],
+            })
+
+        self.assertEqual(2, len(errors))
+        self.assertEqual(("kubevirt.io.virtualmachines", "default", "vm1"), errors[0][:3])
+        self.assertIn("403", errors[0][3])
+        self.assertEqual(("harvesterhci.io.keypairs", "default", "kp1"), errors[1][:3])
+        self.assertIn("still exists", errors[1][3])
@@ -1,3 +1,6 @@
+import json
+from io import BytesIO
+from email.parser import BytesParser
 from tempfile import NamedTemporaryFile
 from unittest import TestCase, mock
 from json.decoder import JSONDecodeError
@@ -5,7 +8,7 @@ from json.decoder import JSONDecodeError
 from harvester_api.api import HarvesterAPI
 from harvester_api.managers import (
     DEFAULT_NAMESPACE, merge_dict, BaseManager, HostManager, ImageManager,
-    KeypairManager, NetworkManager
+    KeypairManager, MultipartFile, NetworkManager, VirtualMachineManager
 )
 
 
@@ -17,6 +20,7 @@ class BaseTestCase(TestCase):
         self.mgr = self.manager_cls(self.api)
         self.API_VERSION = "TEST_API_VERSION"
         self.api.API_VERSION = self.API_VERSION
+        self.api.default_labels, self.api.default_annotations = dict(), dict()
 
     def tearDown(self):
         self.api.reset_mock()
@@ -94,6 +98,36 @@ class TestBaseManager(BaseTestCase):
 
         self.assertDictEqual(dict(json=data), self.api._put.call_args[1])
 
+    def test__create_stamp(self):
+        path = "/test/path"
+        claims = json.dumps([{"metadata": {"name": "disk-0"}}])
+        data = dict(metadata=dict(name="vm", labels=dict(app="vm"), annotations={
+            "harvesterhci.io/volumeClaimTemplates": claims
+        }))
+
+        # Case 1: no default labels
+        self.mgr._create(path, json=data)
+
+        self.assertIs(data, self.api._post.call_args[1]['json'])
+
+        # Case 2: merged into metadata and volume claim templates, object's own wins
+        self.api.default_labels = dict(run="r1", app="default")
+        self.api.default_annotations = dict(node="test_x.py::test_y")
+        self.mgr._create(path, json=data)
+
+        meta = self.api._post.call_args[1]['json']['metadata']
+        self.assertDictEqual(dict(run="r1", app="vm"), meta['labels'])
+        self.assertEqual("test_x.py::test_y", meta['annotations']['node'])
+        claim, = json.loads(meta['annotations']["harvesterhci.io/volumeClaimTemplates"])
+        self.assertDictEqual(dict(run="r1", app="default"), claim['metadata']['labels'])
+        # caller's data is not changed
+        self.assertDictEqual(dict(app="vm"), data['metadata']['labels'])
+
+        # Case 3: actions without metadata
+        self.mgr._create(path, params=dict(action="migrate"), json=dict(nodeName="n1"))
+
+        self.assertDictEqual(dict(nodeName="n1"), self.api._post.call_args[1]['json'])
+
 
 class TestHostManager(BaseTestCase):
     manager_cls = HostManager
@@ -202,6 +236,16 @@ class TestImageManager(BaseTestCase):
         data = self.mgr.create_data(name, url, desc, stype, namespace, display_name)
 
         self.assertEqual(display_name, data['spec']['displayName'])
+        self.assertNotIn('checksum', data['spec'])
+        self.assertNotIn('labels', data['metadata'])
+
+        # Case 3: checksum and labels assigned
+        checksum, labels = "sha512sum", {"some/label": "value"}
+        data = self.mgr.create_data(name, url, desc, stype, namespace, display_name,
+                                    checksum, labels)
+
+        self.assertEqual(checksum, data['spec']['checksum'])
+        self.assertDictEqual(labels, data['metadata']['labels'])
 
     def test_create_by_url(self):
         name, url, namespace = "ImageName", "testURL", "TestNamespace"
@@ -231,6 +275,26 @@ class TestImageManager(BaseTestCase):
             self.assertIn(name, self.api._post.call_args[0][0])
             self.assertIn(namespace, self.api._post.call_args[0][0])
 
+        # the file is streamed as the body and closed after the upload
+        body = self.api._post.call_args[1]['data']
+        self.assertIsInstance(body, MultipartFile)
+        self.assertTrue(body._parts[1].closed)
+
+    def test_multipart_file(self):
+        content = b"\x00image\r\n" * 100
+        body = MultipartFile("chunk", BytesIO(content), "disk.img", len(content))
+
+        chunks = iter(lambda: body.read(64), b"")
+        data = b"".join(chunks)
+
+        self.assertEqual(len(body), len(data))
+        msg = BytesParser().parsebytes(b"Content-Type: %s\r\n\r\n%s"
+                                       % (body.content_type.encode(), data))
+        part, = msg.get_payload()
+        self.assertEqual("chunk", part.get_param("name", header="content-disposition"))
+        self.assertEqual("disk.img", part.get_filename())
+        self.assertEqual(content, part.get_payload(decode=True))
+
     def test_update(self):
         name, namespace = "TestImageName", "TestNamespace"
         data = dict(metadata=dict(namespace=namespace))
@@ -358,3 +422,49 @@ class TestNetworkManager(BaseTestCase):
 
         self.assertIn(name, self.api._delete.call_args[0][0])
         self.assertIn(namespace, self.api._delete.call_args[0][0])
+
+
+class TestVirtualMachineManager(BaseTestCase):
+    manager_cls = VirtualMachineManager
+
+    def test_guestosinfo(self):
+        name, namespace = "VMNAME", "vm-namespace"
+
+        self.mgr.guestosinfo(name, namespace)
+
+        self.assertEqual(
+            f"apis/subresources.kubevirt.io/v1/namespaces/{namespace}/"
+            f"virtualmachineinstances/{name}/guestosinfo",
+            self.api._get.call_args[0][0]
+        )
+
+    def test_watch_status(self):
+        name, namespace = "VMNAME", "vm-namespace"
+        vmi = dict(metadata=dict(name=name), status=dict(phase="Running"))
+        resp = self.api._get.return_value
+        resp.status_code = 200
+        resp.__enter__.return_value = resp
+        resp.iter_lines.return_value = [
+            json.dumps(dict(type="ADDED", object=vmi)).encode(), b"",
+            json.dumps(dict(type="DELETED", object=vmi)).encode(),
+            json.dumps(dict(type="ERROR", object=dict())).encode(),
+            json.dumps(dict(type="MODIFIED", object=vmi)).encode(),
+        ]
+
+        events = list(self.mgr.watch_status(name, namespace, timeout=30))
+
+        self.assertListEqual([vmi, None], events)
+        path, kws = self.api._get.call_args[0][0], self.api._get.call_args[1]
+        self.assertEqual(f"apis/kubevirt.io/v1/namespaces/{namespace}/virtualmachineinstances",
+                         path)
+        self.assertTrue(kws['stream'])
+        self.assertEqual(f"metadata.name={name}", kws['params']['fieldSelector'])
+        self.assertEqual(30, kws['params']['timeoutSeconds'])
+
+    def test_watch_status_failed(self):
+        resp = self.api._get.return_value
+        resp.status_code = 404
+        resp.__enter__.return_value = resp
+
+        with self.assertRaises(ConnectionError):
+            next(self.mgr.watch_status("VMNAME"))
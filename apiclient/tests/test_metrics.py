@@ -0,0 +1,152 @@
+import json
+from datetime import timedelta
+from tempfile import TemporaryDirectory
+from pathlib import Path
+from unittest import TestCase, mock
+
+import requests
+
+from common.metrics import APIMetrics, LatencyHistogram, endpoint_template
+from harvester_api.api import HarvesterAPI
+
+
+def fake_response(method, url, status=200, content=b"{}", elapsed=0.1, retries=0, body=b""):
+    resp = requests.Response()
+    resp.request = requests.Request(method, url, data=body).prepare()
+    resp.status_code, resp._content = status, content
+    resp.elapsed = timedelta(seconds=elapsed)
+    resp.raw = mock.Mock(**{"retries.history": (object(),) * retries})
+    return resp
+
+
+class TestEndpointTemplate(TestCase):
+
+    def test_steve(self):
+        cases = [
+            ("GET", "https://h/v1/harvester/kubevirt.io.virtualmachines",
+             "GET /v1/harvester/kubevirt.io.virtualmachines"),
+            ("GET", "https://h/v1/harvester/kubevirt.io.virtualmachines/default/vm1",
+             "GET /v1/harvester/kubevirt.io.virtualmachines/{namespace}/{name}"),
+            ("POST", "https://h/v1/harvester/kubevirt.io.virtualmachines/default/vm1?action=stop",
+             "POST /v1/harvester/kubevirt.io.virtualmachines/{namespace}/{name}?action=stop"),
+            ("GET", "https://h/v1/harvester/nodes/node-1",
+             "GET /v1/harvester/nodes/{name}"),
+            ("POST", "https://h/v3/clusters/c-abc?action=generateKubeconfig",
+             "POST /v3/clusters/{name}?action=generateKubeconfig"),
+            ("GET", "https://h/k8s/clusters/c-abc/v1/pods?limit=5",
+             "GET /k8s/clusters/{cluster}/v1/pods"),
+        ]
+        for method, url, expected in cases:
+            with self.subTest(url=url):
+                self.assertEqual(expected, endpoint_template(method, url))
+
+    def test_kubernetes(self):
+        cases = [
+            ("https://h/apis/kubevirt.io/v1/namespaces/default/virtualmachineinstances",
+             "GET /apis/kubevirt.io/v1/namespaces/{namespace}/virtualmachineinstances"),
+            ("https://h/apis/subresources.kubevirt.io/v1/namespaces/ns/virtualmachineinstances"
+             "/vm1/guestosinfo",
+             "GET /apis/subresources.kubevirt.io/v1/namespaces/{namespace}"
+             "/virtualmachineinstances/{name}/guestosinfo"),
+            ("https://h/api/v1/nodes/node-1", "GET /api/v1/nodes/{name}"),
+        ]
+        for url, expected in cases:
+            with self.subTest(url=url):
+                self.assertEqual(expected, endpoint_template("GET", url))
+
+
+class TestLatencyHistogram(TestCase):
+
+    def test_percentile_relative_error(self):
+        hist = LatencyHistogram()
+        values = [i / 1000 for i in range(1, 1001)]
+        for v in values:
+            hist.record(v)
+
+        self.assertEqual(1000, hist.count)
+        self.assertAlmostEqual(sum(values), hist.sum)
+        for pct in (50, 90, 99):
+            with self.subTest(pct=pct):
+                expected = values[int(pct / 100 * len(values)) - 1]
+                self.assertLessEqual(abs(hist.percentile(pct) - expected) / expected, 1 / 16)
+        self.assertEqual(hist.max, hist.percentile(100))
+
+    def test_empty(self):
+        self.assertIsNone(LatencyHistogram().percentile(50))
+
+
+class TestAPIMetrics(TestCase):
+
+    def test_hook_records(self):
+        metrics = APIMetrics()
+        url = "https://h/v1/harvester/kubevirt.io.virtualmachines/default/vm1"
+
+        metrics.hook(fake_response("GET", url, elapsed=0.2, content=b"0123456789"))
+        metrics.hook(fake_response("GET", url, status=404, retries=2))
+        metrics.hook(fake_response("PUT", url, body=b"abc"))
+
+        data = metrics.to_dict()
+        get = data["GET /v1/harvester/kubevirt.io.virtualmachines/{namespace}/{name}"]
+        self.assertEqual(2, get["count"])
+        self.assertDictEqual({200: 1, 404: 1}, get["codes"])
+        self.assertEqual(2, get["retries"])
+        self.assertEqual(12, get["bytes_received"])
+        self.assertAlmostEqual(0.2, get["latency"]["max"])
+
+        put = data["PUT /v1/harvester/kubevirt.io.virtualmachines/{namespace}/{name}"]
+        self.assertEqual(3, put["bytes_sent"])
+
+    def test_totals(self):
+        metrics = APIMetrics()
+        self.assertEqual((0, 0), metrics.totals())
+
+        metrics.hook(fake_response("GET", "https://h/v1/harvester/nodes", content=b"abcd"))
+        metrics.hook(fake_response("POST", "https://h/v1/harvester/secrets", body=b"xyz"))
+
+        self.assertEqual((2, 4 + 2 + 3), metrics.totals())
+
+    def test_stream_response_not_consumed(self):
+        metrics = APIMetrics()
+        resp = fake_response("GET", "https://h/v1/harvester/files")
+        resp._content, resp._content_consumed = False, False
+        resp.headers["Content-Length"] = "2048"
+
+        metrics.hook(resp, stream=True)
+
+        self.assertEqual(2048, metrics.to_dict()["GET /v1/harvester/files"]["bytes_received"])
+        self.assertFalse(resp._content_consumed)
+
+    def test_prometheus(self):
+        metrics = APIMetrics()
+        metrics.hook(fake_response("GET", "https://h/v1/harvester/nodes", elapsed=0.5))
+
+        text = metrics.to_prometheus()
+        labels = 'method="GET",endpoint="/v1/harvester/nodes"'
+        self.assertIn(f'harvester_api_requests_total{{{labels},code="200"}} 1', text)
+        self.assertIn(f'harvester_api_request_retries_total{{{labels}}} 0', text)
+        self.assertIn(f'harvester_api_request_duration_seconds_bucket{{{labels},le="+Inf"}} 1',
+                      text)
+        self.assertIn(f'harvester_api_request_duration_seconds_count{{{labels}}} 1', text)
+
+    def test_dump(self):
+        metrics = APIMetrics()
+        metrics.hook(fake_response("GET", "https://h/v1/harvester/nodes"))
+
+        with TemporaryDirectory() as tmp:
+            prom = metrics.dump(Path(tmp, "api.prom"))
+            self.assertTrue(prom.read_text().startswith("# HELP"))
+
+            js = metrics.dump(Path(tmp, "api.json"))
+            self.assertIn("GET /v1/harvester/nodes", json.loads(js.read_text()))
+            self.assertEqual(2, len(list(Path(tmp).iterdir())))
+
+    def test_enable_metrics(self):
+        api = HarvesterAPI("https://endpoint/")
+        metrics = api.enable_metrics()
+
+        self.assertIs(metrics, api.metrics)
+        self.assertIn(metrics.hook, api.session.hooks["response"])
+
+        # shared and attached only once
+        self.assertIs(metrics, api.enable_metrics(metrics))
+        self.assertEqual(1, api.session.hooks["response"].count(metrics.hook))
@@ -0,0 +1,76 @@
+import sys
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from harvester_api.vmconsole import VMConsole
+
+# stands in for `virtctl console`, commands are run by sh with the output on the pty
+FAKE_CONSOLE = r'''
+import subprocess
+import sys
+
+
+def write(text):
+    sys.stdout.write(text)
+    sys.stdout.flush()
+
+
+def readline():
+    line = sys.stdin.readline()
+    if not line:
+        sys.exit()
+    return line.rstrip("\n")
+
+
+readline()  # nothing is printed until a key is pressed
+write("vm1 login: ")
+user = readline()
+write("Password: ")
+if (user, readline()) != ("root", "secret"):
+    sys.exit("Login incorrect")
+
+prompt = "vm1:~ # "
+while True:
+    write(prompt)
+    line = readline()
+    if "exit" == line:
+        break
+    if line.startswith("export PS1="):
+        prompt = subprocess.check_output(f"printf %s {line[len('export PS1='):]}",
+                                         shell=True, text=True)
+    else:
+        subprocess.run(line, shell=True)
+'''
+
+
+class TestVMConsole(TestCase):
+
+    def setUp(self):
+        tmpdir = TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        script = Path(tmpdir.name, "virtctl.py")
+        script.write_text(FAKE_CONSOLE)
+        self.console = VMConsole(f"{sys.executable} {script}", "vm1", "root", "secret",
+                                 command_timeout=10)
+        self.console.login()
+        self.addCleanup(self.console.logout)
+
+    def test_execute_command(self):
+        self.assertEqual("hello", self.console.execute_command("echo hello"))
+        self.assertEqual("a\nb", self.console.execute_command("printf 'a\\nb\\n'"))
+        self.assertEqual("", self.console.execute_command("true"))
+
+    def test_output_without_newline(self):
+        self.assertEqual("abc", self.console.execute_command("printf abc"))
+        self.assertEqual("next", self.console.execute_command("echo next"))
+
+    def test_prompt_in_output(self):
+        # the output ends with a prompt alike before the command is done
+        self.assertEqual("x #tail",
+                         self.console.execute_command('printf "x #"; sleep 1; echo tail'))
+        self.assertEqual("next", self.console.execute_command("echo next"))
+
+    def test_timeout(self):
+        with self.assertRaises(TimeoutError):
+            self.console.execute_command("sleep 5", timeout=1)
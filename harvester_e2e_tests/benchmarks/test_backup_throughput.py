@@ -0,0 +1,150 @@
+from datetime import datetime, timedelta
+from time import monotonic, sleep
+
+import pytest
+
+from harvester_e2e_tests.fixtures.benchmark import add_disk, int_list, summarize
+
+pytest_plugins = [
+    "harvester_e2e_tests.fixtures.api_client",
+    "harvester_e2e_tests.fixtures.backuptarget",
+    "harvester_e2e_tests.fixtures.virtualmachines",
+    "harvester_e2e_tests.fixtures.benchmark"
+]
+
+PHASES = ("full", "incremental", "restore_new", "restore_existing")
+
+
+def pytest_generate_tests(metafunc):
+    if "data_size" in metafunc.fixturenames:
+        sizes = int_list(metafunc.config.getoption("--benchmark-backup-sizes"))
+        metafunc.parametrize("data_size", sizes, ids=[f"{s}G" for s in sizes])
+
+
+@pytest.fixture
+def bench_backups(benchmark_vms):
+    """ Names of backups created by the test, the ones left by a failure are deleted """
+    names = []
+    yield names
+    delete_backups(benchmark_vms, names)
+
+
+def delete_backups(fleet, names):
+    """ Delete the backups and wait until they are gone, so the next full backup is not
+    incremental to them
+    """
+    for name in names:
+        fleet.api_client.backups.delete(name, fleet.namespace)
+    for name in names:
+        fleet.wait_gone(fleet.api_client.backups, name)
+    names.clear()
+
+
+def write_data(shell, device, mib):
+    """ Write random data, which is neither sparse nor compressible, into the disk """
+    out, err = shell.exec_command(f"sudo dd if=/dev/urandom of={device} bs=1M count={mib} "
+                                  "oflag=direct status=none && sync")
+    assert not err, f"Failed to write {mib}MiB into {device}: {err}"
+
+
+def backup(fleet, vm_name, name, timeout, snooze=1):
+    """ Returns the seconds until the backup is ready to use """
+    api = fleet.api_client
+    start = monotonic()
+    code, data = api.vms.backup(vm_name, name, fleet.namespace)
+    assert 204 == code, (code, data)
+    endtime = datetime.now() + timedelta(seconds=timeout)
+    while endtime > datetime.now():
+        code, data = api.backups.get(name, fleet.namespace)
+        if 200 == code and data.get('status', {}).get('readyToUse'):
+            return monotonic() - start
+        sleep(snooze)
+    raise AssertionError(f"Backup {name} is not ready in {timeout}s: {code}, {data}")
+
+
+def restore(fleet, backup_name, spec, vm_name, timeout):
+    """ Returns the seconds until the VM restored from the backup is running """
+    api = fleet.api_client
+    start = monotonic()
+    code, data = api.backups.restore(backup_name, spec, fleet.namespace)
+    assert 201 == code, (code, data)
+    ok, vmi = fleet.vm_checker.wait_running(vm_name, fleet.namespace, timeout)
+    assert ok, f"VM {vm_name} restored from {backup_name} is not running in {timeout}s: {vmi}"
+    seconds = monotonic() - start
+
+    # volumes are replaced by restored ones
+    code, data = api.vms.get(vm_name, fleet.namespace)
+    assert 200 == code, (code, data)
+    fleet.track(data)
+    return seconds
+
+
+@pytest.mark.p1
+@pytest.mark.benchmark
+@pytest.mark.backup_target
+@pytest.mark.parametrize(
+    "backup_config", [
+        pytest.param("S3", marks=[pytest.mark.S3, pytest.mark.backups3]),
+        pytest.param("NFS", marks=[pytest.mark.NFS, pytest.mark.backupnfs])
+    ],
+    indirect=True)
+class TestBackupThroughput:
+    """ Throughput of backups of a VM with `data_size` GiB of data to the backup target, of an
+    incremental backup after a part of the data is rewritten, and of restores of the
+    incremental backup into a new VM and into the VM itself.
+    """
+
+    def test_backup_restore(self, request, benchmark_vms, benchmark_report, benchmark_runs,
+                            bench_backups, backup_config, config_backup_target, data_size,
+                            wait_timeout):
+        rewrite = request.config.getoption("--benchmark-backup-rewrite")
+        fleet, api = benchmark_vms, benchmark_vms.api_client
+        name = f"bench-bak-{datetime.now().strftime('%m%d%H%M%S')}-{data_size}g"
+        spec = fleet.spec()
+        device = add_disk(spec, "data", data_size)
+        fleet.create(name, spec)
+        with fleet.ssh(fleet.wait_ready(name)) as sh:
+            write_data(sh, device, data_size * 1024)
+
+        # MiB to transfer in each phase, restores are of the incremental backup
+        rewritten = data_size * 1024 * rewrite // 100
+        mib = dict(full=data_size * 1024, incremental=rewritten,
+                   restore_new=data_size * 1024, restore_existing=data_size * 1024)
+        samples = []
+        for run in range(benchmark_runs):
+            full, incremental, restored = (f"{name}-{run}-full", f"{name}-{run}-incr",
+                                           f"{name}-{run}-new")
+            bench_backups.append(full)
+            seconds = dict(full=backup(fleet, name, full, wait_timeout))
+            with fleet.ssh(fleet.wait_ready(name)) as sh:
+                write_data(sh, device, rewritten)
+            bench_backups.append(incremental)
+            seconds['incremental'] = backup(fleet, name, incremental, wait_timeout)
+
+            seconds['restore_new'] = restore(
+                fleet, incremental, api.backups.RestoreSpec.for_new(restored), restored,
+                wait_timeout
+            )
+            fleet.delete(restored)
+
+            code, data = api.vms.stop(name, fleet.namespace)
+            assert 204 == code, (code, data)
+            ok, vmi = fleet.vm_checker.wait_stopped(name, fleet.namespace)
+            assert ok, f"VM {name} is not stopped: {vmi}"
+            seconds['restore_existing'] = restore(
+                fleet, incremental, api.backups.RestoreSpec.for_existing(delete_volumes=True),
+                name, wait_timeout
+            )
+
+            delete_backups(fleet, bench_backups)
+
+            sample = {f"{p}_seconds": seconds[p] for p in PHASES}
+            sample.update({f"{p}_mib_per_second": mib[p] / seconds[p] for p in PHASES})
+            samples.append(sample)
+        fleet.delete(name)
+
+        backup_type, _ = backup_config
+        metrics = {key: summarize(s[key] for s in samples) for key in samples[0]}
+        benchmark_report.add("backup_restore",
+                             dict(target=backup_type, data_size=data_size, rewrite=rewrite),
+                             metrics, samples)
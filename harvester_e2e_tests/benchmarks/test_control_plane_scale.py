@@ -0,0 +1,168 @@
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from time import monotonic, sleep
+
+import pytest
+import requests
+from harvester_api import HarvesterAPI
+
+from harvester_e2e_tests.fixtures.benchmark import int_list
+
+pytest_plugins = [
+    "harvester_e2e_tests.fixtures.api_client",
+    "harvester_e2e_tests.fixtures.virtualmachines",
+    "harvester_e2e_tests.fixtures.benchmark"
+]
+
+
+def pytest_generate_tests(metafunc):
+    if "workers" in metafunc.fixturenames:
+        levels = int_list(metafunc.config.getoption("--benchmark-concurrency"))
+        metafunc.parametrize("workers", levels, ids=[f"w{w}" for w in levels])
+
+
+@pytest.fixture(scope="module")
+def raw_api_client(api_client):
+    """ Client without retries, so errors of the apiserver are counted instead of retried """
+    session = requests.Session()
+    session.verify = api_client.session.verify
+    api = HarvesterAPI(api_client.endpoint, api_client.session.headers['Authorization'],
+                       session=session)
+    api.default_labels = api_client.default_labels
+    api.default_annotations = api_client.default_annotations
+    yield api
+    session.close()
+
+
+class Burst:
+    """ Call the API for all names by `workers` threads, each call is retried on
+    409, 429, 5xx and connection errors with backoff. Every response is counted.
+    """
+    RETRY_CODES = (409, 429)
+
+    def __init__(self, workers, attempts=5):
+        self.workers = workers
+        self.attempts = attempts
+        self.codes = Counter()
+        self.failed = []
+        self.seconds = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"{__class__.__name__}(workers={self.workers}, codes={dict(self.codes)})"
+
+    def _call(self, fn, done, name):
+        for attempt in range(self.attempts):
+            try:
+                code, data = fn(name)
+            except requests.exceptions.RequestException as e:
+                code, data = "connection", e
+            with self._lock:
+                self.codes[code] += 1
+            if isinstance(code, int):
+                if done(code, data):
+                    return True
+                if code < 500 and code not in self.RETRY_CODES:
+                    break
+            sleep(min(0.5 * 2 ** attempt, 5))
+        with self._lock:
+            self.failed.append((name, code, str(data)[:200]))
+        return False
+
+    def run(self, fn, names, done=lambda code, data: code < 300):
+        start = monotonic()
+        with ThreadPoolExecutor(self.workers) as executor:
+            list(executor.map(lambda n: self._call(fn, done, n), names))
+        self.seconds = monotonic() - start
+        return self
+
+    def metrics(self, count):
+        total = sum(self.codes.values())
+        accepted = count - len(self.failed)
+        conflicts = self.codes.get(409, 0)
+        errors = sum(v for k, v in self.codes.items()
+                     if k == "connection" or k == 429 or (isinstance(k, int) and k >= 500))
+        return dict(
+            requests=total, accepted=accepted, seconds=self.seconds,
+            accepted_per_second=accepted / self.seconds if self.seconds else None,
+            error_rate=errors / total if total else 0,
+            conflict_rate=conflicts / total if total else 0,
+            codes={str(k): v for k, v in sorted(self.codes.items(), key=str)}
+        )
+
+
+def mean(values):
+    values = [v for v in values if v is not None]
+    return sum(values) / len(values) if values else None
+
+
+def wait_all_running(api, names, namespace, timeout, snooze=1):
+    """ Returns names of VMs which are not Running in time, by listing VMIs """
+    pending, endtime = set(names), datetime.now() + timedelta(seconds=timeout)
+    while pending and endtime > datetime.now():
+        code, data = api.vms.get_status("", namespace)
+        if 200 == code:
+            pending -= {vmi['metadata']['name'] for vmi in data['data']
+                        if "Running" == vmi.get('status', {}).get('phase')}
+        if pending:
+            sleep(snooze)
+    return pending
+
+
+@pytest.mark.p1
+@pytest.mark.benchmark
+@pytest.mark.virtualmachines
+class TestControlPlaneScale:
+    """ Throughput of the control plane when `workers` threads create and delete VMs at once """
+
+    def test_create_delete(self, request, raw_api_client, benchmark_vms, benchmark_report,
+                           benchmark_runs, workers, wait_timeout):
+        count = request.config.getoption("--benchmark-scale-vms")
+        ns, spec = benchmark_vms.namespace, benchmark_vms.spec(memory=1)
+        results = []
+        for run in range(benchmark_runs):
+            prefix = f"bench-scale-{datetime.now().strftime('%m%d%H%M%S')}-w{workers}-{run}"
+            # rendered ahead, so the client does not spend the time of the burst
+            bodies = {f"{prefix}-{i}": spec.to_dict(f"{prefix}-{i}", ns) for i in range(count)}
+
+            def exists(code, data):
+                # the previous attempt was accepted but its response was lost
+                return 409 == code and "already exists" in str(data)
+
+            def create(name):
+                code, data = raw_api_client.vms.create(name, bodies[name], ns)
+                if 201 == code or exists(code, data):
+                    benchmark_vms.track(data if 201 == code else bodies[name])
+                return code, data
+
+            start = monotonic()
+            creation = Burst(workers).run(create, list(bodies),
+                                          lambda code, data: code < 300 or exists(code, data))
+            pending = wait_all_running(raw_api_client, bodies, ns, wait_timeout)
+            all_running = None if pending else monotonic() - start
+
+            start = monotonic()
+            deletion = Burst(workers).run(lambda n: raw_api_client.vms.delete(n, ns),
+                                          list(bodies), lambda code, data: code in (200, 404))
+            benchmark_vms.delete(*bodies)
+            results.append(dict(
+                create=creation.metrics(count), delete=deletion.metrics(count),
+                all_running_seconds=all_running, not_running=sorted(pending),
+                cleanup_seconds=monotonic() - start,
+                failed=creation.failed + deletion.failed
+            ))
+
+        metrics = {f"{phase}_{key}": mean(r[phase][key] for r in results)
+                   for phase in ("create", "delete")
+                   for key in ("accepted_per_second", "error_rate", "conflict_rate")}
+        metrics.update(all_running_seconds=mean(r['all_running_seconds'] for r in results),
+                       cleanup_seconds=mean(r['cleanup_seconds'] for r in results))
+        benchmark_report.add("control_plane_scale", dict(workers=workers, vms=count),
+                             metrics, results)
+
+        failed = [f for r in results for f in r['failed']]
+        assert not failed, f"{len(failed)} requests failed after retries: {failed[:5]}"
+        not_running = [n for r in results for n in r['not_running']]
+        assert not not_running, f"VMs are not Running in {wait_timeout}s: {not_running}"
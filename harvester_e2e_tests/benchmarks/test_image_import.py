@@ -0,0 +1,154 @@
+import os
+import threading
+from datetime import datetime, timedelta
+from time import monotonic, sleep
+
+import pytest
+
+from harvester_e2e_tests.fixtures.benchmark import int_list, summarize
+
+pytest_plugins = [
+    "harvester_e2e_tests.fixtures.api_client",
+    "harvester_e2e_tests.fixtures.benchmark"
+]
+
+SOURCES = ("download", "upload")
+
+
+def pytest_generate_tests(metafunc):
+    if "image_size" in metafunc.fixturenames:
+        sizes = int_list(metafunc.config.getoption("--benchmark-image-sizes"))
+        metafunc.parametrize("image_size", sizes, ids=[f"{s}G" for s in sizes])
+    if "source" in metafunc.fixturenames:
+        metafunc.parametrize("source", SOURCES)
+
+
+@pytest.fixture(scope="module")
+def image_files(request):
+    """ Returns (URL, path) of a raw image of the size in GiB, served by the image mirror """
+    plugin = request.config.pluginmanager.get_plugin("harvester_image_mirror")
+    if plugin is None:
+        pytest.skip("Image import is only benchmarked with --image-mirror, not the internet")
+    mirror = plugin.mirror
+
+    def get(size):
+        name = f"bench-image-{size}g.img"
+        path = mirror.cache.root / name
+        if not path.exists() or path.stat().st_size != size << 30:
+            # random data, so the size transferred is not shrunk by sparse or zero blocks
+            tmp = path.with_name(f".{name}.part")
+            with tmp.open("wb") as f:
+                for _ in range(size << 10):
+                    f.write(os.urandom(1 << 20))
+            tmp.replace(path)
+        return f"{mirror.url}/{name}", path
+
+    return get
+
+
+class ProgressSampler:
+    """ Sample `status.progress` of the image every `snooze` seconds in a thread,
+    until it reaches 100 or `wait` times out.
+    """
+
+    def __init__(self, api_client, name, namespace, snooze=0.5):
+        self.api_client = api_client
+        self.name = name
+        self.namespace = namespace
+        self.snooze = snooze
+        self.samples = []  # [(seconds, progress)]
+        self.started = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"progress-{name}", daemon=True)
+
+    def __repr__(self):
+        return f"{__class__.__name__}({self.name!r}, samples={len(self.samples)})"
+
+    def _run(self):
+        while not self._stop.is_set():
+            code, data = self.api_client.images.get(self.name, self.namespace)
+            if 200 == code:
+                progress = data.get('status', {}).get('progress', 0)
+                self.samples.append((monotonic() - self.started, progress))
+                if 100 == progress:
+                    return
+            self._stop.wait(self.snooze)
+
+    def start(self):
+        self.started = monotonic()
+        self._thread.start()
+        return self
+
+    def wait(self, timeout):
+        """ Returns the seconds until the image is ready, or `None` if not in `timeout` """
+        self._thread.join(max(timeout - (monotonic() - self.started), 0))
+        self._stop.set()
+        self._thread.join()
+        return self.samples[-1][0] if self.samples and 100 == self.samples[-1][1] else None
+
+    def throughput(self, size):
+        """ MiB/s between each two samples of the image of `size` MiB """
+        return [(t1, (p1 - p0) / 100 * size / (t1 - t0))
+                for (t0, p0), (t1, p1) in zip(self.samples, self.samples[1:]) if t1 > t0]
+
+
+def delete_image(api_client, name, namespace, timeout, snooze=1):
+    api_client.images.delete(name, namespace)
+    endtime = datetime.now() + timedelta(seconds=timeout)
+    while endtime > datetime.now():
+        code, data = api_client.images.get(name, namespace)
+        if 404 == code:
+            return
+        sleep(snooze)
+    raise AssertionError(f"Image {name} is not deleted in {timeout}s: {code}, {data}")
+
+
+@pytest.mark.p1
+@pytest.mark.benchmark
+@pytest.mark.images
+class TestImageImport:
+    """ Import of a raw image of `image_size` GiB, downloaded by Harvester from the local
+    image mirror by `create_by_url`, or uploaded from the client by `create_by_file`.
+    """
+
+    def test_import(self, api_client, benchmark_report, benchmark_runs, image_files,
+                    image_size, source, wait_timeout):
+        url, path = image_files(image_size)
+        ns, mib = "default", image_size << 10
+        prefix = f"bench-img-{datetime.now().strftime('%m%d%H%M%S')}-{image_size}g-{source}"
+        samples = []
+        for run in range(benchmark_runs):
+            name = f"{prefix}-{run}"
+            sampler = ProgressSampler(api_client, name, ns).start()
+            if "download" == source:
+                code, data = api_client.images.create_by_url(name, url, ns)
+                assert 201 == code, (code, data)
+                sent = None
+            else:
+                resp = api_client.images.create_by_file(name, path, ns)
+                assert resp.ok, (resp.status_code, resp.text)
+                sent = monotonic() - sampler.started
+            ready = sampler.wait(wait_timeout)
+            delete_image(api_client, name, ns, wait_timeout)
+
+            throughput = sampler.throughput(mib)
+            samples.append(dict(
+                ready_seconds=ready, upload_seconds=sent,
+                mib_per_second=mib / ready if ready else None,
+                throughput=throughput
+            ))
+            if not ready:
+                break
+
+        metrics = dict(
+            ready_seconds=summarize(s['ready_seconds'] for s in samples),
+            mib_per_second=summarize(s['mib_per_second'] for s in samples),
+            interval_mib_per_second=summarize(v for s in samples for _, v in s['throughput'])
+        )
+        if "upload" == source:
+            metrics['upload_seconds'] = summarize(s['upload_seconds'] for s in samples)
+        benchmark_report.add("image_import", dict(source=source, image_size=image_size),
+                             metrics, samples)
+
+        incomplete = [s for s in samples if not s['ready_seconds']]
+        assert not incomplete, f"Images are not ready in {wait_timeout}s"
@@ -0,0 +1,249 @@
+import re
+import shlex
+from datetime import datetime, timedelta
+from time import monotonic, sleep
+
+import pytest
+
+from harvester_e2e_tests.fixtures.benchmark import int_list, summarize
+
+pytest_plugins = [
+    "harvester_e2e_tests.fixtures.api_client",
+    "harvester_e2e_tests.fixtures.network",
+    "harvester_e2e_tests.fixtures.virtualmachines",
+    "harvester_e2e_tests.fixtures.benchmark"
+]
+
+MAINTAIN_STATUS = "harvesterhci.io/maintain-status"
+# rewrites `rate` MiB of the filled tmpfs then sleeps a second, the counter is in MiB
+DIRTY_SCRIPT = """fill={fill}; rate={rate}; off=0; total=0
+while :; do
+  dd if=/tmp/dirty-src of=/dev/shm/dirty bs=1M count=$rate seek=$off conv=notrunc status=none
+  total=$((total + rate)); echo $total > /tmp/dirtied
+  off=$((off + rate)); [ $((off + rate)) -le $fill ] || off=0
+  sleep 1
+done
+"""
+
+
+def pytest_generate_tests(metafunc):
+    if "memory" in metafunc.fixturenames:
+        sizes = int_list(metafunc.config.getoption("--benchmark-migration-memory"))
+        metafunc.parametrize("memory", sizes, ids=[f"{m}G" for m in sizes])
+    if "dirty_rate" in metafunc.fixturenames:
+        rates = int_list(metafunc.config.getoption("--benchmark-dirty-rates"))
+        metafunc.parametrize("dirty_rate", rates, ids=[f"{r}M" for r in rates])
+
+
+@pytest.fixture(scope="module")
+def migration_hosts(benchmark_hosts):
+    if len(benchmark_hosts) < 2:
+        pytest.skip(f"Live migration needs 2 schedulable nodes at least, got {benchmark_hosts}")
+    return benchmark_hosts
+
+
+@pytest.fixture(scope="module")
+def vlan_network(request):
+    # the IP of the management network changes with the pod, peers need a stable one
+    if request.config.getoption('--vlan-id') == -1:
+        pytest.skip("Guest downtime is probed over VLAN, which is not configured")
+    # requested after the check, the fixture creates the cluster network before skipping
+    network = request.getfixturevalue("network")
+    return f"{network['metadata']['namespace']}/{network['metadata']['name']}"
+
+
+@pytest.fixture(scope="module")
+def probe_vm(benchmark_vms, vlan_network):
+    name = f"bench-probe-{datetime.now().strftime('%m%d%H%M%S')}"
+    benchmark_vms.create(name, benchmark_vms.spec(networks=dict(vlan=vlan_network)))
+    return benchmark_vms.wait_ready(name, ("default", "vlan"))
+
+
+def start_workload(shell, memory, rate):
+    """ Fill 40% of the memory with random data in tmpfs, then rewrite `rate` MiB of it
+    each second in the background, so the migration has to copy them again.
+    """
+    fill = int(memory * 1024 * 0.4)
+    commands = [f"dd if=/dev/urandom of=/dev/shm/dirty bs=1M count={fill} status=none",
+                "echo 0 > /tmp/dirtied"]
+    if rate:
+        # random data, zero pages would be skipped by the migration
+        commands += [f"head -c {rate}M /dev/urandom > /tmp/dirty-src",
+                     f"echo {shlex.quote(DIRTY_SCRIPT.format(fill=fill, rate=rate))}"
+                     " > /tmp/dirty.sh",
+                     "(nohup sh /tmp/dirty.sh > /dev/null 2>&1 &)"]
+    out, err = shell.exec_command(" && ".join(commands))
+    assert not err, f"Failed to start the workload: {err}"
+
+
+def dirtied(shell):
+    """ MiB rewritten by the workload so far """
+    out, err = shell.exec_command("cat /tmp/dirtied")
+    return int(out.strip() or 0)
+
+
+class Probe:
+    """ Ping the target every `interval` seconds from the shell of a sibling VM, the longest
+    gap between replies is the downtime seen by peers of the guest.
+    """
+    REPLY = re.compile(r"^\[(\d+\.\d+)\] \d+ bytes from", re.M)
+    SUMMARY = re.compile(r"(\d+) packets transmitted, (\d+) received")
+
+    def __init__(self, shell, target, interval=0.01):
+        self.shell = shell
+        self.target = target
+        self.interval = interval
+        self.log = f"/tmp/probe-{target}.log"
+
+    def __repr__(self):
+        return f"{__class__.__name__}({self.target!r}, interval={self.interval})"
+
+    def start(self):
+        # intervals shorter than 0.2s are only allowed for root
+        self.shell.exec_command(f"sudo sh -c 'nohup ping -D -i {self.interval} {self.target}"
+                                f" > {self.log} 2>&1 &'")
+        sleep(1)  # replies before the migration
+
+    def stop(self):
+        sleep(1)  # replies after the migration
+        # the bracket keeps the pattern from matching the command line of sudo itself
+        self.shell.exec_command(f"sudo pkill -INT -f '[p]ing -D -i {self.interval} "
+                                f"{self.target}'")
+        sleep(0.5)
+        out, err = self.shell.exec_command(f"cat {self.log}; sudo rm -f {self.log}")
+        return self.parse(out, self.interval)
+
+    @classmethod
+    def parse(cls, output, interval):
+        replies = [float(m.group(1)) for m in cls.REPLY.finditer(output)]
+        gaps = [b - a for a, b in zip(replies, replies[1:])]
+        summary = cls.SUMMARY.search(output)
+        return dict(
+            downtime=max(max(gaps) - interval, 0) if gaps else None,
+            sent=int(summary.group(1)) if summary else None,
+            received=len(replies)
+        )
+
+
+def migrate(fleet, name, target, timeout, previous=None):
+    """ Migrate the VM to `target` and wait until the migration other than `previous` is done,
+    it is aborted if not done in `timeout` seconds.
+    """
+    api, ns = fleet.api_client, fleet.namespace
+    start = monotonic()
+    code, data = api.vms.migrate(name, target, ns)
+    assert 204 == code, (code, data)
+
+    def done(vmi):
+        state = (vmi or {}).get('status', {}).get('migrationState') or {}
+        return (state.get('migrationUid') not in (None, previous)
+                and (state.get('completed') or state.get('failed')))
+
+    ok, vmi = fleet.vm_checker.wait_status(name, ns, done, timeout)
+    seconds = monotonic() - start
+    if not ok:
+        api.vms.abort_migrate(name, ns)
+        fleet.vm_checker.wait_status(name, ns, done, timeout)
+    state = (vmi or {}).get('status', {}).get('migrationState') or {}
+    completed = bool(ok and state.get('completed') and not state.get('failed'))
+    elapsed = None
+    if completed and state.get('startTimestamp') and state.get('endTimestamp'):
+        elapsed = (_timestamp(state['endTimestamp'])
+                   - _timestamp(state['startTimestamp'])).total_seconds()
+    return dict(source=state.get('sourceNode'), target=target, uid=state.get('migrationUid'),
+                mode=state.get('mode'), completed=completed, aborted=not ok,
+                seconds=seconds if completed else None, migration_seconds=elapsed)
+
+
+def _timestamp(value):
+    return datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ")
+
+
+def drain(api, node, timeout, snooze=1):
+    """ Enable maintenance mode of the node, returns the seconds until its VMs are migrated
+    away, or `None` if not in `timeout` seconds. Maintenance mode is disabled afterwards.
+    """
+    start = monotonic()
+    code, data = api.hosts.maintenance_mode(node, enable=True)
+    assert 204 == code, (code, data)
+    try:
+        endtime = datetime.now() + timedelta(seconds=timeout)
+        while endtime > datetime.now():
+            code, data = api.hosts.get(node)
+            if "completed" == data.get('metadata', {}).get('annotations', {}).get(
+                    MAINTAIN_STATUS):
+                return monotonic() - start
+            sleep(snooze)
+        return None
+    finally:
+        code, data = api.hosts.maintenance_mode(node, enable=False)
+        assert 204 == code, (code, data)
+
+
+@pytest.mark.p1
+@pytest.mark.benchmark
+@pytest.mark.networks
+@pytest.mark.virtualmachines
+class TestLiveMigration:
+    """ Live migration of a VM with `memory` GiB, whose workload rewrites `dirty_rate` MiB of it
+    each second, while a sibling VM pings it over VLAN. Each run migrates the VM to another
+    node, then the node it lands on is drained by maintenance mode.
+    """
+
+    def test_migrate_and_drain(self, benchmark_vms, benchmark_report, benchmark_runs,
+                               migration_hosts, vlan_network, probe_vm, memory, dirty_rate,
+                               wait_timeout):
+        fleet, api = benchmark_vms, benchmark_vms.api_client
+        name = f"bench-migrate-{datetime.now().strftime('%m%d%H%M%S')}-{memory}g-{dirty_rate}m"
+        fleet.create(name, fleet.spec(cpu=2, memory=memory, networks=dict(vlan=vlan_network)))
+        vmi = fleet.wait_ready(name, ("default", "vlan"))
+        with fleet.ssh(vmi) as sh:
+            start_workload(sh, memory, dirty_rate)
+
+        params = dict(memory=memory, dirty_rate=dirty_rate)
+        target_ip = fleet.vm_checker.ip_addresses(vmi, ("vlan",))['vlan']
+        samples, previous, drained = [], None, None
+        with fleet.ssh(probe_vm) as probe_sh:
+            probe = Probe(probe_sh, target_ip)
+            for run in range(benchmark_runs):
+                hosts = [h for h in migration_hosts if h != vmi['status']['nodeName']]
+                with fleet.ssh(vmi) as sh:
+                    mib, start = dirtied(sh), monotonic()
+                probe.start()
+                sample = migrate(fleet, name, hosts[run % len(hosts)], wait_timeout, previous)
+                sample.update(probe.stop())
+                samples.append(sample)
+                if not sample['completed']:
+                    break
+                previous = sample['uid']
+                vmi = fleet.wait_ready(name, ("default", "vlan"))
+                with fleet.ssh(vmi) as sh:
+                    sample['dirtied_mib_per_second'] = (dirtied(sh) - mib) / (monotonic() - start)
+
+            if all(s['completed'] for s in samples):
+                node = vmi['status']['nodeName']
+                if node == probe_vm['status']['nodeName']:
+                    # draining the node of the sibling would pause the probe as well
+                    hosts = [h for h in migration_hosts if h != node]
+                    previous = migrate(fleet, name, hosts[0], wait_timeout, previous)['uid']
+                    node = fleet.wait_ready(name, ("default", "vlan"))['status']['nodeName']
+                probe.start()
+                drained = dict(node=node, seconds=drain(api, node, wait_timeout))
+                drained.update(probe.stop())
+
+        metrics = {key: summarize(s.get(key) for s in samples)
+                   for key in ("seconds", "migration_seconds", "downtime",
+                               "dirtied_mib_per_second")}
+        metrics.update(completed=sum(s['completed'] for s in samples), runs=len(samples))
+        benchmark_report.add("live_migration", params, metrics, samples)
+        if drained:
+            benchmark_report.add("maintenance_drain", params,
+                                 dict(seconds=drained['seconds'], downtime=drained['downtime']),
+                                 [drained])
+        fleet.delete(name)
+
+        incomplete = [s for s in samples if not s['completed']]
+        assert not incomplete, f"Migrations are not completed in {wait_timeout}s: {incomplete}"
+        assert drained['seconds'] is not None, (
+            f"Node {drained['node']} is not drained in {wait_timeout}s"
+        )
@@ -0,0 +1,125 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from harvester_e2e_tests.fixtures.benchmark import add_disk, int_list, summarize
+
+pytest_plugins = [
+    "harvester_e2e_tests.fixtures.api_client",
+    "harvester_e2e_tests.fixtures.virtualmachines",
+    "harvester_e2e_tests.fixtures.benchmark"
+]
+
+# fio arguments of each profile, the volume is written through before them
+PROFILES = {
+    "randread": "--rw=randread --bs=4k --iodepth=32 --ioengine=libaio --direct=1",
+    "randwrite": "--rw=randwrite --bs=4k --iodepth=32 --ioengine=libaio --direct=1",
+    "read": "--rw=read --bs=1M --iodepth=8 --ioengine=libaio --direct=1",
+    "write": "--rw=write --bs=1M --iodepth=8 --ioengine=libaio --direct=1",
+    "fsync": "--rw=write --bs=4k --iodepth=1 --ioengine=sync --fsync=1",
+}
+
+
+def pytest_generate_tests(metafunc):
+    if "replicas" in metafunc.fixturenames:
+        counts = int_list(metafunc.config.getoption("--benchmark-replicas"))
+        metafunc.parametrize("replicas", counts, ids=[f"r{r}" for r in counts])
+
+
+@pytest.fixture(scope="module")
+def storage_classes(api_client):
+    """ Returns the name of the storage class of `replicas`, created on demand """
+    stamp, created = datetime.now().strftime('%m%d%H%M%S'), dict()
+    code, data = api_client.hosts.get()
+    assert 200 == code, (code, data)
+    nodes = len(data['data'])
+
+    def get(replicas):
+        if replicas > nodes:
+            # replicas would not be scheduled, the volume is degraded
+            pytest.skip(f"{replicas} replicas need {replicas} nodes, got {nodes}")
+        if replicas not in created:
+            name = f"bench-r{replicas}-{stamp}"
+            code, data = api_client.scs.create(name, replicas)
+            assert 201 == code, (code, data)
+            created[replicas] = name
+        return created[replicas]
+
+    yield get
+
+    for name in created.values():
+        api_client.scs.delete(name)
+
+
+@pytest.fixture(scope="module")
+def io_matrix(request, benchmark_report):
+    """ {replicas: {metric: summary}} of all storage classes, reported as one result """
+    matrix, samples = dict(), dict()
+    yield matrix, samples
+
+    if matrix:
+        params = dict(volume_size=request.config.getoption("--benchmark-volume-size"),
+                      runtime=request.config.getoption("--benchmark-fio-runtime"),
+                      profiles=PROFILES)
+        benchmark_report.add("storage_io", params,
+                             {str(r): row for r, row in sorted(matrix.items())},
+                             {str(r): s for r, s in sorted(samples.items())})
+
+
+def fio(shell, name, device, args, runtime=None):
+    """ Returns the job of the fio result, the whole device is written if `runtime` is None """
+    limit = f"--time_based --runtime={runtime}" if runtime else "--size=100%"
+    out, err = shell.exec_command(f"sudo fio --name={name} --filename={device} {limit} "
+                                  f"--output-format=json {args}")
+    try:
+        return json.loads(out[out.index("{"):])['jobs'][0]
+    except ValueError as e:
+        raise AssertionError(f"fio {name} failed: {out} {err}") from e
+
+
+def io_metrics(profile, job):
+    if "fsync" == profile:
+        # older fio only reports the latency of writes
+        lat = job.get('sync', {}).get('lat_ns') or job['write']['clat_ns']
+        pcts = lat.get('percentile', {})
+        return dict(fsync_p50_ms=pcts.get("50.000000", 0) / 1e6,
+                    fsync_p99_ms=pcts.get("99.000000", 0) / 1e6)
+    op = job['read'] if profile.endswith("read") else job['write']
+    if profile.startswith("rand"):
+        return {f"{profile}_iops": op['iops']}
+    return {f"{profile}_mib_per_second": op['bw_bytes'] / 2 ** 20}
+
+
+@pytest.mark.p1
+@pytest.mark.benchmark
+@pytest.mark.volumes
+class TestStorageIO:
+    """ fio profiles inside the guest on a volume of the storage class of `replicas`:
+    random 4k IOPS, sequential 1M throughput and the latency of 4k writes with fsync.
+    """
+
+    def test_fio(self, request, benchmark_vms, benchmark_runs, storage_classes, io_matrix,
+                 replicas):
+        size = request.config.getoption("--benchmark-volume-size")
+        runtime = request.config.getoption("--benchmark-fio-runtime")
+        fleet, (matrix, samples) = benchmark_vms, io_matrix
+        name = f"bench-fio-{datetime.now().strftime('%m%d%H%M%S')}-r{replicas}"
+        spec = fleet.spec(cpu=2, packages=("fio",))
+        device = add_disk(spec, "data", size, storage_cls=storage_classes(replicas))
+        fleet.create(name, spec)
+        vmi = fleet.wait_ready(name)
+
+        results = []
+        with fleet.ssh(vmi) as sh:
+            # unwritten blocks are read as zeros without touching the replicas
+            fio(sh, "prefill", device, PROFILES['write'])
+            for run in range(benchmark_runs):
+                result = dict()
+                for profile, args in PROFILES.items():
+                    result.update(io_metrics(profile, fio(sh, profile, device, args, runtime)))
+                results.append(result)
+        fleet.delete(name)
+
+        samples[replicas] = results
+        matrix[replicas] = {key: summarize(r[key] for r in results) for key in results[0]}
@@ -0,0 +1,73 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+
+from harvester_e2e_tests.fixtures.benchmark import PhaseTimer, int_list, summarize
+
+pytest_plugins = [
+    "harvester_e2e_tests.fixtures.api_client",
+    "harvester_e2e_tests.fixtures.virtualmachines",
+    "harvester_e2e_tests.fixtures.benchmark"
+]
+
+# seconds since `vms.create` is called, in the order they are reached
+PHASES = ("accepted", "scheduled", "running", "ip", "agent", "ssh")
+
+
+def pytest_generate_tests(metafunc):
+    if "concurrency" in metafunc.fixturenames:
+        levels = int_list(metafunc.config.getoption("--benchmark-concurrency"))
+        metafunc.parametrize("concurrency", levels, ids=[f"x{c}" for c in levels])
+
+
+def boot(fleet, name):
+    """ Create the VM and returns the seconds of each phase it reached """
+    timer = PhaseTimer()
+    fleet.create(name, fleet.spec())
+    timer.mark("accepted")
+
+    def check(vmi):
+        status = (vmi or {}).get('status', {})
+        if status.get('phase') in ("Scheduled", "Running") and status.get('nodeName'):
+            timer.mark("scheduled")
+        if fleet.vm_checker.is_running(vmi):
+            timer.mark("running")
+        if "running" in timer and fleet.vm_checker.ip_addresses(vmi):
+            timer.mark("ip")
+        if "running" in timer and fleet.vm_checker.agent_connected(vmi):
+            timer.mark("agent")
+        return "ip" in timer and "agent" in timer
+
+    ok, vmi = fleet.vm_checker.wait_status(name, fleet.namespace, check)
+    if ok:
+        with fleet.ssh(vmi):
+            timer.mark("ssh")
+    return timer.phases
+
+
+@pytest.mark.p1
+@pytest.mark.benchmark
+@pytest.mark.virtualmachines
+class TestVMLifecycle:
+    """ Latency of VM creation: API accepted, VMI scheduled, Running, IP reported,
+    guest agent connected and SSH reachable, with `concurrency` VMs created at once.
+    """
+
+    def test_create_to_ssh(self, benchmark_vms, benchmark_report, benchmark_runs, concurrency):
+        prefix = f"bench-boot-{datetime.now().strftime('%m%d%H%M%S')}-x{concurrency}"
+        samples = []
+        for run in range(benchmark_runs):
+            names = [f"{prefix}-{run}-{i}" for i in range(concurrency)]
+            with ThreadPoolExecutor(concurrency) as executor:
+                samples += executor.map(lambda n: boot(benchmark_vms, n), names)
+            benchmark_vms.delete(*names)
+
+        metrics = {phase: summarize(s.get(phase) for s in samples) for phase in PHASES}
+        benchmark_report.add("vm_lifecycle", dict(concurrency=concurrency), metrics, samples)
+
+        incomplete = [s for s in samples if "ssh" not in s]
+        assert not incomplete, (
+            f"{len(incomplete)} of {len(samples)} VMs are not reachable by SSH,"
+            f" phases reached: {incomplete}"
+        )
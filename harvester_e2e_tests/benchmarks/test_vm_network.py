@@ -0,0 +1,119 @@
+import json
+import re
+from datetime import datetime
+
+import pytest
+from pkg_resources import parse_version
+
+from harvester_e2e_tests.fixtures.benchmark import summarize
+
+pytest_plugins = [
+    "harvester_e2e_tests.fixtures.api_client",
+    "harvester_e2e_tests.fixtures.network",
+    "harvester_e2e_tests.fixtures.virtualmachines",
+    "harvester_e2e_tests.fixtures.benchmark"
+]
+
+# nics of both VMs, `default` is the management network by masquerade
+NICS = ("default", "vlan")
+PING_TIME = re.compile(r"time=(\d+(?:\.\d+)?) ms")
+
+
+@pytest.fixture(scope="module")
+def bench_vlan(request, api_client, benchmark_vms):
+    vlan_id = request.config.getoption('--vlan-id')
+    if vlan_id == -1:
+        pytest.skip("VLAN is not configured")
+    # requested after the check, the cluster network would be created before skipping
+    request.getfixturevalue("enable_vlan")
+
+    cluster_network = None
+    if api_client.cluster_version > parse_version("v1.0.3"):
+        cluster_network = request.config.getoption('--vlan-nic')
+    name = f"bench-vlan-{datetime.now().strftime('%m%d%H%M%S')}"
+    code, data = api_client.networks.create(name, vlan_id, cluster_network=cluster_network)
+    assert 201 == code, (code, data)
+    yield f"{data['metadata']['namespace']}/{name}"
+
+    # networks in use could not be deleted
+    benchmark_vms.delete(*benchmark_vms.names)
+    api_client.networks.delete(name)
+
+
+def iperf3(shell, target, seconds, udp_bitrate=None):
+    """ Returns the result of iperf3 from the shell to the server at `target` """
+    args = f"-u -b {udp_bitrate}" if udp_bitrate else ""
+    out, err = shell.exec_command(f"iperf3 -c {target} -t {seconds} -J {args}")
+    try:
+        data = json.loads(out)
+    except ValueError as e:
+        raise AssertionError(f"iperf3 to {target} failed: {out} {err}") from e
+    assert "error" not in data, f"iperf3 to {target} failed: {data['error']}"
+    return data['end']
+
+
+def latencies(shell, target, count=50):
+    """ Round trip times in milliseconds of pings every 0.2 seconds """
+    out, err = shell.exec_command(f"ping -c {count} -i 0.2 {target}")
+    return [float(t) for t in PING_TIME.findall(out)]
+
+
+def measure(shell, target, seconds, udp_bitrate):
+    tcp = iperf3(shell, target, seconds)
+    udp = iperf3(shell, target, seconds, udp_bitrate)
+    # UDP results of the receiver are in `sum` for iperf3 older than 3.10
+    udp_received = udp.get('sum_received') or udp['sum']
+    return dict(
+        tcp_gbps=tcp['sum_received']['bits_per_second'] / 1e9,
+        tcp_retransmits=tcp['sum_sent'].get('retransmits'),
+        udp_gbps=udp_received['bits_per_second'] / 1e9,
+        udp_jitter_ms=udp['sum'].get('jitter_ms'),
+        udp_lost_percent=udp['sum'].get('lost_percent'),
+        latency_ms=latencies(shell, target)
+    )
+
+
+@pytest.mark.p1
+@pytest.mark.benchmark
+@pytest.mark.networks
+@pytest.mark.virtualmachines
+class TestVMNetwork:
+    """ iperf3 TCP and UDP throughput and ping latency between two VMs on the same node or
+    across nodes, over VLAN and over the management network.
+    """
+
+    @pytest.mark.parametrize("placement", ["same_node", "cross_node"])
+    def test_iperf3(self, request, benchmark_vms, benchmark_report, benchmark_runs,
+                    benchmark_hosts, bench_vlan, placement):
+        if "cross_node" == placement and len(benchmark_hosts) < 2:
+            pytest.skip(f"Needs 2 schedulable nodes at least, got {benchmark_hosts}")
+        seconds = request.config.getoption("--benchmark-iperf-time")
+        udp_bitrate = request.config.getoption("--benchmark-udp-bitrate")
+        fleet = benchmark_vms
+        prefix = f"bench-net-{datetime.now().strftime('%m%d%H%M%S')}-{placement[0]}"
+        nodes = benchmark_hosts[:1] * 2 if "same_node" == placement else benchmark_hosts[:2]
+
+        spec = fleet.spec(cpu=2, packages=("iperf",), networks=dict(vlan=bench_vlan))
+        names = [f"{prefix}-server", f"{prefix}-client"]
+        for name, node in zip(names, nodes):
+            fleet.create(name, spec, node=node)
+        server, client = (fleet.wait_ready(name, NICS) for name in names)
+        targets = fleet.vm_checker.ip_addresses(server, NICS)
+
+        samples = {nic: [] for nic in NICS}
+        with fleet.ssh(server) as sh:
+            out, err = sh.exec_command("iperf3 -s -D")
+            assert not err, f"Failed to start iperf3 server: {err}"
+        with fleet.ssh(client) as sh:
+            for run in range(benchmark_runs):
+                for nic in NICS:
+                    samples[nic].append(measure(sh, targets[nic], seconds, udp_bitrate))
+        fleet.delete(*names)
+
+        for nic, results in samples.items():
+            metrics = {key: summarize(r[key] for r in results)
+                       for key in results[0] if "latency_ms" != key}
+            metrics['latency_ms'] = summarize(t for r in results for t in r['latency_ms'])
+            network = "mgmt" if "default" == nic else "vlan"
+            benchmark_report.add("vm_network", dict(placement=placement, network=network,
+                                                    udp_bitrate=udp_bitrate), metrics, results)
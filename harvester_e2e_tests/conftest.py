@@ -19,6 +19,14 @@ import pytest
 import yaml
 from pytest_dependency import DependencyManager as DepMgr
 
+from harvester_e2e_tests.plugins.shard import ShardPlugin
+from harvester_e2e_tests.plugins.spans import SpanRecorder
+from harvester_e2e_tests.plugins.profiler import TimingProfiler
+from harvester_e2e_tests.plugins.tracing import TraceWriter, worker_name
+from harvester_e2e_tests.plugins.image_mirror import ImageMirrorPlugin
+from harvester_e2e_tests.plugins.reaper import ReaperPlugin
+from harvester_e2e_tests.plugins.labels import RunLabelsPlugin, resolve_run_id
+
 
 def check_depends(self, depends, item):
     # monkey patch `DependencyManager.checkDepends`
@@ -152,6 +160,66 @@ def pytest_addoption(parser):
         default=config_data['image-cache-url'],
         help=('URL for the local images cache')
     )
+    parser.addoption(
+        '--test-run-id',
+        action='store',
+        default=config_data.get('test-run-id', ''),
+        help=('ID labeled on objects created by tests, generated when empty')
+    )
+    parser.addoption(
+        '--delete-leftovers',
+        action='store',
+        default=config_data.get('delete-leftovers', ''),
+        help=('Label selector of leftovers of previous runs to be deleted before tests, '
+              'e.g. `tests.harvesterhci.io/test-run-id` for all of them')
+    )
+    parser.addoption(
+        '--teardown-workers',
+        action='store',
+        type=int,
+        default=config_data.get('teardown-workers', 4),
+        help=('Threads deleting VMs, volumes and images of teardowns in background, '
+              '0 to delete them in the teardown')
+    )
+    parser.addoption(
+        '--reuse-resources',
+        action='store_true',
+        default=config_data.get('reuse-resources', False),
+        help=('Keep images, networks, cluster networks and keypairs created by fixtures, '
+              'labeled with the hash of their spec, and adopt them in next runs')
+    )
+    parser.addoption(
+        '--vm-pool-size',
+        action='store',
+        type=int,
+        default=config_data.get('vm-pool-size', 1),
+        help=('Count of VMs booted ahead for tests using `pooled_vm`')
+    )
+    parser.addoption(
+        '--image-mirror',
+        action='store_true',
+        default=config_data.get('image-mirror', False),
+        help=('Start a local image mirror which prefetches the images of fixtures, '
+              'and use it as `--image-cache-url`')
+    )
+    parser.addoption(
+        '--image-mirror-dir',
+        action='store',
+        default=config_data.get('image-mirror-dir', '~/.cache/harvester-e2e-images'),
+        help=('Directory to store images of the local image mirror')
+    )
+    parser.addoption(
+        '--image-mirror-size',
+        action='store',
+        default=config_data.get('image-mirror-size', 50),
+        help=('Max size (GiB) of the local image mirror, least recently used images are evicted')
+    )
+    parser.addoption(
+        '--image-mirror-address',
+        action='store',
+        default=config_data.get('image-mirror-address', '0.0.0.0:0'),
+        help=('`host:port` the local image mirror listens on, port 0 picks a free one')
+    )
     parser.addoption(
         '--accessKeyId',
         action='store',
@@ -284,6 +352,159 @@ def pytest_addoption(parser):
         default=config_data['upgrade-wait-timeout'],
         help=('Wait time for polling upgrade Harvester cluster completed status')
     )
+    parser.addoption(
+        '--durations-history',
+        action='store',
+        default=config_data.get('durations-history', ''),
+        help=('JSON file to record the duration of each test, which be used by `--shard`, '
+              'empty to disable')
+    )
+    parser.addoption(
+        '--shard',
+        action='store',
+        default=None,
+        help=('Run only the i-th of N shards (as `i/N`) balanced by the durations history, '
+              'tests chained by `pytest.mark.dependency` are kept in the same shard')
+    )
+    parser.addoption(
+        '--profile-timing',
+        action='store',
+        default=config_data.get('profile-timing', ''),
+        help=('JSON file to save the time breakdown (api, poll, sleep, ssh and active) '
+              'of each test and fixture, a summary table is also printed when it is set')
+    )
+    parser.addoption(
+        '--trace-timeline',
+        action='store',
+        default=config_data.get('trace-timeline', ''),
+        help=('JSON file to save the trace events (Chrome/Perfetto format) of fixtures, '
+              'tests, HTTP calls, polling, sleeps and SSH commands')
+    )
+    parser.addoption(
+        '--api-metrics',
+        action='store',
+        default=config_data.get('api-metrics', ''),
+        help=('File to save per-endpoint counters and latency histograms of API clients, '
+              'as Prometheus textfile if it ends with `.prom`, otherwise JSON')
+    )
+    parser.addoption(
+        '--api-budget-mode',
+        action='store',
+        choices=('warn', 'fail'),
+        default=config_data.get('api-budget-mode', 'warn'),
+        help=('Warn or fail the test when it goes over `pytest.mark.api_budget`')
+    )
+    parser.addoption(
+        '--api-cassette',
+        action='store',
+        default=config_data.get('api-cassette', ''),
+        help=('Cassette file (gzipped JSON) to record responses of API clients into, '
+              'or to replay them from without a cluster')
+    )
+    parser.addoption(
+        '--api-cassette-mode',
+        action='store',
+        choices=('record', 'replay', 'replay-collapse'),
+        default=config_data.get('api-cassette-mode', 'record'),
+        help=('Record the cassette, replay it, or replay it with poll loops collapsed '
+              'into their last response')
+    )
+    parser.addoption(
+        '--run-benchmark',
+        action='store_true',
+        default=config_data.get('run-benchmark', False),
+        help='Run tests marked as `benchmark`, which are skipped by default'
+    )
+    parser.addoption(
+        '--benchmark-report',
+        action='store',
+        default=config_data.get('benchmark-report', 'benchmark-report.json'),
+        help='JSON file to save results of benchmarks with the environment'
+    )
+    parser.addoption(
+        '--benchmark-concurrency',
+        action='store',
+        default=config_data.get('benchmark-concurrency', '1,4'),
+        help='Comma-separated levels of concurrency of benchmarks, e.g. `1,4,8`'
+    )
+    parser.addoption(
+        '--benchmark-runs',
+        action='store',
+        type=int,
+        default=config_data.get('benchmark-runs', 3),
+        help='Runs of each benchmark and parameter, their samples are summarized together'
+    )
+    parser.addoption(
+        '--benchmark-scale-vms',
+        action='store',
+        type=int,
+        default=config_data.get('benchmark-scale-vms', 10),
+        help='VMs created and deleted in each run of the control plane scale benchmark'
+    )
+    parser.addoption(
+        '--benchmark-migration-memory',
+        action='store',
+        default=config_data.get('benchmark-migration-memory', '2,4'),
+        help='Comma-separated memory sizes in GiB of VMs of the live migration benchmark'
+    )
+    parser.addoption(
+        '--benchmark-dirty-rates',
+        action='store',
+        default=config_data.get('benchmark-dirty-rates', '0,64,256'),
+        help='Comma-separated MiB of memory rewritten each second during live migrations'
+    )
+    parser.addoption(
+        '--benchmark-replicas',
+        action='store',
+        default=config_data.get('benchmark-replicas', '1,2,3'),
+        help='Comma-separated replica counts of storage classes of the storage I/O benchmark'
+    )
+    parser.addoption(
+        '--benchmark-volume-size',
+        action='store',
+        type=int,
+        default=config_data.get('benchmark-volume-size', 10),
+        help='Size in GiB of the volume tested by fio in the storage I/O benchmark'
+    )
+    parser.addoption(
+        '--benchmark-fio-runtime',
+        action='store',
+        type=int,
+        default=config_data.get('benchmark-fio-runtime', 30),
+        help='Seconds of each fio profile of the storage I/O benchmark'
+    )
+    parser.addoption(
+        '--benchmark-iperf-time',
+        action='store',
+        type=int,
+        default=config_data.get('benchmark-iperf-time', 10),
+        help='Seconds of each iperf3 test of the VM network benchmark'
+    )
+    parser.addoption(
+        '--benchmark-udp-bitrate',
+        action='store',
+        default=config_data.get('benchmark-udp-bitrate', '1G'),
+        help='Target bitrate of UDP tests of iperf3, e.g. `500M`'
+    )
+    parser.addoption(
+        '--benchmark-backup-sizes',
+        action='store',
+        default=config_data.get('benchmark-backup-sizes', '1,10'),
+        help='Comma-separated GiB of data written into VMs of the backup benchmark, e.g. `1,100`'
+    )
+    parser.addoption(
+        '--benchmark-backup-rewrite',
+        action='store',
+        type=int,
+        default=config_data.get('benchmark-backup-rewrite', 10),
+        help='Percentage of the data rewritten before the incremental backup'
+    )
+    parser.addoption(
+        '--benchmark-image-sizes',
+        action='store',
+        default=config_data.get('benchmark-image-sizes', '1,2'),
+        help='Comma-separated GiB of images imported by the image import benchmark'
+    )
 
     # TODO(gyee): may need to add SSL options later
 
@@ -342,6 +563,11 @@ def pytest_configure(config):
             "mark test skipped when cluster version < provided version")),
         ("skip_version_after", (
             "mark test skipped when cluster version >= provided version")),
+        ("benchmark", (
+            "mark the test is a benchmark, which only runs with `--run-benchmark`")),
+        ("api_budget", (
+            "api_budget(max_calls=None, max_bytes=None, mode=None): warn or fail the test"
+            " when its API calls or transferred bytes go over the budget")),
         ('p0', ("mark the test's priority is p0")),
         ('p1', ("mark the test's priority is p1")),
         ('p2', ("mark the test's priority is p2")),
@@ -372,6 +598,36 @@ def pytest_configure(config):
         related = 'mark the test is related to'
         config.addinivalue_line("markers", f"{m}:{msg.format(_r=related)}")
 
+    config.pluginmanager.register(ShardPlugin(config), "harvester_shard")
+    config.pluginmanager.register(
+        ReaperPlugin(config.getoption('--teardown-workers')), "harvester_reaper")
+    config.pluginmanager.register(RunLabelsPlugin(resolve_run_id(config)), "harvester_run_labels")
+
+    if config.getoption('--image-mirror'):
+        from harvester_e2e_tests.fixtures.images import (
+            DEFAULT_OPENSUSE_IMAGE_URL, DEFAULT_K3OS_IMAGE_URL
+        )
+        from harvester_e2e_tests.fixtures import image
+
+        urls = [config.getoption('--opensuse-image-url'), DEFAULT_OPENSUSE_IMAGE_URL,
+                DEFAULT_K3OS_IMAGE_URL, image.UBUNTU_IMAGE_URL, image.K3OS_IMAGE_URL,
+                image.OPENSUSE_TUMBLEWEED_IMAGE_URL, image.OPENSUSE_LEAP_IMAGE_URL,
+                config.getoption('--win-image-url')]
+        config.pluginmanager.register(
+            ImageMirrorPlugin(config, [u for u in urls if u]), "harvester_image_mirror")
+
+    profile, timeline = config.getoption('--profile-timing'), config.getoption('--trace-timeline')
+    if profile or timeline:
+        recorder = SpanRecorder()
+        recorder.install()
+        config.add_cleanup(recorder.uninstall)
+        config.pluginmanager.register(recorder, "harvester_spans")
+    if profile:
+        config.pluginmanager.register(TimingProfiler(recorder, profile), "harvester_profiler")
+    if timeline:
+        config.pluginmanager.register(
+            TraceWriter(recorder, timeline, worker_name(config)), "harvester_tracing")
+
 
 @pytest.hookimpl(hookwrapper=True)
 def pytest_collection_modifyitems(session, config, items):
@@ -424,6 +680,11 @@ def pytest_collection_modifyitems(session, config, items):
             if "delete_host" in item.keywords:
                 item.add_marker(pytest.mark.skip(reason="Not configured to test host deletion."))
 
+    if not config.getoption("--run-benchmark"):
+        for item in items:
+            if "benchmark" in item.keywords:
+                item.add_marker(pytest.mark.skip(reason="Benchmarks run with --run-benchmark."))
+
     # legacy code above
     # ''' To enable the test select with `and depends` keyword,
     #     to select test cases and it depended test cases.
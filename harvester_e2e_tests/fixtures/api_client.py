@@ -1,34 +1,191 @@
+import json
 import re
+import threading
+import warnings
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
+from hashlib import sha256
 from io import StringIO
 from tempfile import NamedTemporaryFile
+from weakref import WeakSet
 from pathlib import Path
 from subprocess import run, PIPE
 
 import pytest
 from paramiko import SSHClient, RSAKey, MissingHostKeyPolicy
+from paramiko.ssh_exception import SSHException
 from pkg_resources import parse_version
 from cryptography.hazmat import backends
 from cryptography.hazmat.primitives import asymmetric, serialization
 
+from common.cassette import Cassette
+from common.metrics import APIMetrics
 from harvester_api import HarvesterAPI
+from harvester_api.leaks import LeakCollector
 
 
 @pytest.fixture(scope="session")
-def api_client(request):
+def api_metrics(request):
+    path = request.config.getoption("--api-metrics")
+    if not path:
+        yield None
+        return
+
+    metrics = APIMetrics()
+    yield metrics
+    metrics.dump(path)
+
+
+@pytest.fixture(scope="session")
+def api_cassette(request):
+    path = request.config.getoption("--api-cassette")
+    if not path:
+        yield None
+        return
+
+    mode = request.config.getoption("--api-cassette-mode")
+    cassette = Cassette(path, mode.split("-")[0], collapse=mode.endswith("-collapse"))
+    yield cassette
+    if "record" == cassette.mode:
+        cassette.save()
+
+
+@pytest.fixture(scope="session")
+def api_client(request, api_metrics, api_cassette):
     endpoint = request.config.getoption("--endpoint")
     username = request.config.getoption("--username")
     password = request.config.getoption("--password")
     ssl_verify = request.config.getoption("--ssl_verify", False)
 
     api = HarvesterAPI(endpoint)
+    if api_metrics:
+        api.enable_metrics(api_metrics)
+    if api_cassette:
+        api.enable_cassette(api_cassette)
     api.authenticate(username, password, verify=ssl_verify)
 
     api.session.verify = ssl_verify
 
+    run_labels = request.config.pluginmanager.get_plugin("harvester_run_labels")
+    if run_labels:
+        api.default_labels = run_labels.labels
+        api.default_annotations = run_labels.annotations
+
     return api
 
 
+@pytest.fixture(autouse=True)
+def api_budget(request):
+    mark = request.node.get_closest_marker("api_budget")
+    if not mark:
+        yield None
+        return
+
+    # requested on demand, tests out of budget do not need to log in
+    api_client = request.getfixturevalue("api_client")
+    max_calls, max_bytes = mark.kwargs.get('max_calls'), mark.kwargs.get('max_bytes')
+    mode = mark.kwargs.get('mode') or request.config.getoption("--api-budget-mode")
+    sessions = [api_client.session]
+    if "rancher_api_client" in request.fixturenames:
+        sessions.append(request.getfixturevalue("rancher_api_client").session)
+
+    metrics = APIMetrics()
+    for session in sessions:
+        metrics.attach(session)
+
+    yield metrics
+
+    for session in sessions:
+        metrics.detach(session)
+    calls, size = metrics.totals()
+    overs = []
+    if max_calls is not None and calls > max_calls:
+        overs.append(f"{calls} API calls > {max_calls}")
+    if max_bytes is not None and size > max_bytes:
+        overs.append(f"{size} bytes > {max_bytes}")
+    if overs:
+        top = sorted(metrics.to_dict().items(), key=lambda kv: -kv[1]['count'])[:5]
+        msg = (f"API budget exceeded: {', '.join(overs)}, top endpoints:\n"
+               + "\n".join(f"  {v['count']:>6} {k}" for k, v in top))
+        if "fail" == mode:
+            pytest.fail(msg)
+        warnings.warn(pytest.PytestWarning(msg))
+
+
+@pytest.fixture(scope="session")
+def reusable_resources(request):
+    return ReusableResources(request.config.getoption("--reuse-resources"))
+
+
+class ReusableResources:
+    """ Adopt resources which are created by fixtures of previous runs
+
+    In `--reuse-resources` mode, fixtures label resources with the hash of the
+    spec they are created from and keep them after the session, so the next run
+    looks them up by the label instead of creating them again.
+    """
+    LABEL = "tests.harvesterhci.io/spec-hash"
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+
+    def __repr__(self):
+        return f"{__class__.__name__}(enabled={self.enabled})"
+
+    @staticmethod
+    def spec_hash(kind, **spec):
+        raw = json.dumps([kind, spec], sort_keys=True)
+        return sha256(raw.encode()).hexdigest()[:16]
+
+    def labels(self, kind, **spec):
+        """ Labels to create the resource with, empty if not in reuse mode """
+        return {self.LABEL: self.spec_hash(kind, **spec)} if self.enabled else dict()
+
+    def adopt(self, items, kind, **spec):
+        """ Returns the item created from the same spec, None if not found or not in reuse mode """
+        if not self.enabled:
+            return None
+        key = self.spec_hash(kind, **spec)
+        for item in items:
+            meta = item['metadata']
+            if (meta.get('labels') or {}).get(self.LABEL) == key \
+                    and not meta.get('deletionTimestamp'):
+                return item
+        return None
+
+    def keep(self, request):
+        """ Whether resources should be kept at teardown """
+        return self.enabled or request.config.getoption('--do-not-cleanup')
+
+
+@pytest.fixture(scope="session")
+def reaper(request):
+    """ `Reaper` which deletes resources of teardowns in background """
+    return request.config.pluginmanager.get_plugin("harvester_reaper").reaper
+
+
+@pytest.fixture(scope="session", autouse=True)
+def delete_leftovers(request, wait_timeout):
+    """ Delete objects labeled by previous runs and matching `--delete-leftovers` """
+    selector = request.config.getoption("--delete-leftovers")
+    if not selector:
+        return
+    api_client = request.getfixturevalue("api_client")
+    run_labels = request.config.pluginmanager.get_plugin("harvester_run_labels")
+    # objects of this run and the ones kept by `--reuse-resources` are excluded
+    selector = f"{selector},{run_labels.RUN_ID_LABEL}!={run_labels.run_id}," \
+               f"!{ReusableResources.LABEL}"
+
+    collector = LeakCollector(api_client, selector, wait_timeout=wait_timeout)
+    errors = collector.delete(collector.find())
+    for type_, namespace, name, error in errors:
+        warnings.warn(pytest.PytestWarning(
+            f"Failed to delete leftover {type_} {namespace}/{name}: {error}"
+        ))
+
+
 @pytest.fixture(scope="session")
 def wait_timeout(request):
     return request.config.getoption("--wait-timeout", 300)
@@ -63,15 +220,22 @@ def host_state(request):
 
 
 @pytest.fixture(scope='module')
-def unique_name():
+def unique_name(api_cassette):
     """Default unique name"""
-    return datetime.now().strftime("%Hh%Mm%Ss%f-%m-%d")
+    return _gen_unique_name(api_cassette)
 
 
 @pytest.fixture(scope='module')
-def gen_unique_name():
+def gen_unique_name(api_cassette):
     """Generate unique name on-demand"""
-    return lambda: datetime.now().strftime("%Hh%Mm%Ss%f-%m-%d")
+    return lambda: _gen_unique_name(api_cassette)
+
+
+def _gen_unique_name(cassette=None):
+    def gen():
+        return datetime.now().strftime("%Hh%Mm%Ss%f-%m-%d")
+    # replaying runs have to request the same names as recorded
+    return cassette.value("unique_name", gen) if cassette else gen()
 
 
 @pytest.fixture(scope="module")
@@ -171,14 +335,103 @@ def skip_version_after(request, api_client):
 
 
 @pytest.fixture(scope="session")
-def host_shell(request):
+def ssh_pool():
+    pool = SSHPool()
+    yield pool
+    pool.close()
+
+
+@lru_cache(maxsize=None)
+def load_private_key(text):
+    """ Parsed `RSAKey` of the PEM text, cached as parsing costs more than a command """
+    return RSAKey.from_private_key(StringIO(text))
+
+
+class SSHPool:
+    """ Reuse SSH connections keyed by (host, port, username, jumphost)
+
+    Each command opens a new channel of the pooled transport, so the handshake
+    and authentication are paid once per target instead of per login. A
+    connection is health-checked by opening a session when it's taken, and
+    reconnected if the check fails (e.g. the target was rebooted).
+    """
+    CHECK_TIMEOUT = 5
+
+    def __init__(self):
+        self.clients = dict()
+        self._locks = defaultdict(threading.Lock)
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"{__class__.__name__}(clients={len(self.clients)})"
+
+    @staticmethod
+    def key_of(client):
+        tp = client.get_transport()
+        return (*tp.getpeername()[:2], tp.get_username())
+
+    def is_alive(self, client):
+        tp = client.get_transport()
+        if not (tp and tp.is_active()):
+            return False
+        try:
+            tp.open_session(timeout=self.CHECK_TIMEOUT).close()
+        except (SSHException, EOFError, OSError):
+            return False
+        return True
+
+    def connect(self, host, port=22, username=None, jumphost=None, **kwargs):
+        """ Returns the pooled `SSHClient`, connects through `jumphost` client if given """
+        key = (host, port, username, self.key_of(jumphost) if jumphost else None)
+        with self._lock:
+            lock = self._locks[key]
+
+        with lock:
+            cli = self.clients.get(key)
+            if cli and self.is_alive(cli):
+                return cli
+            self.discard(cli)
+
+            sock = None
+            if jumphost:
+                tp = jumphost.get_transport()
+                sock = tp.open_channel('direct-tcpip', (host, port), tp.sock.getpeername())
+            cli = SSHClient()
+            cli.set_missing_host_key_policy(MissingHostKeyPolicy())
+            cli.connect(host, port, username=username, sock=sock, **kwargs)
+            self.clients[key] = cli
+            return cli
+
+    def discard(self, client):
+        """ Close the client and remove it from the pool """
+        if not client:
+            return
+        with self._lock:
+            for key, cli in list(self.clients.items()):
+                if cli is client:
+                    del self.clients[key]
+        client.close()
+
+    def close(self):
+        # connections through jump hosts first
+        for key, cli in sorted(self.clients.items(), key=lambda kv: kv[0][3] is None):
+            self.discard(cli)
+
+
+@pytest.fixture(scope="session")
+def host_shell(request, ssh_pool):
     password = request.config.getoption("--host-password") or None
     pkey = request.config.getoption('--host-private-key') or None
     if pkey:
-        pkey = RSAKey.from_private_key(StringIO(pkey))
+        pkey = load_private_key(pkey)
 
     class HostShell:
-        _client = _jump = None
+        _client = _jump = _addr = None
+        # hosts which are allowed to be jump hosts, restored at the end of session
+        jumphosts = set()
+        # pooled connections which are established after the hosts being allowed
+        _jump_clients = WeakSet()
+        _jump_lock = threading.Lock()
 
         def __init__(self, username, password=None, pkey=None):
             self.username = username
@@ -197,46 +450,81 @@ def host_shell(request):
 
         def reconnect(self, ipaddr, port=22, **kwargs):
             if self.client:
-                self.client.close()
-                self._client = cli = SSHClient()
-                cli.set_missing_host_key_policy(MissingHostKeyPolicy())
-                kws = dict(username=self.username, password=self.password, pkey=self.pkey)
-                kws.update(kwargs)
-                cli.connect(ipaddr, port, **kws)
+                ssh_pool.discard(self.client)
+                self._client = None
+                self.login(ipaddr, port, **kwargs)
 
         def login(self, ipaddr, port=22, jumphost=False, **kwargs):
             if not self.client:
-                cli = SSHClient()
-                cli.set_missing_host_key_policy(MissingHostKeyPolicy())
-                kws = dict(username=self.username, password=self.password, pkey=self.pkey)
+                kws = dict(password=self.password, pkey=self.pkey)
                 kws.update(kwargs)
-                cli.connect(ipaddr, port, **kws)
-                self._client = cli
+                self._client = ssh_pool.connect(ipaddr, port, self.username, **kws)
+                self._addr = (ipaddr, port, kwargs)
 
                 if jumphost:
-                    self.jumphost_policy()
+                    with self._jump_lock:
+                        if self.client not in self._jump_clients:
+                            self.jumphosts.add(ipaddr)
+                            if self.jumphost_policy():
+                                # forwarding is only allowed to new connections
+                                self.reconnect(ipaddr, port, **kwargs)
+                            self._jump_clients.add(self.client)
                     self._jump = True
-                    self.reconnect(ipaddr, port, **kws)
 
             return self
 
         def logout(self):
-            if self.client and self.client.get_transport():
-                if self._jump:
-                    self.jumphost_policy(False)
-                    self._jump = None
-                self.client.close()
-                self._client = None
+            # connection is kept in the pool, jump host policy is restored by the fixture
+            self._client = self._jump = None
 
         def exec_command(self, command, bufsize=-1, timeout=None, get_pty=False, env=None,
                          splitlines=False):
-            _, out, err = self.client.exec_command(command, bufsize, timeout, get_pty, env)
+            try:
+                _, out, err = self.client.exec_command(command, bufsize, timeout, get_pty, env)
+            except (SSHException, EOFError) as e:
+                if ssh_pool.is_alive(self.client):
+                    raise e
+                # the pooled connection is broken, retry with a new one
+                ipaddr, port, kwargs = self._addr
+                self.reconnect(ipaddr, port, **kwargs)
+                _, out, err = self.client.exec_command(command, bufsize, timeout, get_pty, env)
             out, err = out.read().decode(), err.read().decode()
             if splitlines:
                 out = out.splitlines()
             return out, err
 
+        def run_all(self, nodes, command, *, max_workers=None, return_exceptions=False,
+                    **kwargs):
+            """ Run the command on all nodes concurrently, returns {ip: (out, err)}
+
+            `nodes` are IPs or node objects of the API (their InternalIP is used),
+            `command` could be a callable taking the logged in shell, whose return
+            value is collected instead. Exceptions are raised unless
+            `return_exceptions`, which collects them as the results.
+            """
+            ips = [n if isinstance(n, str) else
+                   next(a['address'] for a in n['status']['addresses']
+                        if a['type'] == 'InternalIP')
+                   for n in nodes]
+
+            def run(ip):
+                try:
+                    with type(self)(self.username, self.password, self.pkey).login(ip) as sh:
+                        if callable(command):
+                            return command(sh)
+                        return sh.exec_command(command, **kwargs)
+                except Exception as e:
+                    if return_exceptions:
+                        return e
+                    raise
+
+            if not ips:
+                return dict()
+            with ThreadPoolExecutor(max_workers or len(ips)) as executor:
+                return dict(zip(ips, executor.map(run, ips)))
+
         def jumphost_policy(self, allow=True):
+            """ Returns whether sshd_config is changed and sshd is restarted """
             ctx, err = self.exec_command("sudo cat /etc/ssh/sshd_config")
             if allow:
                 renew = re.sub(r'\n(Allow(?:Tcp|Agent)Forwarding no)',
@@ -244,8 +532,20 @@ def host_shell(request):
             else:
                 renew = re.sub(r'#(Allow(?:Tcp|Agent)Forwarding no)',
                                lambda m: m.group(1), ctx, re.I | re.M)
+            if renew == ctx:
+                return False
             self.exec_command(f'sudo cat<<"EOF">_config\n{renew}EOF')
             self.exec_command('sudo mv _config /etc/ssh/sshd_config'
                               ' && sudo systemctl restart sshd')
-
-    return HostShell('rancher', password, pkey)
+            return True
+
+    shell = HostShell('rancher', password, pkey)
+    yield shell
+
+    results = shell.run_all(HostShell.jumphosts, lambda sh: sh.jumphost_policy(False),
+                            return_exceptions=True)
+    for ipaddr, rv in results.items():
+        if isinstance(rv, Exception):
+            warnings.warn(pytest.PytestWarning(
+                f"Failed to restore sshd_config of host {ipaddr}: {rv}"
+            ))
@@ -0,0 +1,277 @@
+import json
+import math
+import platform
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from io import StringIO
+from pathlib import Path
+from time import monotonic, sleep
+
+import pytest
+import yaml
+from harvester_api.managers import DEFAULT_NAMESPACE
+from paramiko import RSAKey
+from paramiko.ssh_exception import SSHException
+
+pytest_plugins = [
+    "harvester_e2e_tests.fixtures.api_client",
+    "harvester_e2e_tests.fixtures.images",
+    "harvester_e2e_tests.fixtures.virtualmachines"
+]
+
+
+def int_list(value):
+    """ Parse option values like `1,4,8` """
+    return [int(v) for v in str(value).split(",") if v.strip()]
+
+
+def summarize(values, pcts=(50, 95, 99)):
+    """ Returns count, min, max, mean and nearest-rank percentiles of the values """
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return dict(count=0)
+    stats = dict(count=len(values), min=values[0], max=values[-1],
+                 mean=sum(values) / len(values))
+    for pct in pcts:
+        stats[f"p{pct}"] = values[max(math.ceil(pct / 100 * len(values)) - 1, 0)]
+    return stats
+
+
+def add_disk(spec, name, size, **kwargs):
+    """ Add a volume to the VMSpec, returns the path of its disk in the guest by the serial """
+    vol = spec.add_volume(name, size, **kwargs)
+    vol['disk']['serial'] = name
+    return f"/dev/disk/by-id/virtio-{name}"
+
+
+class PhaseTimer:
+    """ Seconds since the start when each phase is reached for the first time """
+
+    def __init__(self):
+        self.start = monotonic()
+        self.phases = dict()
+
+    def __repr__(self):
+        return f"{__class__.__name__}({self.phases})"
+
+    def __contains__(self, phase):
+        return phase in self.phases
+
+    def mark(self, phase):
+        return self.phases.setdefault(phase, monotonic() - self.start)
+
+
+@pytest.fixture(scope="session")
+def benchmark_report(request, api_client):
+    report = BenchmarkReport(dict(
+        harvester_version=api_client.cluster_version.raw,
+        nodes=len(api_client.hosts.get()[1]['data']),
+        endpoint=request.config.getoption("--endpoint"),
+        test_run_id=request.config.getoption("--test-run-id"),
+        started=datetime.now().isoformat(timespec="seconds"),
+        client=platform.node()
+    ))
+    yield report
+
+    path = request.config.getoption("--benchmark-report")
+    if path and report.results:
+        report.dump(path)
+
+
+class BenchmarkReport:
+    """ Results of benchmarks with the environment, saved as JSON
+
+    Each result is keyed by the benchmark and its parameters, so reports of
+    different Harvester versions can be joined on them.
+    """
+
+    def __init__(self, environment):
+        self.environment = environment
+        self.results = []
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"{__class__.__name__}(results={len(self.results)})"
+
+    def add(self, benchmark, params, metrics, samples=None):
+        result = dict(benchmark=benchmark, params=dict(params), metrics=metrics,
+                      finished=datetime.now().isoformat(timespec="seconds"))
+        if samples is not None:
+            result['samples'] = samples
+        with self._lock:
+            self.results.append(result)
+        return result
+
+    def to_dict(self):
+        with self._lock:
+            return dict(environment=self.environment, results=list(self.results))
+
+    def dump(self, path):
+        path = Path(path)
+        path.write_text(json.dumps(self.to_dict(), indent=2) + "\n")
+        return path
+
+
+@pytest.fixture(scope="session")
+def benchmark_runs(request):
+    return request.config.getoption("--benchmark-runs")
+
+
+@pytest.fixture(scope="module")
+def benchmark_hosts(api_client):
+    """ Names of nodes which are ready and schedulable """
+    code, data = api_client.hosts.get()
+    assert 200 == code, (code, data)
+    return sorted(
+        node['metadata']['name'] for node in data['data']
+        if not node.get('spec', {}).get('unschedulable')
+        and any("Ready" == c.get('type') and "True" == c.get('status')
+                for c in node.get('status', {}).get('conditions', []))
+    )
+
+
+@pytest.fixture(scope="module")
+def benchmark_vms(api_client, image_pool, image_opensuse, vm_checker, host_shell, vm_shell,
+                  wait_timeout):
+    image = image_pool.acquire(image_opensuse.url, display_name=image_opensuse.name)
+    fleet = GuestFleet(api_client, vm_checker, host_shell, vm_shell, image,
+                       image_opensuse.ssh_user, wait_timeout)
+    yield fleet
+
+    fleet.delete(*fleet.names)
+    image_pool.release(image)
+
+
+class GuestFleet:
+    """ VMs of a benchmark, which could be logged in by SSH through their hosts
+
+    Unlike fixtures of the tests, deletions are waited in place, so a run does
+    not compete with the teardown of the previous one.
+    """
+
+    def __init__(self, api_client, vm_checker, host_shell, vm_shell, image, ssh_user,
+                 wait_timeout, namespace=DEFAULT_NAMESPACE):
+        self.api_client = api_client
+        self.vm_checker = vm_checker
+        self.host_shell = host_shell
+        self.vm_shell = vm_shell
+        self.image_id = f"{image['metadata']['namespace']}/{image['metadata']['name']}"
+        self.ssh_user = ssh_user
+        self.wait_timeout = wait_timeout
+        self.namespace = namespace
+        self.names = []
+        self.claims = dict()  # {VM name: names of its PVCs}
+
+        key = RSAKey.generate(2048)
+        self.pub_key = f"{key.get_name()} {key.get_base64()}"
+        buf = StringIO()
+        key.write_private_key(buf)
+        self.pri_key = buf.getvalue()
+
+    def __repr__(self):
+        return f"{__class__.__name__}({self.image_id!r}, vms={len(self.names)})"
+
+    def spec(self, cpu=1, memory=2, packages=(), runcmd=(), networks=None):
+        """ VMSpec booting the image with the key authorized, packages installed and commands
+        run by cloud-init, which are done before the guest agent is started.
+        `networks` are {nic: network ID} attached after the management network, by DHCP.
+        """
+        spec = self.api_client.vms.Spec(cpu, memory)
+        spec.add_image("disk-0", self.image_id)
+        for nic, network in (networks or {}).items():
+            spec.add_network(nic, network)
+        if networks:
+            spec.network_data = yaml.dump(dict(version=1, config=[
+                dict(type="physical", name=f"eth{i}", subnets=[dict(type="dhcp")])
+                for i in range(len(spec.networks))
+            ]))
+        userdata = yaml.safe_load(spec.user_data)
+        userdata['ssh_authorized_keys'] = [self.pub_key]
+        userdata['packages'] = list(packages) + userdata.get('packages', [])
+        userdata['runcmd'] = [list(c) for c in runcmd] + userdata.get('runcmd', [])
+        spec.user_data = yaml.dump(userdata)
+        return spec
+
+    def create(self, name, spec, node=None):
+        if node:
+            # VMSpec does not support node selectors
+            spec = spec.to_dict(name, self.namespace)
+            spec['spec']['template']['spec']['nodeSelector'] = {"kubernetes.io/hostname": node}
+        code, data = self.api_client.vms.create(name, spec, self.namespace)
+        assert 201 == code, (code, data)
+        return self.track(data)
+
+    def track(self, vm):
+        """ Have the created VM deleted with its volumes by `delete` or at the end """
+        name = vm['metadata']['name']
+        self.claims[name] = [v['persistentVolumeClaim']['claimName']
+                             for v in vm['spec']['template']['spec']['volumes']
+                             if 'persistentVolumeClaim' in v]
+        self.names.append(name)
+        return vm
+
+    def wait_ready(self, name, nics=("default",), timeout=None):
+        """ Returns the VMI once the guest agent is connected and `nics` have IPs """
+        ok, vmi = self.vm_checker.wait_agent_connected(name, nics, self.namespace, timeout)
+        assert ok, f"VM {name} is not ready in {timeout or self.wait_timeout}s: {vmi}"
+        return vmi
+
+    def host_ip(self, vmi):
+        code, data = self.api_client.hosts.get(vmi['status']['nodeName'])
+        assert 200 == code, (code, data)
+        return next(addr['address'] for addr in data['status']['addresses']
+                    if addr['type'] == 'InternalIP')
+
+    @contextmanager
+    def ssh(self, vmi, nic="default", timeout=None):
+        """ Shell of the guest logged in through its host, retried until the guest accepts """
+        vm_ip = self.vm_checker.ip_addresses(vmi, (nic,))[nic]
+        host = type(self.host_shell)(self.host_shell.username, self.host_shell.password,
+                                     self.host_shell.pkey)
+        endtime = datetime.now() + timedelta(seconds=timeout or self.wait_timeout)
+        with host.login(self.host_ip(vmi), jumphost=True) as h:
+            while True:
+                sh = self.vm_shell(self.ssh_user, pkey=self.pri_key)
+                try:
+                    sh.connect(vm_ip, jumphost=h.client)
+                    sh.exec_command("true")
+                    break
+                except (SSHException, EOFError, OSError) as e:
+                    if endtime < datetime.now():
+                        raise AssertionError(f"Unable to login to {vm_ip} of "
+                                             f"{vmi['metadata']['name']}") from e
+                    sh.close()
+                    sleep(1)
+            with sh:
+                yield sh
+
+    def delete(self, *names):
+        """ Delete VMs with their volumes and wait until they are gone, returns the seconds """
+        start = monotonic()
+
+        def delete(name):
+            claims = self.claims.pop(name, [])
+            code, data = self.api_client.vms.delete(name, self.namespace)
+            if 404 != code:
+                self.wait_gone(self.api_client.vms, name)
+            for claim in claims:
+                self.api_client.volumes.delete(claim, self.namespace)
+            for claim in claims:
+                self.wait_gone(self.api_client.volumes, claim)
+
+        if names:
+            with ThreadPoolExecutor(min(len(names), 16)) as executor:
+                list(executor.map(delete, names))
+        self.names = [n for n in self.names if n not in names]
+        return monotonic() - start
+
+    def wait_gone(self, manager, name):
+        endtime = datetime.now() + timedelta(seconds=self.wait_timeout)
+        while endtime > datetime.now():
+            code, data = manager.get(name, self.namespace)
+            if 404 == code:
+                return
+            sleep(1)
+        raise AssertionError(f"{name} is not deleted in {self.wait_timeout}s: {data}")
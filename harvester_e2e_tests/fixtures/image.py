@@ -27,77 +27,62 @@ pytest_plugins = [
     'harvester_e2e_tests.fixtures.api_endpoints',
     'harvester_e2e_tests.fixtures.api_version',
     'harvester_e2e_tests.fixtures.session',
+    'harvester_e2e_tests.fixtures.images',
 ]
 
+UBUNTU_IMAGE_URL = ('http://cloud-images.ubuntu.com/releases/focal/release/'
+                    'ubuntu-20.04-server-cloudimg-amd64-disk-kvm.img')
+K3OS_IMAGE_URL = ('https://github.com/rancher/k3os/releases/download/v0.20.4-k3s1r0/'
+                  'k3os-amd64.iso')
+OPENSUSE_TUMBLEWEED_IMAGE_URL = ('https://download.opensuse.org/tumbleweed/iso/'
+                                 'openSUSE-Tumbleweed-NET-x86_64-Current.iso')
+OPENSUSE_LEAP_IMAGE_URL = ('https://download.opensuse.org/repositories/Cloud:/Images:'
+                           '/Leap_15.3/images/openSUSE-Leap-15.3.x86_64-NoCloud.qcow2')
+
 
 @pytest.fixture(scope='class')
-def ubuntu_image(request, harvester_api_version, admin_session,
-                 harvester_api_endpoints):
+def ubuntu_image(request, harvester_api_version, image_pool):
     base_url = request.config.getoption(
-        '--image-cache-url',
-        'http://cloud-images.ubuntu.com/releases/focal/release/')
-    url = os.path.join(base_url,
-                       'ubuntu-20.04-server-cloudimg-amd64-disk-kvm.img')
-    image_json = utils.create_image(
-        request, admin_session, harvester_api_endpoints, url,
-        description='Ubuntu 20.04 Server')
+        '--image-cache-url', os.path.dirname(UBUNTU_IMAGE_URL))
+    url = os.path.join(base_url, os.path.basename(UBUNTU_IMAGE_URL))
+    image_json = image_pool.acquire(url, display_name='ubuntu-20.04-server')
     yield image_json
-    if not request.config.getoption('--do-not-cleanup'):
-        utils.delete_image(request, admin_session, harvester_api_endpoints,
-                           image_json)
+    image_pool.release(image_json)
 
 
 @pytest.fixture(scope='class')
-def windows_image(request, harvester_api_version, admin_session,
-                  harvester_api_endpoints):
+def windows_image(request, harvester_api_version, image_pool):
     url = request.config.getoption('--win-image-url')
     image_json = None
     if url != '':
-        image_json = utils.create_image(
-            request, admin_session, harvester_api_endpoints, url,
-            description='Windows 2016')
+        image_json = image_pool.acquire(url, display_name='windows-2016')
     yield image_json
-    if not request.config.getoption('--do-not-cleanup'):
-        if image_json:
-            utils.delete_image(request, admin_session, harvester_api_endpoints,
-                               image_json)
+    if image_json:
+        image_pool.release(image_json)
 
 
 @pytest.fixture(scope='class')
-def k3os_image(request, harvester_api_version, admin_session,
-               harvester_api_endpoints):
+def k3os_image(request, harvester_api_version, image_pool):
     base_url = request.config.getoption(
-        '--image-cache-url',
-        'https://github.com/rancher/k3os/releases/download/v0.20.4-k3s1r0')
-    url = os.path.join(base_url,
-                       'k3os-amd64.iso')
-    image_json = utils.create_image(
-        request, admin_session, harvester_api_endpoints, url,
-        description='K3OS')
+        '--image-cache-url', os.path.dirname(K3OS_IMAGE_URL))
+    url = os.path.join(base_url, os.path.basename(K3OS_IMAGE_URL))
+    image_json = image_pool.acquire(url, display_name='k3os')
     yield image_json
-    if not request.config.getoption('--do-not-cleanup'):
-        utils.delete_image(request, admin_session, harvester_api_endpoints,
-                           image_json)
+    image_pool.release(image_json)
 
 
 @pytest.fixture(scope='class')
-def opensuse_image(request, harvester_api_version, admin_session,
-                   harvester_api_endpoints):
+def opensuse_image(request, harvester_api_version, image_pool):
     base_url = request.config.getoption(
-        '--image-cache-url',
-        'https://download.opensuse.org/tumbleweed/iso')
-    url = os.path.join(base_url, 'openSUSE-Tumbleweed-NET-x86_64-Current.iso')
-    image_json = utils.create_image(
-        request, admin_session, harvester_api_endpoints, url,
-        description='openSUSE Tumbleweed')
+        '--image-cache-url', os.path.dirname(OPENSUSE_TUMBLEWEED_IMAGE_URL))
+    url = os.path.join(base_url, os.path.basename(OPENSUSE_TUMBLEWEED_IMAGE_URL))
+    image_json = image_pool.acquire(url, display_name='opensuse-tumbleweed')
     yield image_json
-    if not request.config.getoption('--do-not-cleanup'):
-        utils.delete_image(request, admin_session, harvester_api_endpoints,
-                           image_json)
+    image_pool.release(image_json)
 
 
 @pytest.fixture(scope='class')
-def image(request, admin_session, harvester_api_endpoints):
+def image(request, image_pool):
     cache_url = request.config.getoption('--image-cache-url')
 
     # when use parameterized fixture, use the URL from the parameter instead
@@ -107,37 +92,30 @@ def image(request, admin_session, harvester_api_endpoints):
             url = os.path.join(cache_url,
                                url[url.rfind('/') + 1:])
     else:
-        base_url = ('https://download.opensuse.org/repositories/Cloud:/Images:'
-                    '/Leap_15.3/images')
-        if cache_url:
-            base_url = cache_url
-        url = os.path.join(base_url, 'openSUSE-Leap-15.3.x86_64-NoCloud.qcow2')
+        base_url = cache_url or os.path.dirname(OPENSUSE_LEAP_IMAGE_URL)
+        url = os.path.join(base_url, os.path.basename(OPENSUSE_LEAP_IMAGE_URL))
 
-    image_json = utils.create_image(request, admin_session,
-                                    harvester_api_endpoints, url)
+    image_json = image_pool.acquire(url)
     yield image_json
-    if not request.config.getoption('--do-not-cleanup'):
-        utils.delete_image(request, admin_session, harvester_api_endpoints,
-                           image_json)
+    image_pool.release(image_json)
 
 
 @pytest.fixture(scope='class')
-def image_upload_fs(request, admin_session, harvester_api_endpoints):
+def image_upload_fs(request, admin_session, harvester_api_endpoints, reaper):
     image_json = utils.create_image_upload(request, admin_session,
                                            harvester_api_endpoints)
     yield image_json
     if not request.config.getoption('--do-not-cleanup'):
-        utils.delete_image(request, admin_session, harvester_api_endpoints,
-                           image_json)
+        reaper.submit('image', f"image {image_json['metadata']['name']}",
+                      utils.delete_image, request, admin_session,
+                      harvester_api_endpoints, image_json)
 
 
 @pytest.fixture(scope='class')
 def image_using_terraform(request, admin_session, harvester_api_endpoints):
     base_url = request.config.getoption(
-        '--image-cache-url',
-        ('http://download.opensuse.org/repositories/Cloud:/Images:/'
-         'Leap_15.3/images'))
-    url = os.path.join(base_url, 'openSUSE-Leap-15.3.x86_64-NoCloud.qcow2')
+        '--image-cache-url', os.path.dirname(OPENSUSE_LEAP_IMAGE_URL))
+    url = os.path.join(base_url, os.path.basename(OPENSUSE_LEAP_IMAGE_URL))
 
     # when use parameterized fixture, use the URL from the parameter instead
     if getattr(request, 'param', None):
@@ -1,6 +1,10 @@
+from datetime import datetime, timedelta
+from hashlib import sha256
+from time import sleep
 from urllib.parse import urlparse, urljoin
 
 import pytest
+from harvester_api.managers import DEFAULT_NAMESPACE
 
 pytest_plugins = ["harvester_e2e_tests.fixtures.api_client"]
 
@@ -9,6 +13,18 @@ DEFAULT_OPENSUSE_IMAGE_URL = (
     "https://download.opensuse.org/repositories/Cloud:/Images:"
     "/Leap_15.3/images/openSUSE-Leap-15.3.x86_64-NoCloud.qcow2"
 )
+DEFAULT_K3OS_IMAGE_URL = (
+    "https://github.com/rancher/k3os/releases/download/v0.20.11-k3s2r1/k3os-amd64.iso"
+)
+
+
+@pytest.fixture(scope="session")
+def image_pool(request, api_client, wait_timeout, reusable_resources, reaper):
+    pool = ImagePool(api_client, wait_timeout)
+    yield pool
+    # images are labeled by the hash of their source already, adopted by next runs
+    if not reusable_resources.keep(request):
+        pool.cleanup(reaper)
 
 
 @pytest.fixture(scope="session")
@@ -27,9 +43,9 @@ def image_opensuse(request, api_client):
 
 @pytest.fixture(scope="session")
 def image_k3s(request):
-    external = "https://github.com/rancher/k3os/releases/download/v0.20.11-k3s2r1/"
+    external, filename = DEFAULT_K3OS_IMAGE_URL.rsplit("/", 1)
     base_url = request.config.getoption("--image-cache-url") or external
-    url = urlparse(urljoin(f"{base_url}/", "k3os-amd64.iso"))
+    url = urlparse(urljoin(f"{base_url}/", filename))
 
     return ImageInfo(url, ssh_user="k3s")
 
@@ -55,3 +71,118 @@ class ImageInfo:
         if self.is_file:
             return self.url_result.geturl().split("file://", 1)[-1]
         return self.url_result.geturl()
+
+
+class ImagePool:
+    """ Session-wide images keyed by source URL and checksum
+
+    Fixtures `acquire` an image and `release` it at teardown, the same source
+    is only downloaded once, and an image of the same source left on the
+    cluster (e.g. by `--do-not-cleanup`) is adopted. Released images are kept
+    until the end of the session, so the following modules still reuse them.
+    """
+    LABEL = "tests.harvesterhci.io/image-source"
+
+    def __init__(self, api_client, wait_timeout, namespace=DEFAULT_NAMESPACE):
+        self.api_client = api_client
+        self.wait_timeout = wait_timeout
+        self.namespace = namespace
+        self.images = dict()  # key => [image's data, refs, created by the pool]
+
+    def __repr__(self):
+        return f"{__class__.__name__}({list(self.images)})"
+
+    @staticmethod
+    def key_of(url, checksum=None):
+        return sha256(f"{url}\n{checksum or ''}".encode()).hexdigest()[:16]
+
+    def _lookup(self, key):
+        code, data = self.api_client.images.get(namespace=self.namespace)
+        assert 200 == code, (code, data)
+        for image in data['items']:
+            meta = image['metadata']
+            if meta.get('labels', {}).get(self.LABEL) == key and not meta.get('deletionTimestamp'):
+                return image
+        return None
+
+    @staticmethod
+    def import_failure(image):
+        """ Returns the reason and message of a failed import, or None """
+        conds = {c.get('type'): c for c in image.get('status', {}).get('conditions', [])}
+        imported, exceeded = conds.get("Imported", {}), conds.get("RetryLimitExceeded", {})
+        if "True" == exceeded.get('status'):
+            return f"RetryLimitExceeded: {exceeded.get('message', '')}"
+        if "False" == imported.get('status') and imported.get('reason'):
+            return f"{imported['reason']}: {imported.get('message', '')}"
+        return None
+
+    def _wait_for_imported(self, name):
+        endtime = datetime.now() + timedelta(seconds=self.wait_timeout)
+        while endtime > datetime.now():
+            code, data = self.api_client.images.get(name, self.namespace)
+            assert 200 == code, (code, data)
+            if 100 == data.get('status', {}).get('progress', 0):
+                return data
+            # an image of the same source is failed as well, no need to wait for the timeout
+            failure = self.import_failure(data)
+            if failure:
+                raise AssertionError(f"Failed to import Image {name}, {failure}")
+            sleep(3)
+        raise AssertionError(
+            "Failed to create Image with error:\n"
+            f"Status({code}): {data}"
+        )
+
+    def acquire(self, url, checksum=None, display_name=None):
+        """ Returns the data of the `VirtualMachineImage` which is imported from the URL """
+        key = self.key_of(url, checksum)
+        if key in self.images:
+            self.images[key][1] += 1
+            return self.images[key][0]
+
+        image, created = self._lookup(key), False
+        if image is None:
+            name = f"image-{key}"
+            *_, filename = urlparse(url).path.rsplit("/", 1)
+            code, image = self.api_client.images.create_by_url(
+                name, url, self.namespace, display_name=f"{display_name or filename}-{key[:8]}",
+                checksum=checksum, labels={self.LABEL: key}
+            )
+            assert 201 == code, (code, image)
+            created = True
+
+        image = self._wait_for_imported(image['metadata']['name'])
+        self.images[key] = [image, 1, created]
+        return image
+
+    def release(self, image):
+        key = image['metadata'].get('labels', {}).get(self.LABEL)
+        if key in self.images:
+            self.images[key][1] = max(self.images[key][1] - 1, 0)
+
+    def _delete(self, name):
+        self.api_client.images.delete(name, self.namespace)
+        endtime = datetime.now() + timedelta(seconds=self.wait_timeout)
+        while endtime > datetime.now():
+            code, data = self.api_client.images.get(name, self.namespace)
+            if 404 == code:
+                return
+            sleep(3)
+        raise AssertionError(
+            f"Failed to delete Image {name} with error:\n"
+            f"Status({code}): {data}"
+        )
+
+    def cleanup(self, reaper=None):
+        """ Delete images which are created by the pool and no longer referred
+
+        With `reaper`, images are deleted after the VMs and volumes queued in it.
+        """
+        for key, (image, refs, created) in list(self.images.items()):
+            if created and not refs:
+                name = image['metadata']['name']
+                if reaper:
+                    reaper.submit("image", f"image {name}", self._delete, name)
+                else:
+                    self.api_client.images.delete(name, self.namespace)
+                del self.images[key]
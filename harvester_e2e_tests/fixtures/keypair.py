@@ -31,9 +31,18 @@ pytest_plugins = [
     'harvester_e2e_tests.fixtures.api_endpoints',
     'harvester_e2e_tests.fixtures.api_version',
     'harvester_e2e_tests.fixtures.session',
+    'harvester_e2e_tests.fixtures.api_client',
 ]
 
 
+def _private_key_path(request, keypair_name, spec_hash):
+    """ Path of the private key of the reused keypair, None without the pytest cache """
+    cache = getattr(request.config, 'cache', None)
+    if cache is None:
+        return None
+    return cache.mkdir('reused-keypairs') / f'{spec_hash}-{keypair_name}.pem'
+
+
 def _generate_ssh_keypair():
     private_key = rsa.generate_private_key(
         public_exponent=65537,
@@ -82,9 +91,30 @@ def keypair_request_json():
 
 @pytest.fixture(scope='class')
 def keypair(request, harvester_api_version, admin_session,
-            harvester_api_endpoints, keypair_request_json):
+            harvester_api_endpoints, keypair_request_json, reusable_resources):
+    resp = admin_session.get(harvester_api_endpoints.create_keypair)
+    assert resp.status_code == 200, 'Unable to list keypairs: %s' % (resp.content)
+    spec_hash = reusable_resources.spec_hash('KeyPair', fixture='keypair')
+
+    # NOTE: private keys are kept on the client only, keypairs created by other
+    # clients could not be used and another one is created instead
+    def has_private_key(item):
+        path = _private_key_path(request, item['metadata']['name'], spec_hash)
+        return path is not None and path.exists()
+
+    items = [item for item in resp.json()['items'] if has_private_key(item)]
+    keypair_data = reusable_resources.adopt(items, 'KeyPair', fixture='keypair')
+    if keypair_data:
+        keypair_data['spec']['privateKey'] = _private_key_path(
+            request, keypair_data['metadata']['name'], spec_hash).read_text()
+        yield keypair_data
+        return
+
+    labels = reusable_resources.labels('KeyPair', fixture='keypair')
+    if labels:
+        keypair_request_json[0]['metadata'].update(labels=labels)
     resp = admin_session.post(harvester_api_endpoints.create_keypair,
-                              json=keypair_request_json[0])
+                              json=utils.stamp_test_labels(request, keypair_request_json[0]))
     assert resp.status_code == 201, 'Unable to create keypair'
     keypair_data = resp.json()
     assert keypair_data['spec']['publicKey'] == \
@@ -95,8 +125,13 @@ def keypair(request, harvester_api_version, admin_session,
     # have access to it, just in case they want to also test SSH into
     # the VM. This is not a security concern as this is for test only.
     keypair_data['spec']['privateKey'] = keypair_request_json[1]
+    key_path = _private_key_path(request, keypair_data['metadata']['name'], spec_hash)
+    if labels and key_path:
+        # the next run adopting the keypair needs the private key as well
+        key_path.touch(mode=0o600)
+        key_path.write_text(keypair_request_json[1])
     yield keypair_data
-    if not request.config.getoption('--do-not-cleanup'):
+    if not reusable_resources.keep(request):
         resp = admin_session.delete(
             harvester_api_endpoints.delete_keypair % (
                 keypair_data['metadata']['name']))
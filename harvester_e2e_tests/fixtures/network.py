@@ -30,12 +30,14 @@ pytest_plugins = [
 
 
 @pytest.fixture(scope='session')
-def enable_vlan(request, admin_session, harvester_api_endpoints, api_client):
+def enable_vlan(request, admin_session, harvester_api_endpoints, api_client,
+                reusable_resources):
     vlan_nic = request.config.getoption('--vlan-nic')
 
     if api_client.cluster_version > parse_version("v1.0.3"):
-        yield cluster_network(api_client, vlan_nic)
-        if not request.config.getoption('--do-not-cleanup'):
+        labels = reusable_resources.labels("ClusterNetwork", nic=vlan_nic)
+        yield cluster_network(api_client, vlan_nic, labels=labels)
+        if not reusable_resources.keep(request):
             cluster_network(api_client, vlan_nic, delete=True)
         return
 
@@ -100,7 +102,8 @@ def _lookup_network(request, admin_session, harvester_api_endpoints, vlan_id):
     return None
 
 
-def _create_network(request, admin_session, harvester_api_endpoints, vlan_id, api_client):
+def _create_network(request, admin_session, harvester_api_endpoints, vlan_id, api_client,
+                    labels=None):
     # NOTE(gyee): will name the network with the following convention as
     # VLAN ID must be unique. vlan_network_<VLAN ID>
     network_name = f'vlan-network-{vlan_id}'
@@ -113,7 +116,8 @@ def _create_network(request, admin_session, harvester_api_endpoints, vlan_id, ap
 
     if api_client.cluster_version > parse_version("v1.0.3"):
         vlan_nic = request.config.getoption('--vlan-nic')
-        _, data = api_client.networks.create(network_name, vlan_id, cluster_network=vlan_nic)
+        _, data = api_client.networks.create(network_name, vlan_id, cluster_network=vlan_nic,
+                                             labels=labels)
         data['id'] = data['metadata']['name']
         return data
 
@@ -133,17 +137,21 @@ def _create_network(request, admin_session, harvester_api_endpoints, vlan_id, ap
 
 
 @pytest.fixture(scope='session')
-def network(request, admin_session, harvester_api_endpoints, enable_vlan, api_client):
+def network(request, admin_session, harvester_api_endpoints, enable_vlan, api_client,
+            reusable_resources):
     vlan_id = request.config.getoption('--vlan-id')
     # don't create network if VLAN is not correctly specified
     if vlan_id == -1:
         return
 
+    # network with the same VLAN ID is always adopted, see `_create_network`
+    labels = reusable_resources.labels("VLAN", vlan_id=vlan_id,
+                                       nic=request.config.getoption('--vlan-nic'))
     network_data = _create_network(request, admin_session,
-                                   harvester_api_endpoints, vlan_id, api_client)
+                                   harvester_api_endpoints, vlan_id, api_client, labels)
     yield network_data
 
-    if not request.config.getoption('--do-not-cleanup'):
+    if not reusable_resources.keep(request):
         # XXX: we would need to check the network not be deleted terraform yet
         if not utils.is_marker_enabled(request, 'terraform') and \
             _lookup_network(request, admin_session, harvester_api_endpoints,
@@ -234,10 +242,10 @@ def network_using_terraform(request, admin_session,
             'harvester_network.' + network_json['metadata']['name'])
 
 
-def cluster_network(api_client, nic_name, delete=False):
+def cluster_network(api_client, nic_name, delete=False, labels=None):
     if delete:
         api_client.clusternetworks.delete_config(nic_name)
         api_client.clusternetworks.delete(nic_name)
     else:
-        api_client.clusternetworks.create(nic_name)
+        api_client.clusternetworks.create(nic_name, labels=labels)
         api_client.clusternetworks.create_config(nic_name, nic_name, nic_name)
@@ -4,12 +4,16 @@ from rancher_api import RancherAPI
 
 
 @pytest.fixture(scope="session")
-def rancher_api_client(request):
+def rancher_api_client(request, api_metrics, api_cassette):
     endpoint = request.config.getoption("--rancher-endpoint")
     password = request.config.getoption("--rancher-admin-password")
     ssl_verify = request.config.getoption("--ssl_verify", False)
 
     api = RancherAPI(endpoint)
+    if api_metrics:
+        api.enable_metrics(api_metrics)
+    if api_cassette:
+        api.enable_cassette(api_cassette)
     api.authenticate("admin", password, verify=ssl_verify)
 
     api.session.verify = ssl_verify
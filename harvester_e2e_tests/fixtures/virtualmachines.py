@@ -1,13 +1,31 @@
+import threading
+import warnings
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from io import StringIO
+from itertools import count
+from time import sleep
 
 import pytest
-from paramiko import SSHClient, RSAKey, MissingHostKeyPolicy
+import yaml
+from harvester_api.managers import DEFAULT_NAMESPACE
+from paramiko import RSAKey
+from paramiko.ssh_exception import ChannelException, SSHException
+from requests.exceptions import RequestException
+
+from harvester_e2e_tests.fixtures.api_client import load_private_key
+
+pytest_plugins = [
+    "harvester_e2e_tests.fixtures.api_client",
+    "harvester_e2e_tests.fixtures.images"
+]
 
 
 @pytest.fixture(scope="session")
-def vm_shell():
+def vm_shell(ssh_pool):
     class VMShell:
-        _client = _jump = None
+        _client = _jump = _addr = None
 
         def __init__(self, username, password=None, pkey=None):
             self.username = username
@@ -32,31 +50,373 @@ def vm_shell():
 
         def connect(self, ipaddr, port=22, jumphost=None, **kwargs):
             if not self.client:
-                if jumphost:
-                    tp = jumphost.get_transport()
-                    ch = tp.open_channel('direct-tcpip', (ipaddr, port), tp.sock.getpeername())
-                else:
-                    ch = None
-
-                pkey = RSAKey.from_private_key(StringIO(self.pkey)) if self.pkey else None
-
-                cli = SSHClient()
-                cli.set_missing_host_key_policy(MissingHostKeyPolicy())
-                kws = dict(username=self.username, password=self.password, pkey=pkey, sock=ch)
+                pkey = load_private_key(self.pkey) if self.pkey else None
+                kws = dict(password=self.password, pkey=pkey)
                 kws.update(kwargs)
-                cli.connect(ipaddr, port, **kws)
-
-                self._client = cli
+                self._client = ssh_pool.connect(ipaddr, port, self.username, jumphost, **kws)
+                self._addr = (ipaddr, port, jumphost, kwargs)
 
             return self
 
         def close(self):
-            if self.client and self.client.get_transport():
-                self.client.close()
-                self._client = None
+            # connection is kept in the pool for the next login
+            self._client = None
 
         def exec_command(self, command, bufsize=-1, timeout=None, get_pty=False, env=None):
-            _, out, err = self.client.exec_command(command, bufsize, timeout, get_pty, env)
+            try:
+                _, out, err = self.client.exec_command(command, bufsize, timeout, get_pty, env)
+            except (SSHException, EOFError) as e:
+                if ssh_pool.is_alive(self.client):
+                    raise e
+                # the pooled connection is broken, retry with a new one
+                ipaddr, port, jumphost, kwargs = self._addr
+                ssh_pool.discard(self.client)
+                self._client = None
+                self.connect(ipaddr, port, jumphost, **kwargs)
+                _, out, err = self.client.exec_command(command, bufsize, timeout, get_pty, env)
             return out.read().decode(), err.read().decode()
 
     return VMShell
+
+
+@pytest.fixture(scope="session")
+def vm_checker(api_client, wait_timeout, sleep_timeout):
+    return VMChecker(api_client.vms, wait_timeout, sleep_timeout)
+
+
+@pytest.fixture(scope="session")
+def vm_pool(request, api_client, image_pool, image_opensuse, host_shell, vm_shell, wait_timeout):
+    image = image_pool.acquire(image_opensuse.url, display_name=image_opensuse.name)
+    pool = VMPool(api_client, image, image_opensuse.ssh_user, host_shell, vm_shell, wait_timeout)
+    pool.warm(request.config.getoption("--vm-pool-size"))
+
+    yield pool
+
+    if not request.config.getoption('--do-not-cleanup'):
+        pool.cleanup()
+    image_pool.release(image)
+    if pool.errors:
+        warnings.warn(pytest.PytestWarning(
+            f"{len(pool.errors)} errors in VM pool {pool.prefix}:\n"
+            + "\n".join(f"  {e!r}" for e in pool.errors)
+        ))
+
+
+@pytest.fixture(scope="class")
+def pooled_vm(vm_pool):
+    """ A running and SSH-ready VM checked out from `vm_pool`, reset after the class """
+    vm = vm_pool.checkout()
+    yield vm
+    vm_pool.checkin(vm)
+
+
+class PooledVM:
+    def __init__(self, name, namespace, ssh_user, pri_key):
+        self.name = name
+        self.namespace = namespace
+        self.ssh_user = ssh_user
+        self.pri_key = pri_key
+        self.snapshot = None
+        self.volumes = ()  # claims of the snapshot, restoring keeps them
+        self.restored = ()  # claims created by the last restore
+        self.vm_ip = self.host_ip = None
+
+    def __repr__(self):
+        return f"{__class__.__name__}({self.name!r}, vm_ip={self.vm_ip!r})"
+
+
+class VMPool:
+    """ Pre-booted VMs which tests check out and return
+
+    A VM is snapshotted once it is SSH-ready, returned VMs are restored from
+    the snapshot in background instead of being deleted and created again, so
+    checking out skips the image cloning, the cold boot and cloud-init.
+    """
+
+    def __init__(self, api_client, image, ssh_user, host_shell, vm_shell, wait_timeout,
+                 namespace=DEFAULT_NAMESPACE, cpu=1, memory=2, max_workers=4):
+        self.api_client = api_client
+        self.image_id = f"{image['metadata']['namespace']}/{image['metadata']['name']}"
+        self.ssh_user = ssh_user
+        # `host_shell` is shared with tests, log in by our own one
+        self.host_shell = type(host_shell)(host_shell.username, host_shell.password,
+                                           host_shell.pkey)
+        self.vm_shell = vm_shell
+        self.wait_timeout = wait_timeout
+        self.namespace = namespace
+        self.cpu, self.memory = cpu, memory
+
+        key = RSAKey.generate(2048)
+        self.pub_key = f"{key.get_name()} {key.get_base64()}"
+        buf = StringIO()
+        key.write_private_key(buf)
+        self.pri_key = buf.getvalue()
+
+        self.prefix = f"pool-{datetime.now().strftime('%m%d%H%M%S')}"
+        self.vms = []
+        self.errors = []
+        self._ids = count()
+        self._idle = deque()  # futures of VMs which are ready or being reset
+        self._lock = threading.Lock()
+        self._ssh_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="vm-pool")
+
+    def __repr__(self):
+        return f"{__class__.__name__}({self.prefix!r}, vms={len(self.vms)})"
+
+    def _claims(self, vm):
+        code, data = self.api_client.vms.get(vm.name, vm.namespace)
+        if 200 != code:
+            return []
+        volumes = data['spec']['template']['spec']['volumes']
+        return [v['persistentVolumeClaim']['claimName'] for v in volumes
+                if 'persistentVolumeClaim' in v]
+
+    def _wait_vmi(self, vm, running=True):
+        endtime = datetime.now() + timedelta(seconds=self.wait_timeout)
+        while endtime > datetime.now():
+            code, data = self.api_client.vms.get_status(vm.name, vm.namespace)
+            if not running and 404 == code:
+                return data
+            if running and 200 == code:
+                phase = data.get('status', {}).get('phase')
+                conds = data.get('status', {}).get('conditions', [{}])
+                if ("Running" == phase
+                   and "AgentConnected" == conds[-1].get('type')
+                   and data['status'].get('interfaces')):
+                    return data
+            sleep(3)
+        raise AssertionError(
+            f"Failed to {'Start' if running else 'Stop'} VM({vm.name}) with errors:\n"
+            f"Status({code}): {data}"
+        )
+
+    def _wait_ready(self, vm):
+        data = self._wait_vmi(vm)
+        vm.vm_ip = next(iface['ipAddress'] for iface in data['status']['interfaces']
+                        if iface['name'] == 'default')
+        code, data = self.api_client.hosts.get(data['status']['nodeName'])
+        vm.host_ip = next(addr['address'] for addr in data['status']['addresses']
+                          if addr['type'] == 'InternalIP')
+
+        # jumphost login rewrites sshd_config of the host, one at a time
+        with self._ssh_lock, self.host_shell.login(vm.host_ip, jumphost=True) as h:
+            vm_sh = self.vm_shell(vm.ssh_user, pkey=vm.pri_key)
+            endtime = datetime.now() + timedelta(seconds=self.wait_timeout)
+            while endtime > datetime.now():
+                try:
+                    vm_sh.connect(vm.vm_ip, jumphost=h.client)
+                except ChannelException as e:
+                    login_ex = e
+                    sleep(3)
+                else:
+                    break
+            else:
+                raise AssertionError(f"Unable to login to VM {vm.name}") from login_ex
+
+            with vm_sh as sh:
+                endtime = datetime.now() + timedelta(seconds=self.wait_timeout)
+                while endtime > datetime.now():
+                    out, err = sh.exec_command('cloud-init status')
+                    if 'done' in out:
+                        break
+                    sleep(3)
+                else:
+                    raise AssertionError(
+                        f"VM {vm.name} Started {self.wait_timeout} seconds"
+                        f", but cloud-init still in {out}"
+                    )
+        return vm
+
+    def _boot(self, name):
+        vm = PooledVM(name, self.namespace, self.ssh_user, self.pri_key)
+        with self._lock:
+            self.vms.append(vm)
+
+        vm_spec = self.api_client.vms.Spec(self.cpu, self.memory)
+        vm_spec.add_image("disk-0", self.image_id)
+        userdata = yaml.safe_load(vm_spec.user_data)
+        userdata['ssh_authorized_keys'] = [self.pub_key]
+        vm_spec.user_data = yaml.dump(userdata)
+        code, data = self.api_client.vms.create(name, vm_spec, self.namespace)
+        assert 201 == code, (code, data)
+        self._wait_ready(vm)
+
+        snapshot = f"{name}-ready"
+        code, data = self.api_client.vm_snapshots.create(name, snapshot, self.namespace)
+        assert 201 == code, (code, data)
+        endtime = datetime.now() + timedelta(seconds=self.wait_timeout)
+        while endtime > datetime.now():
+            code, data = self.api_client.vm_snapshots.get(snapshot, self.namespace)
+            if 200 == code and data.get('status', {}).get('readyToUse'):
+                break
+            sleep(3)
+        else:
+            raise AssertionError(f"Snapshot {snapshot} of VM {name} is not ready: {data}")
+        vm.snapshot, vm.volumes = snapshot, tuple(self._claims(vm))
+        return vm
+
+    def _reset(self, vm):
+        previous = set(vm.restored)
+        code, data = self.api_client.vms.stop(vm.name, vm.namespace)
+        assert 204 == code, (code, data)
+        self._wait_vmi(vm, running=False)
+
+        spec = self.api_client.vm_snapshots.RestoreSpec.for_existing()
+        code, data = self.api_client.vm_snapshots.restore(vm.snapshot, spec, vm.namespace)
+        assert 201 == code, (code, data)
+        # VM is started by Harvester once restored
+        self._wait_ready(vm)
+
+        # volumes of the snapshot are retained, copies of the previous restore are replaced,
+        # volumes attached by tests are not ours to delete
+        vm.restored = tuple(set(self._claims(vm)) - set(vm.volumes))
+        for claim in previous - set(vm.restored):
+            self.api_client.volumes.delete(claim, vm.namespace)
+        return vm
+
+    def warm(self, size):
+        """ Boot VMs in background, so the first `size` checkouts are not waiting for them """
+        with self._lock:
+            for _ in range(size):
+                name = f"{self.prefix}-{next(self._ids)}"
+                self._idle.append(self._executor.submit(self._boot, name))
+
+    def checkout(self):
+        """ Returns a running and SSH-ready `PooledVM` """
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                # prefer the one which is ready already
+                future = next((f for f in self._idle if f.done()), self._idle[0])
+                self._idle.remove(future)
+            try:
+                return future.result()
+            except Exception as e:  # broken VM is left for cleanup, try next
+                self.errors.append(e)
+
+        with self._lock:
+            name = f"{self.prefix}-{next(self._ids)}"
+        return self._boot(name)
+
+    def checkin(self, vm):
+        """ Reset the VM to the snapshot in background, then it's ready for next checkout """
+        with self._lock:
+            self._idle.append(self._executor.submit(self._reset, vm))
+
+    def cleanup(self):
+        self._executor.shutdown(wait=True)
+        # failed resets of VMs which are not checked out again
+        self.errors.extend(f.exception() for f in self._idle if f.exception())
+        for vm in self.vms:
+            # VMs failed to boot are never checked out, all of their claims are ours
+            claims = (set(vm.volumes) | set(vm.restored) if vm.snapshot
+                      else set(self._claims(vm)))
+            self.api_client.vms.delete(vm.name, vm.namespace)
+            try:
+                self._wait_vmi(vm, running=False)
+            except AssertionError as e:
+                self.errors.append(e)
+            if vm.snapshot:
+                self.api_client.vm_snapshots.delete(vm.snapshot, vm.namespace)
+            for claim in claims:
+                self.api_client.volumes.delete(claim, vm.namespace)
+
+
+class VMChecker:
+    """ Wait for VM readiness by the VMI status and the QEMU guest agent
+
+    The VMI is watched (or polled with `snooze` if the watch is unavailable),
+    which is far cheaper than retrying SSH connections until one succeeds.
+    VMs created by the tests install and start `qemu-guest-agent` in cloud-init's
+    `runcmd`, so the agent being connected implies cloud-init has been run and
+    the VM is ready to login.
+
+    Methods return `(ok, vmi)`, where `vmi` is the last status seen.
+    """
+
+    def __init__(self, vm_api, wait_timeout, snooze=3, watch=True):
+        self.vms = vm_api
+        self.wait_timeout = wait_timeout
+        self.snooze = snooze
+        self.watch = watch
+
+    def __repr__(self):
+        return f"{__class__.__name__}(wait_timeout={self.wait_timeout}, watch={self.watch})"
+
+    @staticmethod
+    def is_running(vmi):
+        status = (vmi or {}).get('status', {})
+        return "Running" == status.get('phase') and bool(status.get('nodeName'))
+
+    @staticmethod
+    def ip_addresses(vmi, nics=("default",)):
+        """ Returns {nic: ip} of `nics`, empty if any of them has no IP assigned """
+        ifaces = {iface.get('name'): iface.get('ipAddress')
+                  for iface in (vmi or {}).get('status', {}).get('interfaces', [])}
+        ips = {nic: ifaces.get(nic) for nic in nics}
+        return ips if all(ips.values()) else dict()
+
+    @staticmethod
+    def agent_connected(vmi):
+        conds = (vmi or {}).get('status', {}).get('conditions', [])
+        return any("AgentConnected" == c.get('type') and "True" == c.get('status')
+                   for c in conds)
+
+    def wait_status(self, name, namespace=DEFAULT_NAMESPACE, check=None, timeout=None):
+        """ Wait until `check(vmi)` is truthy, the VMI is `None` if it does not exist """
+        timeout = timeout or self.wait_timeout
+        endtime = datetime.now() + timedelta(seconds=timeout)
+
+        def get():
+            code, data = self.vms.get_status(name, namespace)
+            return data if 200 == code else None
+
+        # the watch yields nothing until the VMI is created
+        vmi = get()
+        if check(vmi):
+            return True, vmi
+        if self.watch:
+            # poll for the rest of the time if the watch is unavailable or closed early
+            try:
+                for vmi in self.vms.watch_status(name, namespace, timeout=timeout):
+                    if check(vmi):
+                        return True, vmi
+                    if endtime < datetime.now():
+                        break
+            except (ConnectionError, RequestException, ValueError):
+                # not established, dropped or idle stream, or a truncated event
+                pass
+
+        while endtime > datetime.now():
+            vmi = get()
+            if check(vmi):
+                return True, vmi
+            sleep(self.snooze)
+        return False, vmi
+
+    def wait_stopped(self, name, namespace=DEFAULT_NAMESPACE, timeout=None):
+        return self.wait_status(name, namespace, lambda vmi: vmi is None, timeout)
+
+    def wait_running(self, name, namespace=DEFAULT_NAMESPACE, timeout=None):
+        return self.wait_status(name, namespace, self.is_running, timeout)
+
+    def wait_ip_addresses(self, name, nics=("default",), namespace=DEFAULT_NAMESPACE,
+                          timeout=None):
+        return self.wait_status(
+            name, namespace, lambda vmi: self.is_running(vmi) and self.ip_addresses(vmi, nics),
+            timeout
+        )
+
+    def wait_agent_connected(self, name, nics=("default",), namespace=DEFAULT_NAMESPACE,
+                             timeout=None):
+        """ Wait until the VM is running with IPs of `nics` and the guest agent responds """
+        def check(vmi):
+            if not (self.is_running(vmi) and self.agent_connected(vmi)
+                    and self.ip_addresses(vmi, nics)):
+                return False
+            code, _ = self.vms.guestosinfo(name, namespace)
+            return 200 == code
+
+        return self.wait_status(name, namespace, check, timeout)
@@ -20,6 +20,7 @@ import pytest
 
 
 pytest_plugins = [
+    'harvester_e2e_tests.fixtures.api_client',
     'harvester_e2e_tests.fixtures.image',
     'harvester_e2e_tests.fixtures.keypair',
     'harvester_e2e_tests.fixtures.network',
@@ -99,7 +100,7 @@ runcmd:
 @pytest.fixture(scope='class')
 def basic_vm(request, admin_session, image, keypair,
              user_data_with_guest_agent, network_data,
-             harvester_api_endpoints):
+             harvester_api_endpoints, reaper):
     vm_json = utils.create_vm(request, admin_session, image,
                               harvester_api_endpoints,
                               keypair=keypair,
@@ -110,13 +111,13 @@ def basic_vm(request, admin_session, image, keypair,
         resp = admin_session.get(
             harvester_api_endpoints.get_vm % (vm_json['metadata']['name']))
         if resp.status_code != 404:
-            utils.delete_vm(request, admin_session, harvester_api_endpoints,
-                            vm_json)
+            reaper.submit('vm', f"VM {vm_json['metadata']['name']}", utils.delete_vm,
+                          request, admin_session, harvester_api_endpoints, vm_json)
 
 
 @pytest.fixture(scope='class')
 def basic_vm_no_user_data(request, admin_session, image, keypair,
-                          network_data, harvester_api_endpoints):
+                          network_data, harvester_api_endpoints, reaper):
     vm_json = utils.create_vm(request, admin_session, image,
                               harvester_api_endpoints,
                               keypair=keypair,
@@ -126,14 +127,14 @@ def basic_vm_no_user_data(request, admin_session, image, keypair,
         resp = admin_session.get(
             harvester_api_endpoints.get_vm % (vm_json['metadata']['name']))
         if resp.status_code != 404:
-            utils.delete_vm(request, admin_session, harvester_api_endpoints,
-                            vm_json)
+            reaper.submit('vm', f"VM {vm_json['metadata']['name']}", utils.delete_vm,
+                          request, admin_session, harvester_api_endpoints, vm_json)
 
 
 @pytest.fixture(scope='class')
 def basic_vm_nousb(request, admin_session, image, keypair,
                    user_data_with_guest_agent, network_data,
-                   harvester_api_endpoints):
+                   harvester_api_endpoints, reaper):
     vm_json = utils.create_vm(request, admin_session, image,
                               harvester_api_endpoints,
                               keypair=keypair,
@@ -145,14 +146,14 @@ def basic_vm_nousb(request, admin_session, image, keypair,
         resp = admin_session.get(
             harvester_api_endpoints.get_vm % (vm_json['metadata']['name']))
         if resp.status_code != 404:
-            utils.delete_vm(request, admin_session, harvester_api_endpoints,
-                            vm_json)
+            reaper.submit('vm', f"VM {vm_json['metadata']['name']}", utils.delete_vm,
+                          request, admin_session, harvester_api_endpoints, vm_json)
 
 
 @pytest.fixture(scope='class')
 def vm_with_one_vlan(request, admin_session, image, keypair,
                      user_data_with_guest_agent, network_data,
-                     harvester_api_endpoints, network):
+                     harvester_api_endpoints, network, reaper):
     vm_json = utils.create_vm(request, admin_session, image,
                               harvester_api_endpoints,
                               keypair=keypair,
@@ -165,14 +166,14 @@ def vm_with_one_vlan(request, admin_session, image, keypair,
         resp = admin_session.get(
             harvester_api_endpoints.get_vm % (vm_json['metadata']['name']))
         if resp.status_code != 404:
-            utils.delete_vm(request, admin_session, harvester_api_endpoints,
-                            vm_json)
+            reaper.submit('vm', f"VM {vm_json['metadata']['name']}", utils.delete_vm,
+                          request, admin_session, harvester_api_endpoints, vm_json)
 
 
 @pytest.fixture(scope='class')
 def vm_with_one_bogus_vlan(request, admin_session, image, keypair,
                            user_data_with_guest_agent, network_data,
-                           harvester_api_endpoints, bogus_network):
+                           harvester_api_endpoints, bogus_network, reaper):
     vm_json = utils.create_vm(request, admin_session, image,
                               harvester_api_endpoints,
                               keypair=keypair,
@@ -185,14 +186,14 @@ def vm_with_one_bogus_vlan(request, admin_session, image, keypair,
         resp = admin_session.get(
             harvester_api_endpoints.get_vm % (vm_json['metadata']['name']))
         if resp.status_code != 404:
-            utils.delete_vm(request, admin_session, harvester_api_endpoints,
-                            vm_json)
+            reaper.submit('vm', f"VM {vm_json['metadata']['name']}", utils.delete_vm,
+                          request, admin_session, harvester_api_endpoints, vm_json)
 
 
 @pytest.fixture(scope='class')
 def vms_with_same_vlan(request, admin_session, image, keypair,
                        user_data_with_guest_agent, network_data,
-                       harvester_api_endpoints, network):
+                       harvester_api_endpoints, network, reaper):
     vms = []
     for i in range(2):
         vms.append(utils.create_vm(request, admin_session, image,
@@ -205,14 +206,14 @@ def vms_with_same_vlan(request, admin_session, image, keypair,
     yield vms
     if not request.config.getoption('--do-not-cleanup'):
         for vm_json in vms:
-            utils.delete_vm(request, admin_session, harvester_api_endpoints,
-                            vm_json)
+            reaper.submit('vm', f"VM {vm_json['metadata']['name']}", utils.delete_vm,
+                          request, admin_session, harvester_api_endpoints, vm_json)
 
 
 @pytest.fixture(scope='class')
 def vms_with_vlan_as_default_network(request, admin_session, image, keypair,
                                      user_data_with_guest_agent, network_data,
-                                     harvester_api_endpoints, network):
+                                     harvester_api_endpoints, network, reaper):
     vm_json = utils.create_vm(request, admin_session, image,
                               harvester_api_endpoints,
                               keypair=keypair,
@@ -222,8 +223,8 @@ def vms_with_vlan_as_default_network(request, admin_session, image, keypair,
                               user_data=user_data_with_guest_agent)
     yield vm_json
     if not request.config.getoption('--do-not-cleanup'):
-        utils.delete_vm(request, admin_session, harvester_api_endpoints,
-                        vm_json)
+        reaper.submit('vm', f"VM {vm_json['metadata']['name']}", utils.delete_vm,
+                      request, admin_session, harvester_api_endpoints, vm_json)
 
 
 @pytest.fixture(scope='class')
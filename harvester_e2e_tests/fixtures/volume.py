@@ -23,31 +23,33 @@ pytest_plugins = [
     'harvester_e2e_tests.fixtures.api_endpoints',
     'harvester_e2e_tests.fixtures.api_version',
     'harvester_e2e_tests.fixtures.session',
+    'harvester_e2e_tests.fixtures.api_client',
 ]
 
 
 @pytest.fixture(scope='class')
 def volume(request, kubevirt_api_version, admin_session,
-           harvester_api_endpoints):
+           harvester_api_endpoints, reaper):
     request_json = utils.get_json_object_from_template(
         'basic_volume',
         size=8,
         description='Test volume'
     )
     resp = admin_session.post(harvester_api_endpoints.create_volume,
-                              json=request_json)
+                              json=utils.stamp_test_labels(request, request_json))
     assert resp.status_code == 201, 'Unable to create a blank volume: %s' % (
         resp.content)
     volume_data = resp.json()
     yield volume_data
     if not request.config.getoption('--do-not-cleanup'):
-        utils.delete_volume(request, admin_session,
-                            harvester_api_endpoints, volume_data)
+        reaper.submit('volume', f"volume {volume_data['metadata']['name']}",
+                      utils.delete_volume, request, admin_session,
+                      harvester_api_endpoints, volume_data)
 
 
 @pytest.fixture(scope='class')
 def volume_image_form(request, kubevirt_api_version, admin_session,
-                      harvester_api_endpoints, image):
+                      harvester_api_endpoints, image, reaper):
     request_json = utils.get_json_object_from_template(
         'basic_volume',
         size=8,
@@ -58,20 +60,21 @@ def volume_image_form(request, kubevirt_api_version, admin_session,
     request_json['metadata']['annotations'][
         'harvesterhci.io/imageId'] = imageid
     resp = admin_session.post(harvester_api_endpoints.create_volume,
-                              json=request_json)
+                              json=utils.stamp_test_labels(request, request_json))
     assert resp.status_code == 201, 'Unable to create a blank volume'
     volume_data = resp.json()
     assert volume_data['metadata']['annotations'].get(
         'harvesterhci.io/imageId') == imageid
     yield volume_data
     if not request.config.getoption('--do-not-cleanup'):
-        utils.delete_volume(request, admin_session,
-                            harvester_api_endpoints, volume_data)
+        reaper.submit('volume', f"volume {volume_data['metadata']['name']}",
+                      utils.delete_volume, request, admin_session,
+                      harvester_api_endpoints, volume_data)
 
 
 @pytest.fixture(scope='class')
 def volume_with_image(request, kubevirt_api_version, admin_session,
-                      harvester_api_endpoints, image):
+                      harvester_api_endpoints, image, reaper):
     request_json = utils.get_json_object_from_template(
         'basic_volume',
         size=8,
@@ -85,7 +88,7 @@ def volume_with_image(request, kubevirt_api_version, admin_session,
         'test.harvesterhci.io': 'for-test'
     }
     resp = admin_session.post(harvester_api_endpoints.create_volume,
-                              json=request_json)
+                              json=utils.stamp_test_labels(request, request_json))
     assert resp.status_code == 201, 'Unable to create a blank volume'
     volume_data = resp.json()
     assert volume_data['metadata']['annotations'].get(
@@ -94,8 +97,9 @@ def volume_with_image(request, kubevirt_api_version, admin_session,
         'test.harvesterhci.io') == 'for-test'
     yield volume_data
     if not request.config.getoption('--do-not-cleanup'):
-        utils.delete_volume(request, admin_session,
-                            harvester_api_endpoints, volume_data)
+        reaper.submit('volume', f"volume {volume_data['metadata']['name']}",
+                      utils.delete_volume, request, admin_session,
+                      harvester_api_endpoints, volume_data)
 
 
 @pytest.fixture(scope='class')
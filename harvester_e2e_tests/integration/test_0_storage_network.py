@@ -13,7 +13,7 @@ pytest_plugins = [
 
 
 @pytest.fixture(scope='module')
-def cluster_network(request, api_client, unique_name):
+def cluster_network(request, api_client, unique_name, reusable_resources):
     vlan_nic = request.config.getoption('--vlan-nic')
     assert vlan_nic, f"VLAN NIC {vlan_nic} not configured correctly."
 
@@ -46,7 +46,8 @@ def cluster_network(request, api_client, unique_name):
     # Create cluster network
     cnet = f"cnet-{datetime.strptime(unique_name, '%Hh%Mm%Ss%f-%m-%d').strftime('%H%M%S')}"
     created = []
-    code, data = api_client.clusternetworks.create(cnet)
+    labels = reusable_resources.labels("ClusterNetwork", nic=vlan_nic, nodes=sorted(all_nodes))
+    code, data = api_client.clusternetworks.create(cnet, labels=labels)
     assert 201 == code, (code, data)
     while all_nodes:
         node = all_nodes.pop()
@@ -60,7 +61,9 @@ def cluster_network(request, api_client, unique_name):
 
     yield cnet
 
-    # Teardown
+    # Teardown, the cluster network covering all nodes is adopted by next runs
+    if reusable_resources.enabled:
+        return
     deleted = {name: api_client.clusternetworks.delete_config(name) for name in created}
     failed = [(name, code, data) for name, (code, data) in deleted.items() if 200 != code]
     if failed:
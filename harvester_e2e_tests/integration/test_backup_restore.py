@@ -23,133 +23,20 @@ from paramiko.ssh_exception import ChannelException
 
 pytest_plugins = [
     'harvester_e2e_tests.fixtures.api_client',
+    'harvester_e2e_tests.fixtures.backuptarget',
     'harvester_e2e_tests.fixtures.images',
     'harvester_e2e_tests.fixtures.virtualmachines'
 ]
 
 
 @pytest.fixture(scope="module")
-def conflict_retries():
-    # This might be able to moved to config options in need.
-    return 5
+def image(image_pool, image_opensuse):
+    data = image_pool.acquire(image_opensuse.url, display_name=image_opensuse.name)
 
-
-@pytest.fixture(scope="module")
-def image(api_client, unique_name, wait_timeout, image_opensuse):
-    unique_image_id = f'image-{unique_name}'
-    code, data = api_client.images.create_by_url(
-        unique_image_id, image_opensuse.url, display_name=f"{unique_name}-{image_opensuse.name}"
-    )
-
-    assert 201 == code, (code, data)
-
-    endtime = datetime.now() + timedelta(seconds=wait_timeout)
-    while endtime > datetime.now():
-        code, data = api_client.images.get(unique_image_id)
-        if 100 == data.get('status', {}).get('progress', 0):
-            break
-        sleep(3)
-    else:
-        raise AssertionError(
-            "Failed to create Image with error:\n"
-            f"Status({code}): {data}"
-        )
-
-    yield dict(id=f"{data['metadata']['namespace']}/{unique_image_id}",
+    yield dict(id=f"{data['metadata']['namespace']}/{data['metadata']['name']}",
                user=image_opensuse.ssh_user)
 
-    code, data = api_client.images.delete(unique_image_id)
-
-
-@pytest.fixture(scope='module')
-def NFS_config(request):
-    nfs_endpoint = request.config.getoption('--nfs-endpoint')
-
-    assert nfs_endpoint, f"NFS endpoint not configured: {nfs_endpoint}"
-    assert nfs_endpoint.startswith("nfs://"), (
-        f"NFS endpoint should starts with `nfs://`, not {nfs_endpoint}"
-    )
-
-    return ("NFS", dict(endpoint=nfs_endpoint))
-
-
-@pytest.fixture(scope='module')
-def S3_config(request):
-    config = {
-        "bucket": request.config.getoption('--bucketName'),
-        "region": request.config.getoption('--region'),
-        "access_id": request.config.getoption('--accessKeyId'),
-        "access_secret": request.config.getoption('--secretAccessKey')
-    }
-
-    empty_options = ', '.join(k for k, v in config.items() if not v)
-    assert not empty_options, (
-        f"S3 configuration missing, `{empty_options}` should not be empty."
-    )
-
-    config['endpoint'] = request.config.getoption('--s3-endpoint')
-
-    return ("S3", config)
-
-
-@pytest.fixture(scope="class")
-def backup_config(request):
-    return request.getfixturevalue(f"{request.param}_config")
-
-
-@pytest.fixture(scope="class")
-def config_backup_target(api_client, conflict_retries, backup_config, wait_timeout):
-    backup_type, config = backup_config
-    code, data = api_client.settings.get('backup-target')
-    origin_spec = api_client.settings.BackupTargetSpec.from_dict(data)
-
-    spec = getattr(api_client.settings.BackupTargetSpec, backup_type)(**config)
-    # ???: when switching S3 -> NFS, update backup-target will easily hit resource conflict
-    # so we would need retries to apply the change.
-    for _ in range(conflict_retries):
-        code, data = api_client.settings.update('backup-target', spec)
-        if 409 == code and "Conflict" == data['reason']:
-            sleep(3)
-        else:
-            break
-    else:
-        raise AssertionError(
-            f"Unable to update backup-target after {conflict_retries} retried."
-            f"API Status({code}): {data}"
-        )
-    assert 200 == code, (
-        f'Failed to update backup target to {backup_type} with {config}\n'
-        f"API Status({code}): {data}"
-    )
-
-    yield spec
-
-    # restore to original backup-target and remove backups not belong to it
-    code, data = api_client.settings.update('backup-target', origin_spec)
-    code, data = api_client.backups.get()
-    assert 200 == code, "Failed to list backups"
-
-    check_names = []
-    for backup in data['data']:
-        endpoint = backup['status']['backupTarget'].get('endpoint')
-        if endpoint != origin_spec.value.get('endpoint'):
-            api_client.backups.delete(backup['metadata']['name'])
-            check_names.append(backup['metadata']['name'])
-
-    endtime = datetime.now() + timedelta(seconds=wait_timeout)
-    while endtime > datetime.now():
-        for name in check_names[:]:
-            code, data = api_client.backups.get(name)
-            if 404 == code:
-                check_names.remove(name)
-        if not check_names:
-            break
-        sleep(3)
-    else:
-        raise AssertionError(
-            f"Failed to delete backups: {check_names}\n"
-            f"Last API Status({code}): {data}"
-            )
+    image_pool.release(data)
 
 
 @pytest.fixture(scope="class")
@@ -76,18 +76,22 @@ def rke1_k8s_version(request, k8s_version, rancher_api_client):
 
 
 @pytest.fixture(scope='session')
-def vlan_network(request, api_client):
+def vlan_network(request, api_client, reusable_resources):
     vlan_nic = request.config.getoption('--vlan-nic')
     vlan_id = request.config.getoption('--vlan-id')
     assert -1 != vlan_id, "Rancher integration test needs VLAN"
 
-    api_client.clusternetworks.create(vlan_nic)
+    api_client.clusternetworks.create(
+        vlan_nic, labels=reusable_resources.labels("ClusterNetwork", nic=vlan_nic))
     api_client.clusternetworks.create_config(vlan_nic, vlan_nic, vlan_nic)
 
+    # network with the same name is always adopted
     network_name = f'vlan-network-{vlan_id}'
     code, data = api_client.networks.get(network_name)
     if code != 200:
-        code, data = api_client.networks.create(network_name, vlan_id, cluster_network=vlan_nic)
+        labels = reusable_resources.labels("VLAN", vlan_id=vlan_id, nic=vlan_nic)
+        code, data = api_client.networks.create(network_name, vlan_id, cluster_network=vlan_nic,
+                                                labels=labels)
         assert 201 == code, (
             f"Failed to create network-attachment-definition {network_name} \
                 with error {code}, {data}"
@@ -96,7 +100,8 @@ def vlan_network(request, api_client):
     data['id'] = data['metadata']['name']
     yield data
 
-    api_client.networks.delete(network_name)
+    if not reusable_resources.enabled:
+        api_client.networks.delete(network_name)
 
 
 @pytest.fixture(scope="session")
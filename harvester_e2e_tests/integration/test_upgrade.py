@@ -8,6 +8,7 @@ from datetime import datetime, timedelta
 import pytest
 
 from harvester_api.managers import DEFAULT_HARVESTER_NAMESPACE, DEFAULT_LONGHORN_NAMESPACE
+from harvester_e2e_tests.fixtures.virtualmachines import VMChecker
 from paramiko.ssh_exception import ChannelException, AuthenticationException, \
                                    NoValidConnectionsError
 
@@ -51,6 +52,7 @@ expected_harvester_crds = {
 
 pytest_plugins = [
     "harvester_e2e_tests.fixtures.api_client",
+    "harvester_e2e_tests.fixtures.images",
     "harvester_e2e_tests.fixtures.virtualmachines"
 ]
 
@@ -219,37 +221,6 @@ zQZtrR0mmtur3DnEm2bi4NKHAQHpW9Mu16GQjE1NbXqQtTB88jK76ctH934Cal6V
 """
 
 
-def _lookup_image(api_client, name):
-    code, data = api_client.images.get()
-    if code == 200:
-        for image in data['items']:
-            if image['metadata']['name'] == name:
-                return image
-    return None
-
-
-def _create_image(api_client, url, name, wait_timeout):
-    image_data = _lookup_image(api_client, name)
-    if image_data is None:
-        code, image_data = api_client.images.create_by_url(name, url)
-        assert code == 201, (
-            f"failed to create image: {image_data}")
-
-        endtime = datetime.now() + timedelta(seconds=wait_timeout)
-        while endtime > datetime.now():
-            code, data = api_client.images.get(name)
-            if 100 == data.get('status', {}).get('progress', 0):
-                break
-            sleep(3)
-        else:
-            raise AssertionError(
-                "Failed to create Image with error:\n"
-                f"Status({code}): {data}"
-            )
-
-    return image_data
-
-
 def _get_ip_from_vmi(vmi):
     assert _check_vm_ip_assigned(vmi), "virtual machine does not have ip assigned"
     return vmi['status']['interfaces'][0]['ipAddress']
@@ -265,23 +236,15 @@ def _check_vm_ip_assigned(vmi):
             vmi.get('status').get('interfaces')[0].get('ipAddress') is not None)
 
 
-def _check_assigned_ip_func(api_client, vm_name):
-    def _check_assigned_ip():
-        code, data = api_client.vms.get_status(vm_name)
-        if code != 200:
-            return False
-        return _check_vm_is_running(data) and _check_vm_ip_assigned(data)
-    return _check_assigned_ip
+def _wait_for_vm_ready(api_client, vm_name, timeout=300, replaced_uid=None):
+    # qemu-guest-agent is started by cloud-init, the VM is ready to login once it's connected
+    def _ready(vmi):
+        return (vmi and vmi['metadata']['uid'] != replaced_uid
+                and _check_vm_is_running(vmi) and vmi['status'].get('interfaces')
+                and _check_vm_ip_assigned(vmi) and VMChecker.agent_connected(vmi))
 
-
-def _wait_for_vm_ready(api_client, vm_name, timeout=300):
-    endtime = datetime.now() + timedelta(seconds=timeout)
-    while endtime > datetime.now():
-        if _check_assigned_ip_func(api_client, vm_name)():
-            break
-        sleep(5)
-    else:
-        raise AssertionError("Time out while waiting for vm to be created")
+    ready, vmi = VMChecker(api_client.vms, timeout).wait_status(vm_name, check=_ready)
+    assert ready, f"Time out while waiting for vm to be ready: {vmi}"
 
 
 def _wait_for_write_data(vm_shell, ip, ssh_user="ubuntu", timeout=300):
@@ -496,7 +459,7 @@ def cluster_prereq(request, cluster_state, prepare_dependence, unique_id, networ
 
 
 @pytest.fixture(scope='class')
-def ubuntu_image(request, api_client, cluster_state, wait_timeout):
+def ubuntu_image(request, image_pool, cluster_state):
     image_name = "focal-server-cloudimg-amd64"
 
     base_url = 'https://cloud-images.ubuntu.com/focal/current/'
@@ -506,15 +469,16 @@ def ubuntu_image(request, api_client, cluster_state, wait_timeout):
         base_url = cache_url
     url = os.path.join(base_url, 'focal-server-cloudimg-amd64.img')
 
-    image_json = _create_image(api_client, url, name=image_name,
-                               wait_timeout=wait_timeout)
+    image_json = image_pool.acquire(url, display_name=image_name)
     cluster_state.ubuntu_image = image_json
     cluster_state.image_ssh_user = "ubuntu"
-    return image_json
+    yield image_json
+
+    image_pool.release(image_json)
 
 
 @pytest.fixture(scope="class")
-def openSUSE_image(request, api_client, cluster_state, wait_timeout):
+def openSUSE_image(request, image_pool, cluster_state):
     image_name = "opensuse-leap-15-4"
 
     base_url = ('https://repo.opensuse.id//repositories/Cloud:/Images:'
@@ -525,11 +489,12 @@ def openSUSE_image(request, api_client, cluster_state, wait_timeout):
         base_url = cache_url
     url = os.path.join(base_url, 'openSUSE-Leap-15.4.x86_64-NoCloud.qcow2')
 
-    image_json = _create_image(api_client, url, name=image_name,
-                               timeout=wait_timeout)
+    image_json = image_pool.acquire(url, display_name=image_name)
     cluster_state.openSUSE_image = image_json
     cluster_state.image_ssh_user = "root"
-    return image_json
+    yield image_json
+
+    image_pool.release(image_json)
 
 
 def _vm1_backup(api_client, cluster_state, timeout=300):
@@ -741,13 +706,7 @@ def vm_prereq(cluster_state, api_client, vm_shell, wait_timeout):
         assert code == 201, (
             f"Failed to restore to vm2: {data}")
 
-    endtime = datetime.now() + timedelta(seconds=wait_timeout)
-    while endtime > datetime.now():
-        if _check_assigned_ip_func(api_client, vm2_name)():
-            break
-        sleep(5)
-    else:
-        raise AssertionError("Time out while waiting for assigned ip for vm2")
+    _wait_for_vm_ready(api_client, vm2_name, timeout=wait_timeout)
 
     # modify the hostname
     code, data = api_client.vms.get(vm2_name)
@@ -763,6 +722,8 @@ def vm_prereq(cluster_state, api_client, vm_shell, wait_timeout):
         raise AssertionError("Time out while waiting for update hostname")
 
     # restart the vm2
+    code, vmi = api_client.vms.get_status(vm2_name)
+    replaced_uid = vmi['metadata']['uid'] if code == 200 else None
     endtime = datetime.now() + timedelta(seconds=wait_timeout)
     while endtime > datetime.now():
         code, data = api_client.vms.restart(vm2_name)
@@ -773,15 +734,7 @@ def vm_prereq(cluster_state, api_client, vm_shell, wait_timeout):
         raise AssertionError("Time out while waiting for update hostname")
 
     # waiting for vm2 perform to restart
-    sleep(60)
-
-    endtime = datetime.now() + timedelta(seconds=wait_timeout)
-    while endtime > datetime.now():
-        if _check_assigned_ip_func(api_client, vm2_name)():
-            break
-        sleep(5)
-    else:
-        raise AssertionError("Time out while waiting for assigned ip for vm2")
+    _wait_for_vm_ready(api_client, vm2_name, timeout=wait_timeout, replaced_uid=replaced_uid)
 
     code, cluster_state.vm2 = api_client.vms.get_status(vm2_name)
     assert code == 200, (
@@ -1029,26 +982,28 @@ class TestAnyNodesUpgrade:
         done = set()
         endtime = datetime.now() + timedelta(seconds=wait_timeout)
         while endtime > datetime.now():
-            for ip in done.symmetric_difference(node_ips):
-                try:
-                    with host_shell.login(ip) as shell:
-                        out, err = shell.exec_command(script)
-                        timestamp = int(out)
-                        if not err and ip not in cmp:
-                            cmp[ip] = timestamp
-                            continue
-                        if not err and cmp[ip] < timestamp:
-                            done.add(ip)
-                except (ChannelException, AuthenticationException, NoValidConnectionsError,
-                        socket.timeout):
+            results = host_shell.run_all(done.symmetric_difference(node_ips), script,
+                                         return_exceptions=True)
+            for ip, rv in results.items():
+                if isinstance(rv, (ChannelException, AuthenticationException,
+                                   NoValidConnectionsError, socket.timeout)):
+                    continue
+                elif isinstance(rv, Exception):
+                    raise rv
+                out, err = rv
+                timestamp = int(out)
+                if not err and ip not in cmp:
+                    cmp[ip] = timestamp
                     continue
+                if not err and cmp[ip] < timestamp:
+                    done.add(ip)
 
             if not done.symmetric_difference(node_ips):
                 break
             sleep(5)
         else:
             raise AssertionError(
-                "\n".join("Node {ip} audit log is not updated." for ip in set(node_ips) ^ done)
+                "\n".join(f"Node {ip} audit log is not updated." for ip in set(node_ips) ^ done)
             )
 
     @pytest.mark.dependency(depends=["any_nodes_upgrade"])
@@ -1122,13 +1077,7 @@ class TestAnyNodesUpgrade:
         assert code == 201, (
             f"Failed to restore to vm4: {data}")
 
-        endtime = datetime.now() + timedelta(seconds=wait_timeout)
-        while endtime > datetime.now():
-            if _check_assigned_ip_func(api_client, vm4_name)():
-                break
-            sleep(5)
-        else:
-            raise AssertionError("Time out while waiting for assigned ip for vm4")
+        _wait_for_vm_ready(api_client, vm4_name, timeout=wait_timeout)
 
         code, vm4 = api_client.vms.get_status(vm4_name)
         assert code == 200, (
@@ -1181,17 +1130,15 @@ class TestAnyNodesUpgrade:
 
         # Get all nodes
         nodes = _get_all_nodes(api_client)
-        for node in nodes:
-            node_ip = node["metadata"]["annotations"][NODE_INTERNAL_IP_ANNOTATION]
+        node_ips = [n["metadata"]["annotations"][NODE_INTERNAL_IP_ANNOTATION] for n in nodes]
+        results = host_shell.run_all(node_ips, script, get_pty=True, splitlines=True)
+        for node_ip, (lines, stderr) in results.items():
+            assert not stderr, (
+                f"Failed to execute {script} on {node_ip}: {stderr}")
 
-            with host_shell.login(node_ip) as sh:
-                lines, stderr = sh.exec_command(script, get_pty=True, splitlines=True)
-                assert not stderr, (
-                    f"Failed to execute {script} on {node_ip}: {stderr}")
-
-                # eg: PRETTY_NAME="Harvester v1.1.0"
-                assert cluster_state.version == re.findall(r"Harvester (.+?)\"", lines[3])[0], (
-                    "OS version is not correct")
+            # eg: PRETTY_NAME="Harvester v1.1.0"
+            assert cluster_state.version == re.findall(r"Harvester (.+?)\"", lines[3])[0], (
+                "OS version is not correct")
 
     @pytest.mark.dependency(depends=["any_nodes_upgrade"])
     def test_verify_rke2_version(self, api_client, host_shell):
@@ -1201,22 +1148,21 @@ class TestAnyNodesUpgrade:
         # Verify rke2 version
         except_rke2_version = ""
         masters, workers = _get_master_and_worker_nodes(api_client)
-        for node in masters:
-            node_ip = node["metadata"]["annotations"][NODE_INTERNAL_IP_ANNOTATION]
+        node_ips = [n["metadata"]["annotations"][NODE_INTERNAL_IP_ANNOTATION] for n in masters]
+        results = host_shell.run_all(node_ips, script, get_pty=True, splitlines=True)
+        for node, node_ip in zip(masters, node_ips):
+            lines, stderr = results[node_ip]
+            assert not stderr, (
+                f"Failed to execute {script} on {node_ip}: {stderr}")
 
             # Get except rke2 version
             if except_rke2_version == "":
-                with host_shell.login(node_ip) as sh:
-                    lines, stderr = sh.exec_command(script, get_pty=True, splitlines=True)
-                    assert not stderr, (
-                        f"Failed to execute {script} on {node_ip}: {stderr}")
-
-                    for line in lines:
-                        if "kubernetes" in line:
-                            except_rke2_version = re.findall(r"kubernetes: (.*)", line.strip())[0]
-                            break
+                for line in lines:
+                    if "kubernetes" in line:
+                        except_rke2_version = re.findall(r"kubernetes: (.*)", line.strip())[0]
+                        break
 
-                    assert except_rke2_version != "", ("Failed to get except rke2 version")
+                assert except_rke2_version != "", ("Failed to get except rke2 version")
 
             assert node.get('status', {}).get('nodeInfo', {}).get(
                    "kubeletVersion", "") == except_rke2_version, (
@@ -73,30 +73,13 @@ def bogus_vlan_net(request, api_client):
 
 
 @pytest.fixture(scope="module")
-def image(api_client, image_opensuse, unique_name, wait_timeout):
-    unique_image_id = f'image-{unique_name}'
-    code, data = api_client.images.create_by_url(
-        unique_image_id, image_opensuse.url, display_name=f"{unique_name}-{image_opensuse.name}"
-    )
-
-    assert 201 == code, (code, data)
-
-    endtime = datetime.now() + timedelta(seconds=wait_timeout)
-    while endtime > datetime.now():
-        code, data = api_client.images.get(unique_image_id)
-        if 100 == data.get('status', {}).get('progress', 0):
-            break
-        sleep(3)
-    else:
-        raise AssertionError(
-            "Failed to create Image with error:\n"
-            f"Status({code}): {data}"
-        )
+def image(image_pool, image_opensuse):
+    data = image_pool.acquire(image_opensuse.url, display_name=image_opensuse.name)
 
-    yield dict(id=f"{data['metadata']['namespace']}/{unique_image_id}",
+    yield dict(id=f"{data['metadata']['namespace']}/{data['metadata']['name']}",
                user=image_opensuse.ssh_user)
 
-    code, data = api_client.images.delete(unique_image_id)
+    image_pool.release(data)
 
 
 @pytest.fixture(scope="module")
@@ -599,8 +582,7 @@ def test_create_stopped_vm(api_client, stopped_vm, wait_timeout):
 @pytest.mark.p0
 @pytest.mark.virtualmachines
 class TestVMClone:
-    def test_clone_running_vm(self, api_client, ssh_keypair, wait_timeout,
-                              host_shell, vm_shell, stopped_vm):
+    def test_clone_running_vm(self, api_client, wait_timeout, host_shell, vm_shell, pooled_vm):
         """
         To cover test:
         - (legacy) https://harvester.github.io/tests/manual/virtual-machines/clone-vm-that-is-turned-on/ # noqa
@@ -617,32 +599,8 @@ class TestVMClone:
             - Cloned-VM should becomes `Running`
             - Written data should available in Cloned-VM
         """
-        unique_vm_name, ssh_user = stopped_vm
-        pub_key, pri_key = ssh_keypair
-        code, data = api_client.vms.start(unique_vm_name)
-
-        endtime = datetime.now() + timedelta(seconds=wait_timeout)
-        while endtime > datetime.now():
-            code, data = api_client.vms.get_status(unique_vm_name)
-            if 200 == code:
-                phase = data.get('status', {}).get('phase')
-                conds = data.get('status', {}).get('conditions', [{}])
-                if ("Running" == phase
-                   and "AgentConnected" == conds[-1].get('type')
-                   and data['status'].get('interfaces')):
-                    break
-            sleep(3)
-        else:
-            raise AssertionError(
-                f"Failed to Start VM({unique_vm_name}) with errors:\n"
-                f"Status: {data.get('status')}\n"
-                f"API Status({code}): {data}"
-            )
-        vm_ip = next(iface['ipAddress'] for iface in data['status']['interfaces']
-                     if iface['name'] == 'default')
-        code, data = api_client.hosts.get(data['status']['nodeName'])
-        host_ip = next(addr['address'] for addr in data['status']['addresses']
-                       if addr['type'] == 'InternalIP')
+        unique_vm_name, ssh_user = pooled_vm.name, pooled_vm.ssh_user
+        pri_key, vm_ip, host_ip = pooled_vm.pri_key, pooled_vm.vm_ip, pooled_vm.host_ip
 
         # Log into VM to make some data
         with host_shell.login(host_ip, jumphost=True) as h:
@@ -660,17 +618,6 @@ class TestVMClone:
                 raise AssertionError(f"Unable to login to VM {unique_vm_name}") from login_ex
 
             with vm_sh as sh:
-                endtime = datetime.now() + timedelta(seconds=wait_timeout)
-                while endtime > datetime.now():
-                    out, err = sh.exec_command('cloud-init status')
-                    if 'done' in out:
-                        break
-                    sleep(3)
-                else:
-                    raise AssertionError(
-                        f"VM {unique_vm_name} Started {wait_timeout} seconds"
-                        f", but cloud-init still in {out}"
-                    )
                 out, err = sh.exec_command(f'echo {unique_vm_name!r} > ~/vmname')
                 assert not err, (out, err)
                 sh.exec_command('sync')
@@ -1596,7 +1543,7 @@ class TestHotPlugVolume:
     - https://harvester.github.io/tests/manual/volumes/support-volume-hot-unplug/
 
     Steps:
-        1. Create and start VM
+        1. Check out a running VM from the pool
         2. Create Data volume
         3. Attach data volume
         4. Detach data volume
@@ -1632,51 +1579,10 @@ class TestHotPlugVolume:
 
     @pytest.mark.dependency(name="hot_plug_volume")
     def test_add(
-        self, api_client, ssh_keypair, wait_timeout, host_shell, vm_shell, small_volume, stopped_vm
+        self, api_client, wait_timeout, host_shell, vm_shell, small_volume, pooled_vm
     ):
-        unique_vm_name, ssh_user = stopped_vm
-        pub_key, pri_key = ssh_keypair
-
-        # Start VM
-        code, data = api_client.vms.start(unique_vm_name)
-        endtime = datetime.now() + timedelta(seconds=wait_timeout)
-        while endtime > datetime.now():
-            code, data = api_client.vms.get_status(unique_vm_name)
-            if 200 == code:
-                phase = data.get('status', {}).get('phase')
-                conds = data.get('status', {}).get('conditions', [{}])
-                if ("Running" == phase
-                   and "AgentConnected" == conds[-1].get('type')
-                   and data['status'].get('interfaces')):
-                    break
-            sleep(3)
-        else:
-            raise AssertionError(
-                f"Failed to Start VM({unique_vm_name}) with errors:\n"
-                f"Status: {data.get('status')}\n"
-                f"API Status({code}): {data}"
-            )
-        # Log into VM to verify OS is ready
-        vm_ip = next(iface['ipAddress'] for iface in data['status']['interfaces']
-                     if iface['name'] == 'default')
-        code, data = api_client.hosts.get(data['status']['nodeName'])
-        host_ip = next(addr['address'] for addr in data['status']['addresses']
-                       if addr['type'] == 'InternalIP')
-
-        with self.login_to_vm_from_host(
-            host_shell, vm_shell, wait_timeout, host_ip, ssh_user, pri_key, vm_ip
-        ) as (sh, host_sh):
-            endtime = datetime.now() + timedelta(seconds=wait_timeout)
-            while endtime > datetime.now():
-                out, err = sh.exec_command('cloud-init status')
-                if 'done' in out:
-                    break
-                sleep(3)
-            else:
-                raise AssertionError(
-                    f"VM {unique_vm_name} Started {wait_timeout} seconds"
-                    f", but cloud-init still in {out}"
-                )
+        unique_vm_name, ssh_user = pooled_vm.name, pooled_vm.ssh_user
+        pri_key, vm_ip, host_ip = pooled_vm.pri_key, pooled_vm.vm_ip, pooled_vm.host_ip
 
         # attach volume
         vol_name, vol_size = small_volume
@@ -1714,10 +1620,10 @@ class TestHotPlugVolume:
 
     @pytest.mark.dependency(depends=["hot_plug_volume"])
     def test_remove(
-        self, api_client, ssh_keypair, wait_timeout, host_shell, vm_shell, small_volume, stopped_vm
+        self, api_client, wait_timeout, host_shell, vm_shell, small_volume, pooled_vm
     ):
-        unique_vm_name, ssh_user = stopped_vm
-        pub_key, pri_key = ssh_keypair
+        unique_vm_name, ssh_user = pooled_vm.name, pooled_vm.ssh_user
+        pri_key = pooled_vm.pri_key
 
         # remove volume
         vol_name, vol_size = small_volume
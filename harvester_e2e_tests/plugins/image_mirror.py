@@ -0,0 +1,263 @@
+import hashlib
+import os
+import re
+import socket
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from http import HTTPStatus
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from pathlib import Path
+from urllib.parse import urlparse, unquote
+
+import requests
+
+CHUNK_SIZE = 1 << 20
+RANGE_PATTERN = re.compile(r"bytes=(\d*)-(\d*)$")
+
+
+def advertise_address(endpoint):
+    """ Local IP address which routes to the endpoint, i.e. reachable by the cluster """
+    host = urlparse(endpoint).hostname or "127.0.0.1"
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        try:
+            s.connect((host, 443))
+            return s.getsockname()[0]
+        except OSError:
+            return "127.0.0.1"
+
+
+class ImageCache:
+    """ Images stored by their file name, evicted by least recent use
+
+    The file name is the key because fixtures join `--image-cache-url` with
+    the file name of the upstream URL.
+    """
+
+    def __init__(self, root, max_bytes):
+        self.root = Path(root).expanduser()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.upstreams = dict()  # filename => (url, checksum)
+        self.errors = dict()
+        self._locks = dict()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"{__class__.__name__}({str(self.root)!r}, {self.max_bytes})"
+
+    def _file_lock(self, name):
+        with self._lock:
+            return self._locks.setdefault(name, threading.Lock())
+
+    def add(self, url, checksum=None):
+        name = unquote(urlparse(url).path.rsplit("/", 1)[-1])
+        # first one wins, fixtures can't tell the same file name apart
+        self.upstreams.setdefault(name, (url, checksum))
+        return name
+
+    def path_of(self, name):
+        path = (self.root / name).resolve()
+        return path if path.parent == self.root.resolve() else None
+
+    def touch(self, path):
+        st = path.stat()
+        os.utime(path, (time.time(), st.st_mtime))
+
+    def get(self, name):
+        """ Returns the path of the cached file, fetches it from upstream if missing """
+        path = self.path_of(name)
+        if path is None:
+            return None
+        with self._file_lock(name):
+            if not path.exists() and name in self.upstreams:
+                self.fetch(name)
+        if path.exists():
+            self.touch(path)
+            return path
+        return None
+
+    def fetch(self, name):
+        url, checksum = self.upstreams[name]
+        path, tmp = self.root / name, self.root / f".{name}.part"
+        checksum = checksum or self.sidecar_checksum(url)
+        algo = {64: "sha256", 128: "sha512"}.get(len(checksum or ""))
+        digest = hashlib.new(algo) if algo else None
+        try:
+            with requests.get(url, stream=True, timeout=60) as resp:
+                resp.raise_for_status()
+                with tmp.open("wb") as f:
+                    for chunk in resp.iter_content(CHUNK_SIZE):
+                        f.write(chunk)
+                        if digest:
+                            digest.update(chunk)
+            if digest and digest.hexdigest() != checksum.lower():
+                raise ValueError(f"checksum mismatched: {digest.hexdigest()} != {checksum}")
+        except (requests.RequestException, OSError, ValueError) as e:
+            self.errors[name] = e
+            tmp.unlink(missing_ok=True)
+            return None
+
+        self.evict(tmp.stat().st_size)
+        tmp.replace(path)
+        self.errors.pop(name, None)
+        return path
+
+    def sidecar_checksum(self, url):
+        """ Checksum published as `<url>.sha256`, e.g. openSUSE images """
+        try:
+            resp = requests.get(f"{url}.sha256", timeout=30)
+            if resp.ok:
+                checksum = resp.text.split()[0]
+                return checksum if re.fullmatch(r"[0-9a-fA-F]{64}", checksum) else None
+        except (requests.RequestException, IndexError):
+            pass
+        return None
+
+    def evict(self, incoming=0):
+        files = [p for p in self.root.iterdir() if p.is_file() and not p.name.startswith(".")]
+        used = sum(p.stat().st_size for p in files)
+        for path in sorted(files, key=lambda p: p.stat().st_atime):
+            if used + incoming <= self.max_bytes:
+                break
+            used -= path.stat().st_size
+            path.unlink(missing_ok=True)
+
+    def prefetch(self):
+        for name in list(self.upstreams):
+            self.get(name)
+
+
+class MirrorHandler(SimpleHTTPRequestHandler):
+    """ Serve files of `ImageCache` with range and conditional requests """
+    cache = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_head(self):
+        name = unquote(urlparse(self.path).path.lstrip("/"))
+        path = self.cache.get(name) if name else None
+        if path is None:
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return None
+
+        st = path.stat()
+        size, etag = st.st_size, f'"{st.st_size:x}-{int(st.st_mtime):x}"'
+        last_modified = formatdate(st.st_mtime, usegmt=True)
+
+        if self.not_modified(etag, st.st_mtime):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return None
+
+        start, end = 0, size - 1
+        ranged = self.headers.get("Range")
+        if ranged and self.headers.get("If-Range", etag) in (etag, last_modified):
+            match = RANGE_PATTERN.match(ranged.strip())
+            if match and any(match.groups()):
+                first, last = match.groups()
+                if first:
+                    start, end = int(first), min(int(last or end), end)
+                else:
+                    start = max(size - int(last), 0)
+            if not match or start > end or start >= size:
+                self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.end_headers()
+                return None
+            self.send_response(HTTPStatus.PARTIAL_CONTENT)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(HTTPStatus.OK)
+
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        self.end_headers()
+
+        f = path.open("rb")
+        f.seek(start)
+        self._remaining = end - start + 1
+        return f
+
+    def not_modified(self, etag, mtime):
+        if "If-None-Match" in self.headers:
+            return etag in [t.strip() for t in self.headers["If-None-Match"].split(",")] \
+                or self.headers["If-None-Match"].strip() == "*"
+        if "If-Modified-Since" in self.headers:
+            try:
+                since = parsedate_to_datetime(self.headers["If-Modified-Since"])
+                return int(mtime) <= since.timestamp()
+            except (TypeError, ValueError):
+                pass
+        return False
+
+    def copyfile(self, source, outputfile):
+        remaining = self._remaining
+        while remaining > 0:
+            chunk = source.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            outputfile.write(chunk)
+            remaining -= len(chunk)
+
+
+class ImageMirror:
+    """ Local HTTP mirror of images, served as `--image-cache-url` """
+
+    def __init__(self, cache, address=("0.0.0.0", 0), advertise=None):
+        handler = type("Handler", (MirrorHandler,), dict(cache=cache))
+        self.cache = cache
+        self.server = ThreadingHTTPServer(address, handler)
+        self.server.daemon_threads = True
+        host, port = self.server.server_address[:2]
+        self.url = f"http://{advertise or host}:{port}"
+        self._threads = []
+
+    def __repr__(self):
+        return f"{__class__.__name__}({self.url!r}, {self.cache!r})"
+
+    def start(self, prefetch=True):
+        targets = [self.server.serve_forever] + ([self.cache.prefetch] if prefetch else [])
+        for target in targets:
+            thread = threading.Thread(target=target, name=f"image-mirror-{target.__name__}",
+                                      daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class ImageMirrorPlugin:
+    """ Start `ImageMirror` and point `--image-cache-url` to it """
+
+    def __init__(self, config, urls):
+        host, _, port = config.getoption("--image-mirror-address").rpartition(":")
+        cache = ImageCache(config.getoption("--image-mirror-dir"),
+                           int(float(config.getoption("--image-mirror-size")) * (1 << 30)))
+        for url in urls:
+            cache.add(url)
+        advertise = advertise_address(config.getoption("--endpoint"))
+        self.mirror = ImageMirror(cache, (host or "0.0.0.0", int(port or 0)), advertise)
+        self.config = config
+
+    def pytest_configure(self, config):
+        self.mirror.start(prefetch=not config.option.collectonly)
+        config.option.image_cache_url = self.mirror.url
+
+    def pytest_unconfigure(self, config):
+        self.mirror.stop()
+
+    def pytest_report_header(self, config):
+        return f"image mirror: {self.mirror.url} ({self.mirror.cache.root})"
+
+    def pytest_terminal_summary(self, terminalreporter):
+        for name, err in self.mirror.cache.errors.items():
+            terminalreporter.write_line(f"image mirror failed to fetch {name}: {err}")
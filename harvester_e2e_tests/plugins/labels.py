@@ -0,0 +1,61 @@
+import os
+from datetime import datetime
+from hashlib import sha256
+from secrets import token_hex
+
+import pytest
+
+RUN_ID_ENV = "HARVESTER_E2E_TEST_RUN_ID"
+RUN_ID_LABEL = "tests.harvesterhci.io/test-run-id"
+NODEID_LABEL = "tests.harvesterhci.io/test-nodeid"
+# label values are limited to 63 characters, the full node ID is annotated
+NODEID_ANNOTATION = "tests.harvesterhci.io/test-nodeid"
+
+
+def new_run_id():
+    return f"{datetime.now().strftime('%Y%m%d%H%M%S')}-{token_hex(3)}"
+
+
+def resolve_run_id(config):
+    """ Run ID of `--test-run-id`, or generated once and shared with pytest-xdist workers """
+    run_id = config.getoption("--test-run-id") or os.environ.setdefault(RUN_ID_ENV, new_run_id())
+    config.option.test_run_id = run_id
+    return run_id
+
+
+def nodeid_hash(nodeid):
+    return sha256(nodeid.encode()).hexdigest()[:16]
+
+
+def labels_of(run_id, nodeid):
+    """ Returns labels and annotations of objects created by the test """
+    labels, annotations = {RUN_ID_LABEL: run_id}, dict()
+    if nodeid:
+        labels[NODEID_LABEL] = nodeid_hash(nodeid)
+        annotations[NODEID_ANNOTATION] = nodeid
+    return labels, annotations
+
+
+class RunLabelsPlugin:
+    """ Labels and annotations of the running test, shared with `HarvesterAPI` clients
+
+    `api.default_labels` and `api.default_annotations` refer to the dicts here,
+    which are updated before each test's setup.
+    """
+    RUN_ID_LABEL = RUN_ID_LABEL
+
+    def __init__(self, run_id):
+        self.run_id = run_id
+        self.labels, self.annotations = labels_of(run_id, "")
+
+    def __repr__(self):
+        return f"{__class__.__name__}({self.run_id!r})"
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_runtest_protocol(self, item, nextitem):
+        labels, annotations = labels_of(self.run_id, item.nodeid)
+        self.labels.update(labels)
+        self.annotations.update(annotations)
+
+    def pytest_report_header(self, config):
+        return f"test run id: {self.run_id} (label {RUN_ID_LABEL})"
@@ -0,0 +1,93 @@
+import json
+from collections import defaultdict
+from pathlib import Path
+
+BUCKETS = ("api", "poll", "sleep", "ssh", "active")
+SESSION = "<session>"
+
+
+def bucket_of(span):
+    """ Bucket of the span's own (exclusive) time
+
+    sleeps inside `polling2.poll` are the polling interval, so they are counted as poll.
+    """
+    if span.cat == "sleep":
+        return "poll" if any(s.cat == "poll" for s in span.ancestors()) else "sleep"
+    if span.cat in ("api", "poll", "ssh"):
+        return span.cat
+    return "active"
+
+
+class TimingProfiler:
+    """ Break down where the time of each test goes, fed by `SpanRecorder`
+
+    * api: HTTP round trips to Harvester/Rancher
+    * poll: `polling2.poll` waits (the predicate's API calls are counted as api)
+    * sleep: deliberate `time.sleep`
+    * ssh: connecting, executing and reading from SSH sessions
+    * active: everything else, i.e. fixtures' and tests' own code and assertions
+    """
+
+    def __init__(self, recorder, path=None, top=20):
+        self.recorder = recorder
+        self.path = Path(path) if path else None
+        self.top = top
+        self.tests = defaultdict(lambda: dict.fromkeys(("total", *BUCKETS), 0.0))
+        self.fixtures = defaultdict(lambda: dict(setup=0.0, teardown=0.0, count=0))
+        recorder.listeners.append(self)
+
+    def span_finished(self, span):
+        # threads spawned by the test overlap with it, only the runner's timeline adds up
+        if span.tid != self.recorder.runner_tid:
+            return
+
+        record = self.tests[self.recorder.current or SESSION]
+        if span.cat == "test":
+            record["total"] += span.duration
+            return
+        record[bucket_of(span)] += span.self_time
+
+        if span.cat == "fixture":
+            key = f"{span.args['scope']}:{span.name}"
+            self.fixtures[key][span.args["stage"]] += span.duration
+            self.fixtures[key]["count"] += span.args["stage"] == "setup"
+
+    def summary(self):
+        totals = dict.fromkeys(("total", *BUCKETS), 0.0)
+        for record in self.tests.values():
+            for k, v in record.items():
+                totals[k] += v
+        return dict(
+            totals={k: round(v, 3) for k, v in totals.items()},
+            tests={n: {k: round(v, 3) for k, v in r.items()} for n, r in self.tests.items()},
+            fixtures={n: {k: round(v, 3) for k, v in r.items()} for n, r in self.fixtures.items()}
+        )
+
+    def pytest_sessionfinish(self, session):
+        if self.path and not session.config.option.collectonly:
+            with self.path.open("w") as f:
+                json.dump(self.summary(), f, indent=2, sort_keys=True)
+
+    def pytest_terminal_summary(self, terminalreporter):
+        if not self.tests:
+            return
+        tr = terminalreporter
+        tr.write_sep("=", "timing profile (seconds)")
+
+        cols = ("total", *BUCKETS)
+        header = "".join(f"{c:>10}" for c in cols)
+        tr.write_line(f"{header}  test")
+        ranked = sorted(self.tests.items(), key=lambda kv: -kv[1]["total"])
+        for nodeid, record in ranked[:self.top]:
+            tr.write_line("".join(f"{record[c]:>10.1f}" for c in cols) + f"  {nodeid}")
+        totals = self.summary()["totals"]
+        tr.write_line("".join(f"{totals[c]:>10.1f}" for c in cols) + "  (all tests)")
+
+        tr.write_line("")
+        tr.write_line(f"{'setup':>10}{'teardown':>10}{'count':>10}  fixture")
+        ranked = sorted(self.fixtures.items(), key=lambda kv: -kv[1]["setup"] - kv[1]["teardown"])
+        for name, record in ranked[:self.top]:
+            tr.write_line(f"{record['setup']:>10.1f}{record['teardown']:>10.1f}"
+                          f"{record['count']:>10}  {name}")
+        if self.path:
+            tr.write_line(f"timing profile saved to {self.path}")
@@ -0,0 +1,72 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+class Reaper:
+    """ Delete resources of teardowns in background threads
+
+    Deletions are queued by kind, and a job waits for the queued jobs of the
+    kinds before its own (VMs, then volumes, then images), so a volume is not
+    deleted while the VM using it is still being deleted. The next test starts
+    right after the teardown queued its deletions; failures are kept as leaks.
+
+    With `max_workers=0`, jobs run in place and raise as they used to.
+    """
+    KINDS = ("vm", "volume", "image")
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+        self.jobs = []  # [(kind, description, future)]
+        self.leaks = []  # [(kind, description, exception)]
+        self._lock = threading.Lock()
+        self._executor = None
+        if max_workers:
+            self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="reaper")
+
+    def __repr__(self):
+        return f"{__class__.__name__}(jobs={len(self.jobs)}, leaks={len(self.leaks)})"
+
+    def _run(self, kind, description, deps, fn, args, kwargs):
+        # dependencies are queued before, so they are running or done already
+        wait(deps)
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            with self._lock:
+                self.leaks.append((kind, description, e))
+
+    def submit(self, kind, description, fn, *args, **kwargs):
+        """ Queue `fn(*args, **kwargs)` which deletes the resource and waits until it's gone """
+        if not self._executor:
+            return fn(*args, **kwargs)
+
+        rank = self.KINDS.index(kind)
+        with self._lock:
+            deps = [f for k, _, f in self.jobs if self.KINDS.index(k) < rank and not f.done()]
+            future = self._executor.submit(self._run, kind, description, deps, fn, args, kwargs)
+            self.jobs.append((kind, description, future))
+        return future
+
+    def join(self):
+        """ Wait for all queued deletions, returns the leaks """
+        if self._executor:
+            self._executor.shutdown(wait=True)
+        return self.leaks
+
+
+class ReaperPlugin:
+    """ Join `Reaper` at the end of the session and report leaked resources """
+
+    def __init__(self, max_workers):
+        self.reaper = Reaper(max_workers)
+
+    def pytest_sessionfinish(self, session):
+        self.reaper.join()
+
+    def pytest_terminal_summary(self, terminalreporter):
+        if not self.reaper.leaks:
+            return
+        tr = terminalreporter
+        tr.write_sep("=", f"{len(self.reaper.leaks)} resources leaked by teardown", yellow=True)
+        for kind, description, err in self.reaper.leaks:
+            tr.write_line(f"{kind:>8}  {description}: {err}")
@@ -0,0 +1,196 @@
+import heapq
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+SCOPE_CLS = {
+    "session": pytest.Session,
+    "package": pytest.Package,
+    "module": pytest.Module,
+    "class": pytest.Class
+}
+
+
+def parse_shard(value):
+    """Parse `i/N` into (index, total), index is 1-based."""
+    try:
+        idx, total = (int(v) for v in value.split("/"))
+        assert 1 <= idx <= total
+    except (AttributeError, ValueError, AssertionError):
+        raise pytest.UsageError(f"--shard expects `i/N` with 1 <= i <= N, got {value!r}")
+    return idx, total
+
+
+class DurationHistory:
+    """ Wall time of each test (setup + call + teardown) kept across runs.
+
+    The file is a flat JSON object of `{nodeid: seconds}`, so histories from
+    different shards can be merged with a plain dict update.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path) if path else None
+        self.durations = self.load()
+        self._measured, self._ran = dict(), set()
+
+    def __repr__(self):
+        return f"{__class__.__name__}({str(self.path)!r})"
+
+    def load(self):
+        if not self.path:
+            return dict()
+        try:
+            with self.path.open() as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else dict()
+        except (OSError, ValueError):
+            return dict()
+
+    def get(self, nodeid, default=None):
+        return self.durations.get(nodeid, default)
+
+    def add(self, report):
+        self._measured[report.nodeid] = self._measured.get(report.nodeid, 0) + report.duration
+        if "call" == report.when:
+            self._ran.add(report.nodeid)
+
+    def save(self):
+        # skipped tests only pay for fixtures, keep the previous record of them
+        if not self.path or not self._ran:
+            return
+        durations = self.load()
+        durations.update({k: round(v, 3) for k, v in self._measured.items() if k in self._ran})
+        self.durations = durations
+
+        tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}")
+        with tmp.open("w") as f:
+            json.dump(durations, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
+
+
+def _dependency_names(item):
+    marker = item.get_closest_marker("dependency")
+    nodeid = item.nodeid.replace("::()::", "::")
+    for scope, cls in SCOPE_CLS.items():
+        name = nodeid
+        if scope not in ("session", "package"):
+            shift = 2 if scope == "class" else 1
+            try:
+                name = nodeid.split("::", shift)[shift]
+            except IndexError:
+                continue
+        yield item.getparent(cls), name
+        if marker and marker.kwargs.get('name'):
+            yield item.getparent(cls), marker.kwargs['name']
+
+
+def _dependency_refs(item):
+    for marker in item.iter_markers("dependency"):
+        scope = marker.kwargs.get('scope', 'module')
+        node = item.getparent(SCOPE_CLS.get(scope, pytest.Module))
+        for name in marker.kwargs.get('depends', []):
+            yield node, name
+            # ref: `check_depends` in conftest.py with `param=True`
+            if marker.kwargs.get('param') and hasattr(item, "callspec"):
+                yield node, f"{name}[{item.callspec.id}]"
+
+
+def dependency_groups(items):
+    """ Group indexes of items which are chained by `pytest.mark.dependency`
+
+    Returns:
+        list[list[int]]: groups of item indexes, each group is sorted.
+    """
+    parent = list(range(len(items)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    named = dict()
+    for idx, item in enumerate(items):
+        for key in _dependency_names(item):
+            named.setdefault(key, []).append(idx)
+
+    for idx, item in enumerate(items):
+        for key in _dependency_refs(item):
+            for other in named.get(key, []):
+                parent[find(other)] = find(idx)
+
+    groups = dict()
+    for idx in range(len(items)):
+        groups.setdefault(find(idx), []).append(idx)
+    return sorted(groups.values(), key=lambda g: g[0])
+
+
+def partition(weights, total):
+    """ Longest-processing-time-first bin packing.
+
+    Args:
+        weights (list[float]): weight of each group, in collection order.
+        total (int): number of shards.
+
+    Returns:
+        list[tuple[float, list[int]]]: (load, group indexes) for each shard.
+    """
+    shards = [(0.0, i) for i in range(total)]
+    assigned = [[] for _ in range(total)]
+    loads = [0.0] * total
+    # stable ordering makes every runner compute the same partition
+    for gidx in sorted(range(len(weights)), key=lambda i: (-weights[i], i)):
+        load, sidx = heapq.heappop(shards)
+        assigned[sidx].append(gidx)
+        loads[sidx] = load + weights[gidx]
+        heapq.heappush(shards, (loads[sidx], sidx))
+    return [(loads[i], sorted(assigned[i])) for i in range(total)]
+
+
+class ShardPlugin:
+    """ Record test durations and split the collected tests with `--shard i/N` """
+
+    def __init__(self, config):
+        self.config = config
+        self.history = DurationHistory(config.getoption("--durations-history"))
+        shard = config.getoption("--shard")
+        self.shard = parse_shard(shard) if shard else None
+        self.estimated = None
+
+    def pytest_runtest_logreport(self, report):
+        self.history.add(report)
+
+    def pytest_sessionfinish(self, session):
+        # reports of xdist workers are relayed to the controller, which saves them alone
+        if not self.config.option.collectonly and not hasattr(self.config, "workerinput"):
+            self.history.save()
+
+    @pytest.hookimpl(trylast=True)
+    def pytest_collection_modifyitems(self, session, config, items):
+        if not self.shard or self.shard[1] == 1:
+            return
+
+        known = [d for d in (self.history.get(it.nodeid) for it in items) if d is not None]
+        default = sum(known) / len(known) if known else 1.0
+
+        groups = dependency_groups(items)
+        weights = [sum(self.history.get(items[i].nodeid, default) for i in g) for g in groups]
+
+        idx, total = self.shard
+        load, picked = partition(weights, total)[idx - 1]
+        selected = {i for g in picked for i in groups[g]}
+
+        deselected = [it for i, it in enumerate(items) if i not in selected]
+        items[:] = [it for i, it in enumerate(items) if i in selected]
+        if deselected:
+            config.hook.pytest_deselected(items=deselected)
+        self.estimated = load
+
+    def pytest_report_collectionfinish(self, config, items):
+        if self.estimated is not None:
+            idx, total = self.shard
+            return (f"shard {idx}/{total}: {len(items)} tests,"
+                    f" estimated {self.estimated / 60:.1f} minutes"
+                    f" (history: {self.history.path})")
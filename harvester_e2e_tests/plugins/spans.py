@@ -0,0 +1,191 @@
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from urllib.parse import urlparse
+
+import paramiko
+import polling2
+import pytest
+import requests
+
+from paramiko.channel import ChannelFile
+
+
+class Span:
+    """ A timed region, nested spans of the same thread are linked by `parent` """
+    __slots__ = ("cat", "name", "args", "parent", "tid", "start", "end", "child_time")
+
+    def __init__(self, cat, name, parent=None, **args):
+        self.cat, self.name, self.args, self.parent = cat, name, args, parent
+        self.tid = threading.get_ident()
+        self.start, self.end, self.child_time = time.perf_counter(), None, 0.0
+
+    def __repr__(self):
+        return f"{__class__.__name__}({self.cat!r}, {self.name!r}, duration={self.duration:.3f})"
+
+    @property
+    def duration(self):
+        return (self.end or time.perf_counter()) - self.start
+
+    @property
+    def self_time(self):
+        return self.duration - self.child_time
+
+    def ancestors(self):
+        span = self.parent
+        while span is not None:
+            yield span
+            span = span.parent
+
+
+class SpanRecorder:
+    """ Produce spans for fixtures, test phases, HTTP calls, polling, sleeps and SSH.
+
+    Listeners (profiler, tracer...) are notified with `span_finished(span)`;
+    the recorder itself does not keep finished spans.
+    """
+
+    def __init__(self):
+        self.listeners = []
+        self.current = None  # nodeid of the running test
+        self.runner_tid = threading.get_ident()
+        self._local = threading.local()
+        self._patched = []
+        self._teardowns = dict()
+
+    @property
+    def stack(self):
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            return self._local.stack
+
+    def begin(self, cat, name, **args):
+        stack = self.stack
+        span = Span(cat, name, stack[-1] if stack else None, **args)
+        stack.append(span)
+        return span
+
+    def end(self, span, **args):
+        span.end = time.perf_counter()
+        span.args.update(args)
+        stack = self.stack
+        if span in stack:
+            # spans left open by an exception are closed together with the outer one
+            del stack[stack.index(span):]
+        if span.parent is not None:
+            span.parent.child_time += span.duration
+        for listener in self.listeners:
+            listener.span_finished(span)
+
+    @contextmanager
+    def span(self, cat, name, **args):
+        span = self.begin(cat, name, **args)
+        try:
+            yield span
+        finally:
+            self.end(span)
+
+    # instrumentation
+    def _patch(self, owner, attr, wrapper):
+        origin = getattr(owner, attr)
+        self._patched.append((owner, attr, origin))
+        setattr(owner, attr, wraps(origin)(wrapper(origin)))
+
+    def install(self):
+        """ Patch the libraries which the test code blocks on """
+        recorder = self
+
+        def send(origin):
+            def wrapped(session, request, **kws):
+                path = urlparse(request.url).path
+                with recorder.span("api", f"{request.method} {path}") as span:
+                    resp = origin(session, request, **kws)
+                    span.args.update(status=resp.status_code)
+                    return resp
+            return wrapped
+
+        def poll(origin):
+            def wrapped(target, *args, **kws):
+                name = getattr(target, "__qualname__", repr(target))
+                with recorder.span("poll", name):
+                    return origin(target, *args, **kws)
+            return wrapped
+
+        def sleep(origin):
+            def wrapped(secs):
+                with recorder.span("sleep", "sleep", seconds=secs):
+                    return origin(secs)
+            return wrapped
+
+        def connect(origin):
+            def wrapped(client, hostname, *args, **kws):
+                with recorder.span("ssh", f"connect {hostname}"):
+                    return origin(client, hostname, *args, **kws)
+            return wrapped
+
+        def exec_command(origin):
+            def wrapped(client, command, *args, **kws):
+                with recorder.span("ssh", "exec_command", command=command[:200]):
+                    return origin(client, command, *args, **kws)
+            return wrapped
+
+        def read(origin):
+            def wrapped(fp, *args, **kws):
+                with recorder.span("ssh", "read"):
+                    return origin(fp, *args, **kws)
+            return wrapped
+
+        self._patch(requests.Session, "send", send)
+        self._patch(polling2, "poll", poll)
+        self._patch(time, "sleep", sleep)
+        self._patch(paramiko.SSHClient, "connect", connect)
+        self._patch(paramiko.SSHClient, "exec_command", exec_command)
+        self._patch(ChannelFile, "read", read)
+
+    def uninstall(self):
+        while self._patched:
+            owner, attr, origin = self._patched.pop()
+            setattr(owner, attr, origin)
+
+    # pytest hooks
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_protocol(self, item, nextitem):
+        self.current, self.runner_tid = item.nodeid, threading.get_ident()
+        with self.span("test", item.nodeid):
+            yield
+        self.current = None
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_setup(self, item):
+        with self.span("phase", "setup", nodeid=item.nodeid):
+            yield
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_call(self, item):
+        with self.span("phase", "call", nodeid=item.nodeid):
+            yield
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_teardown(self, item, nextitem):
+        with self.span("phase", "teardown", nodeid=item.nodeid):
+            yield
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_fixture_setup(self, fixturedef, request):
+        with self.span("fixture", fixturedef.argname, scope=fixturedef.scope, stage="setup"):
+            yield
+
+        # finalizers run LIFO, so this one starts before the fixture's own teardown,
+        # and `pytest_fixture_post_finalizer` is always the last one.
+        def begin_teardown():
+            self._teardowns[id(fixturedef)] = self.begin(
+                "fixture", fixturedef.argname, scope=fixturedef.scope, stage="teardown")
+        fixturedef.addfinalizer(begin_teardown)
+
+    def pytest_fixture_post_finalizer(self, fixturedef, request):
+        span = self._teardowns.pop(id(fixturedef), None)
+        if span is not None:
+            self.end(span)
@@ -0,0 +1,87 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+
+def worker_name(config):
+    """ Name of the track, e.g. `gw0` for pytest-xdist workers or `shard-1-3` """
+    worker = os.environ.get("PYTEST_XDIST_WORKER")
+    if worker:
+        return worker
+    shard = config.getoption("--shard", None)
+    return f"shard-{shard.replace('/', '-')}" if shard else "main"
+
+
+class TraceWriter:
+    """ Write spans of `SpanRecorder` as trace events (Chrome/Perfetto JSON)
+
+    Each worker is a process track and each thread of it is a thread track,
+    workers of pytest-xdist write their own part and the controller merges them.
+    """
+
+    def __init__(self, recorder, path, worker="main"):
+        self.path = Path(path)
+        self.worker = worker
+        self.pid = os.getpid()
+        self.events = []
+        self._tids = dict()
+        self._lock = threading.Lock()
+        # spans are timed by `perf_counter`, shift them to epoch to align workers
+        self._epoch = time.time() - time.perf_counter()
+        recorder.listeners.append(self)
+
+    def _tid(self, ident):
+        if ident not in self._tids:
+            self._tids[ident] = tid = len(self._tids)
+            name = "runner" if tid == 0 else f"thread-{tid}"
+            self.events.append(dict(ph="M", name="thread_name", pid=self.pid, tid=tid,
+                                    args=dict(name=name)))
+        return self._tids[ident]
+
+    def span_finished(self, span):
+        with self._lock:
+            self.events.append(dict(
+                ph="X", cat=span.cat, name=span.name, pid=self.pid, tid=self._tid(span.tid),
+                ts=round((self._epoch + span.start) * 1e6), dur=round(span.duration * 1e6),
+                args={k: v if isinstance(v, (int, float, bool)) else str(v)
+                      for k, v in span.args.items()}
+            ))
+
+    def part_path(self, worker):
+        return self.path.with_name(f"{self.path.stem}.{worker}{self.path.suffix}")
+
+    def dump(self, path):
+        meta = dict(ph="M", name="process_name", pid=self.pid, tid=0, args=dict(name=self.worker))
+        with self._lock:
+            events = [meta, *self.events]
+        with Path(path).open("w") as f:
+            json.dump(dict(traceEvents=events, displayTimeUnit="ms"), f)
+
+    def merge_parts(self):
+        events = []
+        for part in sorted(self.path.parent.glob(f"{self.path.stem}.gw*{self.path.suffix}")):
+            with part.open() as f:
+                events.extend(json.load(f)["traceEvents"])
+            part.unlink()
+        if events:
+            with self.path.open() as f:
+                data = json.load(f)
+            data["traceEvents"].extend(events)
+            with self.path.open("w") as f:
+                json.dump(data, f)
+
+    def pytest_sessionfinish(self, session):
+        if session.config.option.collectonly:
+            return
+        if hasattr(session.config, "workerinput"):
+            self.dump(self.part_path(self.worker))
+        else:
+            self.dump(self.path)
+            self.merge_parts()
+
+    def pytest_terminal_summary(self, terminalreporter):
+        if self.path.exists():
+            terminalreporter.write_line(f"trace timeline saved to {self.path}"
+                                        " (open with https://ui.perfetto.dev)")
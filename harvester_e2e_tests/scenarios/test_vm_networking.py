@@ -80,8 +80,10 @@ def fileactions_into_vm(ip, timeout, keypair=None,
 
 def get_vm_public_ip(admin_session, harvester_api_endpoints, vm, timeout,
                      nic_name='nic-1'):
+    # VMs are created with the guest agent, wait for it before SSH into them
     return utils.get_vm_ip_address(admin_session, harvester_api_endpoints, vm,
-                                   timeout, nic_name=nic_name)
+                                   timeout, nic_name=nic_name,
+                                   agent_connected=True)
 
 
 @pytest.mark.virtual_machines_p1
@@ -16,6 +16,8 @@
 # you may find current contact information at www.suse.com
 
 from io import StringIO
+from harvester_api.managers import stamp_metadata
+from harvester_e2e_tests.plugins.labels import labels_of
 from paramiko import SSHClient, AutoAddPolicy, RSAKey
 from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.util.retry import Retry
@@ -458,6 +460,15 @@ def assert_image_ready(request, admin_session,
         raise AssertionError(errmsg)
 
 
+def stamp_test_labels(request, request_json):
+    """Label the object with the test run and the node requesting it"""
+    run_id = request.config.getoption('--test-run-id', None)
+    if not run_id:
+        return request_json
+    labels, annotations = labels_of(run_id, request.node.nodeid)
+    return stamp_metadata(request_json, labels, annotations)
+
+
 def create_image(request, admin_session, harvester_api_endpoints, url,
                  name=None, description='', source_type='download'):
     request_json = get_json_object_from_template(
@@ -468,7 +479,7 @@ def create_image(request, admin_session, harvester_api_endpoints, url,
         url=url
     )
     resp = admin_session.post(harvester_api_endpoints.create_image,
-                              json=request_json)
+                              json=stamp_test_labels(request, request_json))
     assert resp.status_code in [200, 201], 'Failed to create image %s: %s' % (
         name, resp.content)
     image_json = resp.json()
@@ -595,7 +606,7 @@ def create_vm(request, admin_session, image, harvester_api_endpoints,
     request_json['spec']['runStrategy'] = "RerunOnFailure" if running else "Halted"
 
     resp = admin_session.post(harvester_api_endpoints.create_vm,
-                              json=request_json)
+                              json=stamp_test_labels(request, request_json))
     assert resp.status_code == 201, (
         'Failed to create VM %s: %s' % (resp.status_code, resp.content))
     vm_resp_json = resp.json()
@@ -1288,7 +1299,8 @@ def create_image_upload(request, admin_session, harvester_api_endpoints,
             with open(image_path, 'wb') as f:
                 for chunk in r.iter_content(chunk_size=8192):
                     f.write(chunk)
-        # create an image for upload
+        # create an image for upload, labeled by create_image as the upload
+        # action itself creates no object
         image_json = create_image(request, admin_session,
                                   harvester_api_endpoints,
                                   '', source_type='upload')
@@ -1356,7 +1368,7 @@ def create_vm_backup(request, admin_session, harvester_api_endpoints,
         total_objects_before_backup = get_total_objects_nfs_share(request)
 
     resp = admin_session.post(harvester_api_endpoints.create_vm_backup,
-                              json=request_json)
+                              json=stamp_test_labels(request, request_json))
     assert resp.status_code in [200, 201], 'Failed to create backup %s: %s' % (
         name, resp.content)
     backup_json = resp.json()
@@ -1528,14 +1540,17 @@ def wait_for_ssh_client(ip, timeout, keypair=None):
     client = SSHClient()
     # automatically add host since we only care about connectivity
     client.set_missing_host_key_policy(AutoAddPolicy)
+    # parse the key once rather than in every retry
+    private_key = None
+    if keypair is not None:
+        private_key = RSAKey.from_private_key(
+            StringIO(keypair['spec']['privateKey']))
 
     def _wait_for_connect():
         try:
             # NOTE: for the default openSUSE Leap image, the root user
             # password is 'linux'
-            if keypair is not None:
-                private_key = RSAKey.from_private_key(
-                    StringIO(keypair['spec']['privateKey']))
+            if private_key is not None:
                 client.connect(ip, username='root', pkey=private_key)
             else:
                 client.connect(ip, username='root', password='linux')
@@ -1552,15 +1567,29 @@ def wait_for_ssh_client(ip, timeout, keypair=None):
     return client
 
 
+def is_guest_agent_connected(vm_instance_json):
+    conditions = vm_instance_json.get('status', {}).get('conditions', [])
+    return any(c.get('type') == 'AgentConnected' and c.get('status') == 'True'
+               for c in conditions)
+
+
 def get_vm_ip_address(admin_session, harvester_api_endpoints, vm, timeout,
-                      nic_name='default'):
+                      nic_name='default', agent_connected=False):
+    """Wait for the IP address of the NIC to be assigned.
+
+    With `agent_connected`, also wait for the QEMU guest agent, which is
+    started by cloud-init (see `user_data_with_guest_agent`), so the VM is
+    ready to SSH into instead of retrying connections.
+    """
     vm_instance_json = None
 
     def _wait_for_ip():
         nonlocal vm_instance_json
         vm_instance_json = lookup_vm_instance(
             admin_session, harvester_api_endpoints, vm)
-        for interface in vm_instance_json['status']['interfaces']:
+        if agent_connected and not is_guest_agent_connected(vm_instance_json):
+            return None
+        for interface in vm_instance_json['status'].get('interfaces', []):
             # NOTE: by default, the second NIC name is 'nic-1'
             if (interface['name'] == nic_name and
                     'ipAddress' in interface):